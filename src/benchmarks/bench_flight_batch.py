@@ -0,0 +1,138 @@
+"""
+So sánh bộ nhớ và tốc độ giữa đường cũ (list các dict chuyến bay) và FlightBatch theo cột.
+
+Mỗi đường đi qua cùng các bước: dựng tập chuyến bay -> validate -> load vào SQLite (in-memory).
+Bộ nhớ đo bằng tracemalloc (lượng còn giữ sau khi dựng xong), thời gian đo ở lần chạy riêng
+không bật tracemalloc.
+
+    python -m src.benchmarks.bench_flight_batch --rows 1000000
+"""
+import argparse
+import gc
+import json
+import logging
+import os
+import sqlite3
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Dict, List
+
+from src.constant.DataSource import DataSource
+from src.loadtest.flight_generator import FlightDataGenerator
+from src.model.FlightBatch import FlightBatch
+from src.model.FlightRecord import SQLITE_COLUMNS, FlightRecord
+from src.model.FlightSchema import FLIGHT_VALIDATOR
+
+logger = logging.getLogger(__name__)
+
+REQUIRED_FIELDS = ['flight_code', 'airline', 'departure_airport', 'arrival_airport', 'departure_time',
+                   'arrival_time', 'price', 'source']
+SQLITE_SCHEMA = f"CREATE TABLE flights_metadata (id INTEGER PRIMARY KEY, {', '.join(SQLITE_COLUMNS)})"
+INSERT_QUERY = f"INSERT INTO flights_metadata ({', '.join(SQLITE_COLUMNS)}) VALUES ({', '.join('?' * len(SQLITE_COLUMNS))})"
+
+
+def generate_dicts(rows: int, seed: int) -> List[Dict]:
+    generator = FlightDataGenerator(seed=seed, missing_rate=0.01, start_date=datetime(2025, 10, 9))
+    source = DataSource.BOOKING_DATA_SRC.value
+    columns = generator.columns(source)
+    return [dict(zip(columns, row)) for row in generator.generate(source, rows)]
+
+
+def dict_path(flights: List[Dict]) -> int:
+    """Đường cũ: validate từng dict (giống ScraperManager.validate_flight_data) rồi dựng tuple từng dòng"""
+    valid = []
+    for flight in flights:
+        if not all(flight.get(field) for field in REQUIRED_FIELDS):
+            continue
+        try:
+            datetime.strptime(flight['departure_time'], '%Y-%m-%d %H:%M:%S')
+            datetime.strptime(flight['arrival_time'], '%Y-%m-%d %H:%M:%S')
+        except ValueError:
+            continue
+        valid.append(flight)
+    rows = [FlightRecord.from_dict(f).to_sqlite_tuple() for f in valid]
+    return load(rows)
+
+
+def batch_path(flights: List[Dict]) -> int:
+    batch = build_batch(flights)
+    batch.normalize()
+    batch = batch.filter(FLIGHT_VALIDATOR.validate(batch).valid)
+    return load(batch.iter_sqlite_tuples())
+
+
+def build_batch(flights) -> FlightBatch:
+    return FlightBatch.from_records(FlightRecord.from_dict(f) for f in flights)
+
+
+def load(rows) -> int:
+    connection = sqlite3.connect(":memory:")
+    try:
+        connection.execute(SQLITE_SCHEMA)
+        cursor = connection.executemany(INSERT_QUERY, rows)
+        connection.commit()
+        return cursor.rowcount
+    finally:
+        connection.close()
+
+
+def retained_bytes(build) -> int:
+    """Bộ nhớ còn được giữ bởi kết quả của build()"""
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    gc.collect()
+    return current
+
+
+def timed(func, *args):
+    started = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - started
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Memory/throughput of dict flights vs columnar FlightBatch")
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', default=os.path.join("data", "benchmarks", "flight_batch.json"))
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    flights, generate_seconds = timed(generate_dicts, args.rows, args.seed)
+    logger.info(f"Generated {args.rows:,} flights in {generate_seconds:.1f}s")
+
+    dict_bytes = retained_bytes(lambda: [dict(f) for f in flights])
+    batch_bytes = retained_bytes(lambda: build_batch(flights))
+
+    dict_rows, dict_seconds = timed(dict_path, flights)
+    batch_rows, batch_seconds = timed(batch_path, flights)
+
+    results = {
+        'rows': args.rows,
+        'dict': {'retained_bytes': dict_bytes, 'bytes_per_flight': dict_bytes / args.rows,
+                 'seconds': dict_seconds, 'rows_loaded': dict_rows, 'rows_per_second': args.rows / dict_seconds},
+        'batch': {'retained_bytes': batch_bytes, 'bytes_per_flight': batch_bytes / args.rows,
+                  'seconds': batch_seconds, 'rows_loaded': batch_rows, 'rows_per_second': args.rows / batch_seconds},
+    }
+    for name in ('dict', 'batch'):
+        r = results[name]
+        logger.info(f"{name:<6} memory={r['retained_bytes'] / 1024 ** 2:8.1f}MB ({r['bytes_per_flight']:.0f} B/flight) "
+                    f"validate+load={r['seconds']:6.1f}s ({r['rows_per_second']:,.0f} rows/s) loaded={r['rows_loaded']:,}")
+    logger.info(f"FlightBatch uses {dict_bytes / batch_bytes:.1f}x less memory, "
+                f"{dict_seconds / batch_seconds:.2f}x dict throughput")
+
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
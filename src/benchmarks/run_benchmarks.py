@@ -0,0 +1,253 @@
+"""
+Benchmark offline cho parser, loader và transform.
+
+Chạy hoàn toàn không cần DB remote hay trình duyệt: dùng HTML/JSON fixture trong
+src/benchmarks/fixtures, các file CSV trong data/scrap_* và SQLite tạm.
+
+    python -m src.benchmarks.run_benchmarks                     # chạy và ghi data/benchmarks/latest.json
+    python -m src.benchmarks.run_benchmarks --save-baseline     # ghi thêm src/benchmarks/baseline.json
+    python -m src.benchmarks.run_benchmarks --compare           # so sánh với baseline, exit 1 nếu chậm hơn ngưỡng
+"""
+import argparse
+import glob
+import json
+import logging
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from bs4 import BeautifulSoup
+
+from src.benchmarks.stand_ins import FakeDriver, StandInMySQLConnection
+from src.config import sqlite_connector
+from src.config.db_manager import insert_flights_data
+from src.scrapers.AgodaScraper import AgodaScraperV2
+from src.scrapers.BookingScraper import BookingApiScraper
+from src.scrapers.ScraperManager import ScraperManager
+from src.scrapers.TravelokaScraper import TravelScraperV2
+
+logger = logging.getLogger(__name__)
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+FIXTURE_DIR = os.path.join(BENCHMARK_DIR, "fixtures")
+BASELINE_PATH = os.path.join(BENCHMARK_DIR, "baseline.json")
+RESULTS_DIR = os.path.join("data", "benchmarks")
+SEARCH_DATE = datetime(2025, 10, 9)
+
+
+def read_fixture(name: str) -> str:
+    with open(os.path.join(FIXTURE_DIR, name), 'r', encoding='utf-8') as f:
+        return f.read()
+
+
+def repeat_html_body(html: str, container_open: str, times: int) -> str:
+    """Nhân bản các card trong fixture để đo với số lượng lớn hơn"""
+    start = html.index(container_open) + len(container_open)
+    end = html.rindex('</div>\n</div>\n</body>')
+    return html[:start] + html[start:end] * times + html[end:]
+
+
+def get_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return None
+
+
+class BenchmarkRunner:
+    def __init__(self, repeat: int = 5):
+        self.repeat = repeat
+        self.results: Dict[str, Dict] = {}
+
+    def run(self, name: str, func: Callable[[], int], setup: Callable[[], None] = None):
+        """Chạy func `repeat` lần (setup không tính giờ); func trả về số item đã xử lý"""
+        timings: List[float] = []
+        items = 0
+        for _ in range(self.repeat):
+            if setup:
+                setup()
+            start = time.perf_counter()
+            items = func()
+            timings.append(time.perf_counter() - start)
+
+        best = min(timings)
+        self.results[name] = {
+            'items': items,
+            'repeat': self.repeat,
+            'min_seconds': best,
+            'median_seconds': statistics.median(timings),
+            'items_per_second': items / best if best > 0 else 0.0,
+        }
+        logger.info(f"{name:<32} items={items:<7} min={best * 1000:9.2f}ms "
+                    f"median={statistics.median(timings) * 1000:9.2f}ms {self.results[name]['items_per_second']:,.0f}/s")
+
+
+def bench_parsers(runner: BenchmarkRunner, scale: int, dom_scale: int):
+    traveloka = TravelScraperV2("Traveloka.com", "https://www.traveloka.com/vi-vn/flight")
+    html = repeat_html_body(read_fixture("traveloka_results.html"),
+                            '<div class="css-1dbjc4n r-results-list">', scale)
+    cards = BeautifulSoup(html, "html.parser").select("div[data-testid^='flight-inventory-card-container']")
+
+    def parse_cards():
+        for card in cards:
+            traveloka.parse_flight_card(card, SEARCH_DATE)
+        return len(cards)
+
+    runner.run('parse_flight_card', parse_cards)
+
+    agoda = AgodaScraperV2()
+    # find_flight_elements_dynamic tăng siêu tuyến tính theo số card, dùng scale riêng cỡ một trang kết quả thật
+    driver = FakeDriver(repeat_html_body(read_fixture("agoda_results.html"), '<div id="flights-results">', dom_scale))
+    runner.run('find_flight_elements_dynamic', lambda: len(agoda.find_flight_elements_dynamic(driver)))
+
+    booking = BookingApiScraper()
+    data = json.loads(read_fixture("booking_flight_offers.json"))
+    data['flightOffers'] = data['flightOffers'] * scale
+    runner.run('parse_booking_data', lambda: len(booking.parse_booking_data(data)))
+
+    # Số item là số flight hợp lệ sau validate (kiểm tra đúng/sai nằm trong src/test_validation.py)
+    manager = ScraperManager()
+    flights = booking.parse_booking_data(data)
+    runner.run('clean_flight_data', lambda: len(manager.clean_flight_data(flights)))
+
+
+def bench_loaders(runner: BenchmarkRunner, csv_files: List[str]):
+    from src.main import load_csv_to_sqlite
+
+    if not csv_files:
+        logger.warning("No data/scrap_* CSV files found, skipping loader benchmarks.")
+        return
+
+    total_rows = 0
+    for file_path in csv_files:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            total_rows += sum(1 for _ in f) - 1
+
+    def reset_db():
+        sqlite_connector.init_sqlite_db()
+        sqlite_connector.clear_sqlite_db()
+
+    def load_all():
+        for file_path in csv_files:
+            load_csv_to_sqlite(file_path)
+        return total_rows
+
+    runner.run('load_csv_to_sqlite', load_all, setup=reset_db)
+
+    def load_for_dedup():
+        reset_db()
+        # Load 2 lần để có dữ liệu trùng: bỏ source_file của lần 1 để lần 2 (force) không thay các dòng đó
+        load_all()
+        connection = sqlite_connector.get_sqlite_connection()
+        with connection:
+            connection.execute("UPDATE flights_metadata SET source_file = NULL")
+        connection.close()
+        for file_path in csv_files:
+            load_csv_to_sqlite(file_path, force=True)
+
+    runner.run('process_duplicate_data', lambda: (sqlite_connector.process_duplicate_data() or 0) + total_rows,
+               setup=load_for_dedup)
+
+    booking = BookingApiScraper()
+    offers = json.loads(read_fixture("booking_flight_offers.json"))
+    offers['flightOffers'] = offers['flightOffers'] * max(1, total_rows // len(offers['flightOffers']))
+    flights = booking.parse_booking_data(offers)
+    connection = StandInMySQLConnection()
+
+    def insert_all():
+        insert_flights_data(connection, flights)
+        return len(flights)
+
+    runner.run('insert_flights_data', insert_all)
+    runner.results['insert_flights_data']['statements'] = connection.statements
+    runner.results['insert_flights_data']['bytes_sent'] = connection.bytes_sent
+
+
+def compare(results: Dict, baseline: Dict, threshold: float) -> bool:
+    """In thay đổi so với baseline, trả về False nếu có benchmark chậm hơn ngưỡng"""
+    ok = True
+    logger.info(f"Comparing with baseline (commit {baseline.get('commit')}, {baseline.get('created_at')}):")
+    for name, result in results['results'].items():
+        base = baseline.get('results', {}).get(name)
+        if not base or not base.get('min_seconds'):
+            logger.info(f"  {name:<32} (new)")
+            continue
+        ratio = result['min_seconds'] / base['min_seconds']
+        status = "OK"
+        if ratio > 1 + threshold:
+            status = "REGRESSION"
+            ok = False
+        logger.info(f"  {name:<32} {ratio:6.2f}x baseline  {status}")
+    return ok
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline benchmarks for parsers, loaders and transforms")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--scale', type=int, default=200, help="Số lần nhân bản card trong fixture")
+    parser.add_argument('--dom-scale', type=int, default=8,
+                        help="Số lần nhân bản card cho find_flight_elements_dynamic")
+    parser.add_argument('--data-glob', default=os.path.join("data", "scrap_*", "*.csv"))
+    parser.add_argument('--output', default=os.path.join(RESULTS_DIR, "latest.json"))
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--compare', action='store_true')
+    parser.add_argument('--threshold', type=float, default=0.2, help="Tỉ lệ chậm hơn cho phép khi --compare")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    runner = BenchmarkRunner(repeat=args.repeat)
+
+    tmp_dir = tempfile.mkdtemp(prefix="flight_bench_")
+    original_db_path = sqlite_connector.SQLITE_DB_PATH
+    sqlite_connector.SQLITE_DB_PATH = os.path.join(tmp_dir, "metadata.sqlite")
+    logging.getLogger().setLevel(logging.WARNING)
+    logger.setLevel(logging.INFO)
+    try:
+        bench_parsers(runner, args.scale, args.dom_scale)
+        bench_loaders(runner, sorted(glob.glob(args.data_glob)))
+    finally:
+        sqlite_connector.SQLITE_DB_PATH = original_db_path
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    results = {
+        'commit': get_commit(),
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'scale': args.scale,
+        'dom_scale': args.dom_scale,
+        'results': runner.results,
+    }
+
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    logger.info(f"Results written to {args.output}")
+
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        logger.info(f"Baseline written to {args.baseline}")
+
+    if args.compare:
+        if not os.path.exists(args.baseline):
+            logger.error(f"Baseline not found: {args.baseline}")
+            return 1
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        if not compare(results, baseline, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
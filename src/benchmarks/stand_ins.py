@@ -0,0 +1,55 @@
+import pymysql
+import pymysql.connections
+import pymysql.cursors
+
+
+class FakeDriver:
+    """Thay cho Selenium WebDriver, chỉ cung cấp page_source từ fixture"""
+
+    def __init__(self, page_source: str):
+        self.page_source = page_source
+
+    def execute_script(self, script, *args):
+        return 0
+
+    def quit(self):
+        pass
+
+
+class StandInCursor(pymysql.cursors.DictCursor):
+    """
+    Cursor PyMySQL thật (escape, mogrify, gộp executemany thành multi-row INSERT)
+    nhưng không gửi câu lệnh qua mạng, chỉ đếm số câu lệnh và số byte.
+    """
+
+    def _query(self, q):
+        conn = self._get_db()
+        conn.statements += 1
+        conn.bytes_sent += len(q.encode(conn.encoding) if isinstance(q, str) else q)
+        self._executed = q
+        self.rowcount = 0
+        return 0
+
+
+class StandInMySQLConnection(pymysql.connections.Connection):
+    """Connection PyMySQL không kết nối (defer_connect) dùng cho benchmark offline"""
+
+    def __init__(self):
+        super().__init__(defer_connect=True, charset='utf8mb4', cursorclass=StandInCursor)
+        # Các thuộc tính thường được server gửi về khi handshake
+        self.server_status = 0
+        self.statements = 0
+        self.bytes_sent = 0
+        self.commits = 0
+
+    def cursor(self, cursor=None):
+        return StandInCursor(self)
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
@@ -0,0 +1,79 @@
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, Optional
+
+
+class TTLCache:
+    """Cache dùng chung giữa các thread, mỗi entry có thời hạn (TTL) riêng"""
+
+    def __init__(self, name: str, ttl_seconds: float = 300):
+        self.name = name
+        self.ttl_seconds = ttl_seconds
+        self._entries: Dict[Hashable, tuple] = {}
+        self._lock = threading.Lock()
+        self._key_locks: Dict[Hashable, threading.Lock] = {}
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Lấy giá trị còn hạn, trả về None nếu không có hoặc đã hết hạn"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] > time.monotonic():
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            return None
+
+    def set(self, key: Hashable, value: Any, ttl_seconds: Optional[float] = None):
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any], ttl_seconds: Optional[float] = None) -> Any:
+        """
+        Trả về giá trị trong cache, nếu miss thì gọi loader.
+        Chỉ một thread được load cho mỗi key, các thread khác chờ và dùng lại kết quả.
+        Kết quả None (query lỗi) không được cache.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] > time.monotonic():
+                self.hits += 1
+                return entry[1]
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        with key_lock:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry and entry[0] > time.monotonic():
+                    self.hits += 1
+                    return entry[1]
+                self.misses += 1
+
+            value = loader()
+            if value is not None:
+                self.set(key, value, ttl_seconds)
+            return value
+
+    def invalidate(self, key: Optional[Hashable] = None):
+        """Xóa một key, hoặc toàn bộ cache nếu key là None"""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+            self.invalidations += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'name': self.name,
+                'size': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'invalidations': self.invalidations,
+                'hit_rate': round(self.hits / total, 4) if total else 0.0,
+            }
@@ -1,27 +1,55 @@
 # config/config_manager.py
+import copy
 import json
 import os
 from typing import Dict, List, Any, Optional
 from datetime import datetime
+from src.config.cache_manager import TTLCache
+
+# Cache nội dung file config dùng chung giữa các instance, key theo (path, mtime, size)
+# nên file bị sửa sẽ tự động được đọc lại
+CONFIG_FILE_CACHE_TTL = float(os.getenv('CONFIG_FILE_CACHE_TTL', 300))
+_config_file_cache = TTLCache('config_file', CONFIG_FILE_CACHE_TTL)
+
+
+def get_config_file_cache_stats() -> Dict[str, Any]:
+    """Lấy số liệu hit/miss của cache file config"""
+    return _config_file_cache.stats()
+
 
 class ConfigManager:
     """Manager class để quản lý cấu hình cho các website scraping"""
     
     def __init__(self, config_file: str = "provider_configs.json"):
         self.config_file = config_file
+        # configs được chia sẻ qua cache, chỉ copy khi cần sửa (copy-on-write)
+        self._owns_configs = False
         self.configs = self._load_configs()
     
     def _load_configs(self) -> Dict[str, Any]:
-        """Load cấu hình từ file JSON"""
+        """Load cấu hình từ file JSON (qua cache dùng chung)"""
         try:
             if os.path.exists(self.config_file):
-                with open(self.config_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
+                stat = os.stat(self.config_file)
+                key = (os.path.abspath(self.config_file), stat.st_mtime_ns, stat.st_size)
+                return _config_file_cache.get_or_load(key, self._read_config_file)
             else:
+                self._owns_configs = True
                 return self._get_default_configs()
         except Exception as e:
             print(f"Error loading config file: {e}")
+            self._owns_configs = True
             return self._get_default_configs()
+
+    def _read_config_file(self) -> Dict[str, Any]:
+        with open(self.config_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def _ensure_private_configs(self):
+        """Copy configs trước khi sửa để không làm thay đổi bản dùng chung trong cache"""
+        if not self._owns_configs:
+            self.configs = copy.deepcopy(self.configs)
+            self._owns_configs = True
     
     def _get_default_configs(self) -> Dict[str, Any]:
         """Lấy cấu hình mặc định cho 3 website"""
@@ -206,6 +234,7 @@ class ConfigManager:
     def update_config(self, provider: str, config_data: Dict[str, Any]) -> bool:
         """Cập nhật cấu hình cho một provider"""
         try:
+            self._ensure_private_configs()
             self.configs[provider] = config_data
             self._save_configs()
             return True
@@ -219,6 +248,7 @@ class ConfigManager:
             if provider not in self.configs:
                 return False
             
+            self._ensure_private_configs()
             if 'field_mappings' not in self.configs[provider]:
                 self.configs[provider]['field_mappings'] = {}
             
@@ -233,6 +263,7 @@ class ConfigManager:
         """Set trạng thái active/inactive cho provider"""
         try:
             if provider in self.configs:
+                self._ensure_private_configs()
                 self.configs[provider]['is_active'] = is_active
                 self._save_configs()
                 return True
@@ -246,6 +277,7 @@ class ConfigManager:
         try:
             with open(self.config_file, 'w', encoding='utf-8') as f:
                 json.dump(self.configs, f, indent=4, ensure_ascii=False)
+            _config_file_cache.invalidate()
             return True
         except Exception as e:
             print(f"Error saving config file: {e}")
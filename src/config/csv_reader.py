@@ -0,0 +1,106 @@
+import codecs
+import csv
+import logging
+import mmap
+import os
+from typing import Dict, Iterator, List, Optional, Sequence
+
+from src.model.FlightRecord import FIELD_ALIASES, FLIGHT_FIELDS
+
+logger = logging.getLogger(__name__)
+
+CSV_CHUNK_SIZE = int(os.getenv('CSV_CHUNK_SIZE', 5000))
+# File lớn hơn ngưỡng này được đọc qua mmap (page cache của OS) thay cho buffer của file object
+CSV_MMAP_THRESHOLD_MB = int(os.getenv('CSV_MMAP_THRESHOLD_MB', 64))
+
+# Giá trị mặc định giống FlightRecord khi cột thiếu hoặc rỗng
+FIELD_DEFAULTS = {'currency': 'VND', 'stops': 0, 'aircraft_type': '', 'baggage_info': '', 'meal_info': '',
+                  'seat_class': '', 'booking_url': ''}
+
+
+def column_names(field: str) -> List[str]:
+    """Tên cột CSV có thể chứa field: tên chuẩn và tên cũ (destination_airport, duration_time...)"""
+    field = FIELD_ALIASES.get(field, field)
+    return [field] + [old for old, new in FIELD_ALIASES.items() if new == field]
+
+
+def resolve_columns(header: Sequence[str], fields: Sequence[str]) -> Dict[str, Optional[str]]:
+    """field -> tên cột có trong header (None nếu file không có cột đó), dùng chung cho mọi layout"""
+    present = set(header)
+    return {field: next((name for name in column_names(field) if name in present), None) for field in fields}
+
+
+def source_from_path(path: str) -> str:
+    """data/scrap_YYYYMMDD/Traveloka.com.csv -> Traveloka.com"""
+    return os.path.splitext(os.path.basename(path))[0]
+
+
+def _lines(path: str, use_mmap: bool):
+    """Trả về (iterator các dòng text, hàm đóng file)"""
+    f = open(path, 'rb')
+    if use_mmap and os.path.getsize(path) > 0:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        decoder = codecs.getincrementaldecoder('utf-8-sig')()
+
+        def close():
+            mapped.close()
+            f.close()
+        return (decoder.decode(line) for line in iter(mapped.readline, b'')), close
+    text = open(f.fileno(), 'r', encoding='utf-8-sig', newline='', closefd=False)
+
+    def close():
+        text.close()
+        f.close()
+    return text, close
+
+
+def iter_csv_chunks(path: str, fields: Sequence[str] = FLIGHT_FIELDS, chunk_size: int = CSV_CHUNK_SIZE,
+                    default_source: Optional[str] = None, use_mmap: Optional[bool] = None) -> Iterator[List[tuple]]:
+    """
+    Đọc CSV chuyến bay theo từng chunk tuple (thứ tự `fields`), bộ nhớ không phụ thuộc kích thước file.
+    Header được map sang field một lần: chấp nhận layout của mọi source (tên cột cũ của Traveloka,
+    thứ tự cột khác nhau của Agoda/Booking); cột thiếu hoặc rỗng lấy mặc định như FlightRecord,
+    source thiếu thì lấy theo tên file (default_source).
+    """
+    if use_mmap is None:
+        use_mmap = os.path.getsize(path) > CSV_MMAP_THRESHOLD_MB * 1024 * 1024
+    if default_source is None:
+        default_source = source_from_path(path)
+    lines, close = _lines(path, use_mmap)
+    try:
+        reader = csv.reader(lines)
+        header = [name.strip() for name in next(reader, [])]
+        if not header:
+            return
+        index = {name: i for i, name in enumerate(header)}
+        columns = resolve_columns(header, fields)
+        missing = [field for field, name in columns.items() if name is None]
+        if missing:
+            logger.debug(f"{path}: no column for {missing}")
+        positions = [index[columns[field]] if columns[field] else None for field in fields]
+        defaults = [default_source if field == 'source' else FIELD_DEFAULTS.get(field) for field in fields]
+        width = len(header)
+        # route thiếu thì ghép từ sân bay đi/đến như FlightRecord
+        route_at = fields.index('route') if 'route' in fields else None
+        airports = [index[name] if name else None
+                    for name in resolve_columns(header, ('departure_airport', 'arrival_airport')).values()]
+        if None in airports:
+            route_at = None
+
+        chunk = []
+        for row in reader:
+            if not row:
+                continue
+            if len(row) < width:
+                row += [''] * (width - len(row))
+            values = tuple(row[p] or d if p is not None else d for p, d in zip(positions, defaults))
+            if route_at is not None and values[route_at] is None and row[airports[0]] and row[airports[1]]:
+                values = values[:route_at] + (f"{row[airports[0]]}-{row[airports[1]]}",) + values[route_at + 1:]
+            chunk.append(values)
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+    finally:
+        close()
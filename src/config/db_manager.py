@@ -1,5 +1,11 @@
 from rich.logging import RichHandler
 import logging
+import os
+import threading
+import time
+from src.config.cache_manager import TTLCache
+from src.config.log_sink import get_log_sink
+from src.model.FlightRecord import FLIGHT_FIELDS, to_db_tuples
 
 logging.basicConfig(
     level=logging.INFO,
@@ -9,6 +15,17 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Cache cho config/field mappings/airport, tránh query DB remote ở mỗi lần gọi
+CONFIG_CACHE_TTL = float(os.getenv('CONFIG_CACHE_TTL', 300))
+AIRPORT_CACHE_TTL = float(os.getenv('AIRPORT_CACHE_TTL', 3600))
+# Khoảng thời gian tối thiểu giữa 2 lần kiểm tra config.updated_at
+CONFIG_VERSION_CHECK_INTERVAL = float(os.getenv('CONFIG_VERSION_CHECK_INTERVAL', 30))
+
+_config_cache = TTLCache('config', CONFIG_CACHE_TTL)
+_airport_cache = TTLCache('airport', AIRPORT_CACHE_TTL)
+_config_version = {'value': None, 'checked_at': None}
+_config_version_lock = threading.Lock()
+
 def execute_query(connection, query, data=None):
     """Hàm chung để thực thi một câu lệnh SQL"""
     cursor = connection.cursor()
@@ -26,12 +43,12 @@ def execute_query(connection, query, data=None):
     finally:
         cursor.close()
 
-def execute_read_query(connection, query):
+def execute_read_query(connection, query, data=None):
     """Hàm chung để thực thi câu lệnh SELECT và trả về kết quả"""
     cursor = connection.cursor()
     result = None
     try:
-        cursor.execute(query)
+        cursor.execute(query, data)
         result = cursor.fetchall()
         return result
     except Exception as e:
@@ -149,34 +166,80 @@ def setup_database(connection):
 
 
 def log_message(connection, level, message, source_name=None, route=None):
+    """Ghi log vào bảng logs. Nếu log sink đang chạy thì đưa vào queue thay vì insert trực tiếp."""
+    sink = get_log_sink()
+    if sink is not None:
+        sink.submit(level, message, source_name, route)
+        return
+
     query = "INSERT INTO logs (level, message, source_name, route) VALUES (%s, %s, %s, %s)"
     execute_query(connection, query, (level, message, source_name, route))
 
 
-def get_active_configs(connection):
+def _sync_config_version(connection):
+    """
+    Kiểm tra MAX(config.updated_at), nếu thay đổi thì invalidate cache config và field mappings.
+    Việc kiểm tra được giới hạn theo CONFIG_VERSION_CHECK_INTERVAL để không query ở mỗi lần gọi.
+    """
+    now = time.monotonic()
+    with _config_version_lock:
+        checked_at = _config_version['checked_at']
+        if checked_at is not None and now - checked_at < CONFIG_VERSION_CHECK_INTERVAL:
+            return
+        _config_version['checked_at'] = now
+
+    rows = execute_read_query(connection, "SELECT MAX(updated_at) AS version FROM config")
+    if rows is None:
+        return
+    version = rows[0].get('version') if rows else None
+
+    with _config_version_lock:
+        if version != _config_version['value']:
+            if _config_version['value'] is not None:
+                logger.info(f"Config changed (updated_at={version}), invalidating config cache.")
+            _config_cache.invalidate()
+            _config_version['value'] = version
+
+
+def get_active_configs(connection, use_cache=True):
     query = "SELECT source_name, url, scraper_class, scrap_type FROM config WHERE is_active = TRUE"
-    configs = execute_read_query(connection, query)
-    return configs
+    if not use_cache:
+        return execute_read_query(connection, query)
 
+    _sync_config_version(connection)
+    return _config_cache.get_or_load('active_configs', lambda: execute_read_query(connection, query))
 
-def get_field_mappings(connection, source_name):
+
+def get_field_mappings(connection, source_name, use_cache=True):
     """Lấy field mappings cho một source cụ thể."""
     query = "SELECT field_name, selector_type, selector_value, is_required, data_type FROM field_mappings WHERE source_name = %s"
-    mappings = execute_read_query(connection, query, (source_name,))
-    return mappings
+    if not use_cache:
+        return execute_read_query(connection, query, (source_name,))
 
+    _sync_config_version(connection)
+    return _config_cache.get_or_load(
+        ('field_mappings', source_name),
+        lambda: execute_read_query(connection, query, (source_name,))
+    )
 
-def insert_flights_data(connection, flights):
-    """
-    Chèn một danh sách các chuyến bay vào bảng flights.
-    Sử dụng ON DUPLICATE KEY UPDATE để tránh trùng lặp.
-    """
-    if not flights:
-        return
 
-    query = """
-    INSERT INTO flights (flight_code, airline, departure_airport, arrival_airport, departure_time, arrival_time, duration_minutes, price, currency, source, route, stops, aircraft_type, baggage_info, meal_info, seat_class, booking_url)
-    VALUES (%(flight_code)s, %(airline)s, %(departure_airport)s, %(arrival_airport)s, %(departure_time)s, %(arrival_time)s, %(duration_minutes)s, %(price)s, %(currency)s, %(source)s, %(route)s, %(stops)s, %(aircraft_type)s, %(baggage_info)s, %(meal_info)s, %(seat_class)s, %(booking_url)s)
+def get_cache_stats():
+    """Lấy số liệu hit/miss của các cache dữ liệu tham chiếu"""
+    return [_config_cache.stats(), _airport_cache.stats()]
+
+
+def invalidate_reference_cache():
+    """Xóa toàn bộ cache config, field mappings và airport"""
+    _config_cache.invalidate()
+    _airport_cache.invalidate()
+    with _config_version_lock:
+        _config_version['value'] = None
+        _config_version['checked_at'] = None
+
+
+INSERT_FLIGHTS_QUERY = f"""
+    INSERT INTO flights ({', '.join(FLIGHT_FIELDS)})
+    VALUES ({', '.join(['%s'] * len(FLIGHT_FIELDS))})
     ON DUPLICATE KEY UPDATE
         airline = VALUES(airline),
         arrival_airport = VALUES(arrival_airport),
@@ -192,7 +255,36 @@ def insert_flights_data(connection, flights):
         booking_url = VALUES(booking_url),
         scraped_at = CURRENT_TIMESTAMP;
     """
-    execute_query(connection, query, flights)
+
+
+def insert_flights_data(connection, flights):
+    """
+    Chèn một danh sách các chuyến bay (FlightRecord hoặc dict) vào bảng flights.
+    Sử dụng ON DUPLICATE KEY UPDATE để tránh trùng lặp.
+    """
+    if not flights:
+        return
+
+    execute_query(connection, INSERT_FLIGHTS_QUERY, to_db_tuples(flights))
+
+
+def insert_flight_rows(connection, rows):
+    """
+    Chèn một batch tuple theo thứ tự FLIGHT_FIELDS vào bảng flights trong một transaction.
+    Khác execute_query: lỗi được rollback và raise lại để caller biết batch chưa được ghi.
+    """
+    if not rows:
+        return 0
+    cursor = connection.cursor()
+    try:
+        cursor.executemany(INSERT_FLIGHTS_QUERY, rows)
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        cursor.close()
+    return len(rows)
 
 
 def update_field_mapping(connection, source_name, field_name, selector_type, selector_value, is_required=False, data_type='text'):
@@ -207,13 +299,21 @@ def update_field_mapping(connection, source_name, field_name, selector_type, sel
         data_type = VALUES(data_type);
     """
     execute_query(connection, query, (source_name, field_name, selector_type, selector_value, is_required, data_type))
+    _config_cache.invalidate(('field_mappings', source_name))
 
 
-def get_airport(connection):
+def get_airport(connection, use_cache=True):
     query = "SELECT code FROM airport where status = 'ACTIVE'"
-    airports = execute_read_query(connection, query)
-    if airports is None :
+
+    def load_airports():
+        airports = execute_read_query(connection, query)
+        if airports is None:
+            return None
+        return [row['code'] for row in airports]
+
+    codes = _airport_cache.get_or_load('active_airports', load_airports) if use_cache else load_airports()
+    if codes is None:
         logger.error("No airport found in database.")
         return []
-    return [row['code'] for row in airports]
+    return list(codes)
 
@@ -0,0 +1,78 @@
+import hashlib
+import logging
+import os
+from collections import namedtuple
+from datetime import datetime
+from typing import Iterable, Optional
+
+from src.model.FlightRecord import SQLITE_COLUMNS
+
+logger = logging.getLogger(__name__)
+
+CHECKSUM_BLOCK_SIZE = 1024 * 1024
+
+# Dấu vết của một file CSV: mtime_ns để so nhanh, checksum chỉ tính khi size/mtime đổi
+FileFingerprint = namedtuple('FileFingerprint', ['path', 'size', 'mtime_ns', 'checksum'])
+
+
+def manifest_key(path: str) -> str:
+    """Đường dẫn chuẩn hóa (tương đối theo thư mục chạy) dùng làm khóa manifest và cột source_file"""
+    return os.path.normpath(os.path.relpath(os.path.abspath(path))).replace(os.sep, '/')
+
+
+def file_checksum(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(CHECKSUM_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def fingerprint(path: str, checksum: str = None) -> FileFingerprint:
+    stat = os.stat(path)
+    return FileFingerprint(manifest_key(path), stat.st_size, stat.st_mtime_ns, checksum or file_checksum(path))
+
+
+def changed_file(connection, path: str) -> Optional[FileFingerprint]:
+    """
+    Fingerprint mới nếu file cần load (chưa có trong manifest hoặc nội dung đã đổi), None nếu đã load.
+    Cùng size + mtime thì bỏ qua không đọc file; chỉ mtime đổi (copy, touch) mà checksum giữ nguyên
+    thì cập nhật mtime trong manifest và vẫn bỏ qua.
+    """
+    key = manifest_key(path)
+    stat = os.stat(path)
+    entry = connection.execute("SELECT size, mtime_ns, checksum FROM load_manifest WHERE path = ?", (key,)).fetchone()
+    if entry and entry[0] == stat.st_size and entry[1] == stat.st_mtime_ns:
+        return None
+    checksum = file_checksum(path)
+    if entry and entry[0] == stat.st_size and entry[2] == checksum:
+        with connection:
+            connection.execute("UPDATE load_manifest SET mtime_ns = ? WHERE path = ?", (stat.st_mtime_ns, key))
+        return None
+    return FileFingerprint(key, stat.st_size, stat.st_mtime_ns, checksum)
+
+
+def replace_file_rows(connection, file: FileFingerprint, chunks: Iterable[Iterable[tuple]], source: str) -> int:
+    """
+    Thay toàn bộ dòng của file trong flights_metadata (xóa theo source_file rồi insert lại) và ghi manifest
+    trong cùng một transaction, lỗi giữa chừng thì DB giữ nguyên dữ liệu cũ của file.
+    """
+    columns = SQLITE_COLUMNS + ('source_file',)
+    insert_query = (f"INSERT INTO flights_metadata ({', '.join(columns)}) "
+                    f"VALUES ({', '.join('?' * len(columns))})")
+    with connection:
+        replaced = connection.execute("DELETE FROM flights_metadata WHERE source_file = ?", (file.path,)).rowcount
+        rows = 0
+        for chunk in chunks:
+            rows += connection.executemany(insert_query, (tuple(row) + (file.path,) for row in chunk)).rowcount
+        connection.execute("""
+            INSERT INTO load_manifest (path, size, mtime_ns, checksum, row_count, source, loaded_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(path) DO UPDATE SET size = excluded.size, mtime_ns = excluded.mtime_ns,
+                checksum = excluded.checksum, row_count = excluded.row_count, source = excluded.source,
+                loaded_at = excluded.loaded_at
+        """, (file.path, file.size, file.mtime_ns, file.checksum, rows, source,
+              datetime.now().isoformat(timespec='seconds')))
+    if replaced:
+        logger.info(f"Replaced {replaced} rows of {file.path} with {rows} rows")
+    return rows
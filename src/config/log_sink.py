@@ -0,0 +1,207 @@
+import atexit
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+from typing import Callable, List, Optional
+
+from src.config.db_connector import get_db_connection
+
+logger = logging.getLogger(__name__)
+
+INSERT_LOGS_QUERY = "INSERT INTO logs (timestamp, level, message, source_name, route) VALUES (%s, %s, %s, %s, %s)"
+
+
+class AsyncLogSink:
+    """
+    Ghi log vào bảng logs ở background thread.
+    Record được đưa vào queue có giới hạn, flush theo batch (theo số lượng hoặc thời gian).
+    Khi DB không kết nối được thì ghi ra file JSONL local. submit() không bao giờ block.
+    """
+
+    def __init__(self,
+                 connection_factory: Callable = get_db_connection,
+                 max_queue_size: int = 10000,
+                 batch_size: int = 200,
+                 flush_interval: float = 2.0,
+                 fallback_dir: str = os.path.join("data", "logs"),
+                 reconnect_delay: float = 30.0):
+        self.connection_factory = connection_factory
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.fallback_dir = fallback_dir
+        self.reconnect_delay = reconnect_delay
+
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._connection = None
+        self._retry_db_at = 0.0
+
+        self.submitted = 0
+        self.dropped = 0
+        self.written_db = 0
+        self.written_fallback = 0
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="log-sink", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10.0):
+        """Dừng thread và flush toàn bộ record còn trong queue"""
+        if not self._thread:
+            return
+        self._stop_event.set()
+        self._thread.join(timeout)
+        self._thread = None
+        if self._connection:
+            try:
+                self._connection.close()
+            except Exception:
+                pass
+            self._connection = None
+
+    def submit(self, level, message, source_name=None, route=None) -> bool:
+        """Đưa record vào queue, trả về False (và đếm dropped) nếu queue đầy"""
+        record = (datetime.now().strftime('%Y-%m-%d %H:%M:%S'), level, message, source_name, route)
+        try:
+            self._queue.put_nowait(record)
+            self.submitted += 1
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def stats(self):
+        return {
+            'submitted': self.submitted,
+            'dropped': self.dropped,
+            'written_db': self.written_db,
+            'written_fallback': self.written_fallback,
+            'pending': self._queue.qsize(),
+        }
+
+    def _run(self):
+        batch: List[tuple] = []
+        last_flush = time.monotonic()
+
+        while True:
+            timeout = max(0.0, self.flush_interval - (time.monotonic() - last_flush))
+            try:
+                batch.append(self._queue.get(timeout=timeout))
+            except queue.Empty:
+                pass
+
+            stopping = self._stop_event.is_set()
+            if stopping:
+                # Lấy hết record còn lại trong queue
+                while True:
+                    try:
+                        batch.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+
+            if batch and (len(batch) >= self.batch_size
+                          or time.monotonic() - last_flush >= self.flush_interval
+                          or stopping):
+                for i in range(0, len(batch), self.batch_size):
+                    self._flush(batch[i:i + self.batch_size])
+                batch = []
+                last_flush = time.monotonic()
+            elif not batch:
+                last_flush = time.monotonic()
+
+            if stopping:
+                return
+
+    def _get_connection(self):
+        if self._connection is not None:
+            return self._connection
+        if time.monotonic() < self._retry_db_at:
+            return None
+        try:
+            self._connection = self.connection_factory()
+        except Exception as e:
+            logger.warning(f"Log sink cannot connect to database: {e}")
+            self._connection = None
+        if self._connection is None:
+            self._retry_db_at = time.monotonic() + self.reconnect_delay
+        return self._connection
+
+    def _flush(self, batch: List[tuple]):
+        connection = self._get_connection()
+        if connection is not None:
+            cursor = None
+            try:
+                cursor = connection.cursor()
+                cursor.executemany(INSERT_LOGS_QUERY, batch)
+                connection.commit()
+                self.written_db += len(batch)
+                return
+            except Exception as e:
+                logger.warning(f"Log sink failed to write {len(batch)} records to database: {e}")
+                try:
+                    connection.close()
+                except Exception:
+                    pass
+                self._connection = None
+                self._retry_db_at = time.monotonic() + self.reconnect_delay
+            finally:
+                if cursor is not None:
+                    try:
+                        cursor.close()
+                    except Exception:
+                        pass
+
+        self._write_fallback(batch)
+
+    def _write_fallback(self, batch: List[tuple]):
+        try:
+            os.makedirs(self.fallback_dir, exist_ok=True)
+            file_path = os.path.join(self.fallback_dir, f"logs_{datetime.now().strftime('%Y%m%d')}.jsonl")
+            with open(file_path, 'a', encoding='utf-8') as f:
+                for timestamp, level, message, source_name, route in batch:
+                    f.write(json.dumps({
+                        'timestamp': timestamp,
+                        'level': level,
+                        'message': message,
+                        'source_name': source_name,
+                        'route': route,
+                    }, ensure_ascii=False) + "\n")
+            self.written_fallback += len(batch)
+        except Exception as e:
+            logger.error(f"Log sink failed to write fallback file: {e}")
+
+
+_sink: Optional[AsyncLogSink] = None
+_sink_lock = threading.Lock()
+
+
+def start_log_sink(**kwargs) -> AsyncLogSink:
+    """Khởi tạo và chạy log sink dùng chung, log_message sẽ tự động đi qua sink"""
+    global _sink
+    with _sink_lock:
+        if _sink is None:
+            _sink = AsyncLogSink(**kwargs)
+            atexit.register(stop_log_sink)
+        _sink.start()
+        return _sink
+
+
+def stop_log_sink(timeout: float = 10.0):
+    global _sink
+    with _sink_lock:
+        sink, _sink = _sink, None
+    if sink:
+        sink.stop(timeout)
+        logger.info(f"Log sink stopped: {sink.stats()}")
+
+
+def get_log_sink() -> Optional[AsyncLogSink]:
+    return _sink
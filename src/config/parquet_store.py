@@ -0,0 +1,219 @@
+"""
+Lưu chuyến bay dạng Parquet (zstd), chia partition theo ngày scrape và source:
+
+    data/parquet/scrape_date=2025-10-09/source=Booking.com/flights.parquet
+
+Dữ liệu trong file được sắp theo route, departure_time và chia row group nhỏ để min/max statistics
+của mỗi row group cho phép bỏ qua các route không cần khi đọc. Đọc bằng pyarrow.dataset nên các
+partition ngoài khoảng ngày/source được lọc mà không cần mở file.
+
+    python -m src.config.parquet_store --convert "data/scrap_*"     # chuyển CSV cũ sang Parquet
+"""
+import argparse
+import glob
+import logging
+import os
+import re
+import time
+from datetime import date, datetime
+from typing import Iterable, List, Optional, Union
+
+import numpy as np
+
+from src.config.csv_reader import iter_csv_chunks
+from src.model.FlightBatch import DATETIME_FIELDS, NUMERIC_FIELDS, STRING_FIELDS, FlightBatch
+from src.model.FlightRecord import FLIGHT_FIELDS, FlightRecord
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow là dependency tùy chọn, thiếu thì chỉ ghi CSV
+    pa = None
+
+logger = logging.getLogger(__name__)
+
+PARQUET_ROOT = os.getenv('PARQUET_ROOT', os.path.join("data", "parquet"))
+PARQUET_COMPRESSION = os.getenv('PARQUET_COMPRESSION', 'zstd')
+ROW_GROUP_SIZE = int(os.getenv('PARQUET_ROW_GROUP_SIZE', 8192))
+PARTITION_FILE = "flights.parquet"
+SCRAP_FOLDER_PATTERN = re.compile(r"scrap_(\d{8})$")
+
+# Các cột chuỗi ít giá trị khác nhau được giữ dạng dictionary trong Parquet
+DICTIONARY_FIELDS = ('airline', 'departure_airport', 'arrival_airport', 'currency', 'source', 'route', 'seat_class')
+
+
+def is_available() -> bool:
+    return pa is not None
+
+
+def _arrow_type(field: str):
+    if field in DATETIME_FIELDS:
+        return pa.timestamp('s')
+    if field in NUMERIC_FIELDS:
+        return pa.from_numpy_dtype(NUMERIC_FIELDS[field])
+    if field in DICTIONARY_FIELDS:
+        return pa.dictionary(pa.int32(), pa.string())
+    return pa.string()
+
+
+def flight_schema():
+    """Schema Arrow của file Parquet (không gồm 2 cột partition)"""
+    return pa.schema([pa.field(f, _arrow_type(f)) for f in FLIGHT_FIELDS if f != 'source'])
+
+
+def batch_to_table(batch: FlightBatch):
+    """Chuyển thẳng các cột NumPy của FlightBatch sang Arrow, không tạo object cho từng dòng"""
+    arrays = []
+    for field in FLIGHT_FIELDS:
+        if field == 'source':
+            continue
+        column = batch.columns[field]
+        null_mask = batch.null_mask(field)
+        if field in STRING_FIELDS:
+            dictionary = pa.array(batch.dictionaries[field].values, type=pa.string())
+            indices = pa.array(np.where(null_mask, 0, column), type=pa.int32(), mask=null_mask)
+            array = pa.DictionaryArray.from_arrays(indices, dictionary)
+            if field not in DICTIONARY_FIELDS:
+                array = array.dictionary_decode()
+        else:
+            array = pa.array(column, type=_arrow_type(field), mask=null_mask)
+        arrays.append(array)
+    return pa.Table.from_arrays(arrays, schema=flight_schema())
+
+
+def _route_time_order(batch: FlightBatch) -> np.ndarray:
+    """Thứ tự dòng theo (route, departure_time); route so sánh theo chuỗi, không theo mã dictionary"""
+    routes = batch.dictionaries['route'].values
+    rank = np.empty(len(routes) + 1, dtype=np.int32)
+    rank[np.argsort(np.array(routes, dtype=object))] = np.arange(len(routes), dtype=np.int32)
+    rank[len(routes)] = len(routes)  # route thiếu xếp cuối
+    codes = batch.columns['route']
+    return np.lexsort((batch.columns['departure_time'], rank[np.where(codes < 0, len(routes), codes)]))
+
+
+def partition_path(root: str, scrape_date: Union[date, datetime], source_name: str) -> str:
+    return os.path.join(root, f"scrape_date={scrape_date.strftime('%Y-%m-%d')}", f"source={source_name}")
+
+
+def write_parquet(flights, source_name: str, scrape_date: Union[date, datetime] = None,
+                  root: str = PARQUET_ROOT) -> Optional[str]:
+    """Ghi (thay thế) partition scrape_date/source, trả về đường dẫn file"""
+    if pa is None:
+        logger.warning("pyarrow is not installed, skipping Parquet output.")
+        return None
+    batch = flights if isinstance(flights, FlightBatch) else FlightBatch.from_records(flights)
+    if not batch:
+        return None
+
+    # Sắp theo route/giờ bay để statistics của từng row group hẹp lại, lọc route bỏ qua được cả row group
+    table = batch_to_table(batch).take(pa.array(_route_time_order(batch)))
+
+    folder_path = partition_path(root, scrape_date or datetime.now(), source_name)
+    os.makedirs(folder_path, exist_ok=True)
+    file_path = os.path.join(folder_path, PARTITION_FILE)
+    # Tiền tố '.' để dataset bỏ qua file đang ghi dở
+    tmp_path = os.path.join(folder_path, f".{PARTITION_FILE}.tmp")
+    pq.write_table(table, tmp_path, compression=PARQUET_COMPRESSION, row_group_size=ROW_GROUP_SIZE,
+                   write_statistics=True, use_dictionary=list(DICTIONARY_FIELDS))
+    os.replace(tmp_path, file_path)
+    return file_path
+
+
+def open_dataset(root: str = PARQUET_ROOT):
+    partitioning = ds.partitioning(pa.schema([('scrape_date', pa.string()), ('source', pa.string())]),
+                                   flavor='hive')
+    return ds.dataset(root, format='parquet', partitioning=partitioning)
+
+
+def build_filter(start_date: Union[date, datetime, str] = None, end_date: Union[date, datetime, str] = None,
+                 sources: Iterable[str] = None, routes: Iterable[str] = None):
+    """Biểu thức lọc: ngày/source lọc partition, route lọc theo row group statistics"""
+    expression = None
+
+    def combine(condition):
+        nonlocal expression
+        expression = condition if expression is None else expression & condition
+
+    if start_date:
+        combine(ds.field('scrape_date') >= _date_text(start_date))
+    if end_date:
+        combine(ds.field('scrape_date') <= _date_text(end_date))
+    if sources:
+        combine(ds.field('source').isin(list(sources)))
+    if routes:
+        combine(ds.field('route').isin(list(routes)))
+    return expression
+
+
+def read_flights(start_date=None, end_date=None, sources: Iterable[str] = None, routes: Iterable[str] = None,
+                 columns: List[str] = None, root: str = PARQUET_ROOT):
+    """Đọc các chuyến bay trong khoảng ngày scrape (gồm cả 2 đầu) dưới dạng pyarrow.Table"""
+    if pa is None:
+        raise RuntimeError("pyarrow is required to read Parquet flights")
+    if not os.path.isdir(root):
+        schema = flight_schema().append(pa.field('scrape_date', pa.string())).append(pa.field('source', pa.string()))
+        return schema.empty_table() if columns is None else schema.empty_table().select(columns)
+    dataset = open_dataset(root)
+    return dataset.to_table(columns=columns, filter=build_filter(start_date, end_date, sources, routes))
+
+
+def iter_sqlite_rows(table, fields: Iterable[str]):
+    """Tuple theo thứ tự `fields` từ Arrow table, thời gian format lại thành 'YYYY-MM-DD HH:MM:SS'"""
+    columns = []
+    for field in fields:
+        column = table.column(field)
+        if pa.types.is_timestamp(column.type):
+            # Parquet không có đơn vị giây, đọc lại là timestamp[ms]
+            column = column.cast(pa.timestamp('s')).cast(pa.string())
+        elif pa.types.is_dictionary(column.type):
+            column = column.cast(pa.string())
+        columns.append(column.to_pylist())
+    return zip(*columns)
+
+
+def _date_text(value) -> str:
+    return value if isinstance(value, str) else value.strftime('%Y-%m-%d')
+
+
+def convert_csv_folders(pattern: str, root: str = PARQUET_ROOT) -> List[str]:
+    """Chuyển các thư mục data/scrap_YYYYMMDD/<source>.csv đã có sang partition Parquet"""
+    written = []
+    for folder in sorted(glob.glob(pattern)):
+        match = SCRAP_FOLDER_PATTERN.search(os.path.basename(os.path.normpath(folder)))
+        if not match:
+            continue
+        scrape_date = datetime.strptime(match.group(1), "%Y%m%d")
+        for file_path in sorted(glob.glob(os.path.join(folder, "*.csv"))):
+            source_name = os.path.splitext(os.path.basename(file_path))[0]
+            started = time.perf_counter()
+            batch = FlightBatch()
+            for chunk in iter_csv_chunks(file_path, FLIGHT_FIELDS, default_source=source_name):
+                batch.extend(FlightRecord(*row) for row in chunk)
+            # Cột source trong CSV cũ có thể trống, partition luôn lấy theo tên file
+            output = write_parquet(batch, source_name, scrape_date, root)
+            if output:
+                written.append(output)
+                logger.info(f"{file_path} -> {output}: {len(batch)} rows, "
+                            f"{os.path.getsize(file_path) / 1024:.0f}KB -> {os.path.getsize(output) / 1024:.0f}KB "
+                            f"in {time.perf_counter() - started:.2f}s")
+    return written
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Parquet storage for scraped flights")
+    parser.add_argument('--convert', metavar='GLOB', help="Chuyển các thư mục scrap_YYYYMMDD khớp GLOB sang Parquet")
+    parser.add_argument('--root', default=PARQUET_ROOT)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    if not is_available():
+        logger.error("pyarrow is not installed.")
+        return 1
+    if args.convert:
+        convert_csv_folders(args.convert, args.root)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
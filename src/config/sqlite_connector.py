@@ -3,7 +3,7 @@ import sqlite3
 import os
 
 
-SQLITE_DB_PATH = os.path.join(os.getcwd(), "database/metadata.sqlite")
+SQLITE_DB_PATH = os.getenv('SQLITE_DB_PATH', os.path.join(os.getcwd(), "database/metadata.sqlite"))
 
 def get_sqlite_connection():
     try:
@@ -28,13 +28,53 @@ def init_sqlite_db():
                 destination_airport TEXT,
                 destination_time TEXT,
                 duration_time INTEGER,
-                price REAL
+                price REAL,
+                flight_code TEXT,
+                source TEXT,
+                currency TEXT
+                );
+            """)
+            ensure_columns(connection, "flights_metadata", {
+                "flight_code": "TEXT",
+                "source": "TEXT",
+                "currency": "TEXT",
+                "source_file": "TEXT",
+            })
+            connection.execute("CREATE INDEX IF NOT EXISTS idx_flights_metadata_source_file "
+                               "ON flights_metadata (source_file)")
+            # Mỗi file CSV đã load: path, size, mtime, checksum, số dòng (xem load_manifest.py)
+            connection.execute("""
+                CREATE TABLE IF NOT EXISTS load_manifest (
+                path TEXT PRIMARY KEY,
+                size INTEGER,
+                mtime_ns INTEGER,
+                checksum TEXT,
+                row_count INTEGER,
+                source TEXT,
+                loaded_at TEXT
+                );
+            """)
+            # id cuối cùng của flights_metadata đã chuyển sang warehouse (xem warehouse_transfer.py)
+            connection.execute("""
+                CREATE TABLE IF NOT EXISTS transfer_watermark (
+                target TEXT PRIMARY KEY,
+                last_id INTEGER,
+                rows_transferred INTEGER,
+                updated_at TEXT
                 );
             """)
     except sqlite3.Error as e:
         logging.error(f"Error initializing SQLite database: {e}")
 
 
+def ensure_columns(connection, table, columns):
+    """Thêm các cột còn thiếu vào bảng đã tồn tại (migrate DB tạo bởi phiên bản cũ)"""
+    existing = {row[1] for row in connection.execute(f"PRAGMA table_info({table})")}
+    for name, column_type in columns.items():
+        if name not in existing:
+            connection.execute(f"ALTER TABLE {table} ADD COLUMN {name} {column_type}")
+
+
 def clear_sqlite_db():
     connection = get_sqlite_connection()
     if not connection:
@@ -42,6 +82,7 @@ def clear_sqlite_db():
     try:
         with connection:
             connection.execute("DELETE FROM flights_metadata")
+            connection.execute("DELETE FROM load_manifest")
     except sqlite3.Error as e:
         logging.error(f"Error clearing SQLite database: {e}")
 
@@ -0,0 +1,237 @@
+"""
+Sinh dữ liệu chuyến bay giả lập với số lượng lớn để load test pipeline (load, transform, insert).
+
+Output giống hệt file save_to_csv (cột theo FlightRecord, cũng là schema bảng flights),
+hoặc theo layout cũ của từng scraper trước khi có FlightRecord (--layout legacy). Dữ liệu được
+ghi dạng stream nên có thể sinh hàng triệu dòng mà không tốn bộ nhớ.
+
+    python -m src.loadtest.flight_generator --rows 1000000 --source all --duplicate-rate 0.05 --missing-rate 0.01
+"""
+import argparse
+import csv
+import logging
+import math
+import os
+import random
+import time
+import zlib
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Optional
+
+from src.constant.DataSource import DataSource
+from src.model.FlightRecord import FLIGHT_FIELDS
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_AIRPORTS = ["SGN", "HAN", "DAD", "CXR", "PQC", "HPH", "VCA", "HUI", "VII", "DLI"]
+
+# (tên hãng, mã hãng, hệ số giá, tỉ trọng chuyến)
+AIRLINES = [
+    ("VietJet Air", "VJ", 0.85, 0.38),
+    ("Vietnam Airlines", "VN", 1.35, 0.30),
+    ("Bamboo Airways", "QH", 1.10, 0.14),
+    ("Vietravel Airlines", "VU", 0.90, 0.08),
+    ("Pacific Airlines", "BL", 0.95, 0.10),
+]
+
+# Layout CSV cũ của từng scraper (trước FlightRecord), vẫn còn trong các thư mục data/scrap_* cũ
+LEGACY_LAYOUTS = {
+    DataSource.TRAVELOKA_DATA_SRC.value: [
+        "airline", "departure_airport", "departure_time", "destination_airport",
+        "destination_time", "price", "duration_time",
+    ],
+    DataSource.AGODA_DATA_SRC.value: [
+        "flight_code", "airline", "departure_time", "arrival_time", "duration_minutes", "price",
+        "stops", "departure_airport", "arrival_airport", "currency", "source", "route",
+    ],
+    DataSource.BOOKING_DATA_SRC.value: [
+        "flight_code", "airline", "departure_airport", "arrival_airport", "departure_time",
+        "arrival_time", "duration_minutes", "price", "currency", "source", "route", "stops",
+        "aircraft_type", "baggage_info", "meal_info", "seat_class", "booking_url",
+    ],
+}
+
+
+# Các cột có thể bị bỏ trống khi mô phỏng dữ liệu thiếu (các cột mà process_missing_data kiểm tra)
+MISSABLE_FIELDS = {"airline", "departure_airport", "departure_time", "destination_airport", "destination_time",
+                   "arrival_airport", "arrival_time", "duration_time", "duration_minutes", "price"}
+
+
+class FlightDataGenerator:
+    """Sinh các dòng dữ liệu chuyến bay theo layout của từng source"""
+
+    def __init__(self,
+                 airports: List[str] = None,
+                 start_date: datetime = None,
+                 days: int = 30,
+                 duplicate_rate: float = 0.0,
+                 missing_rate: float = 0.0,
+                 price_sigma: float = 0.25,
+                 base_price: float = 1_200_000,
+                 seed: Optional[int] = None):
+        self.airports = airports or DEFAULT_AIRPORTS
+        self.start_date = (start_date or datetime.now() + timedelta(days=1)).replace(hour=0, minute=0, second=0,
+                                                                                      microsecond=0)
+        self.days = max(1, days)
+        self.duplicate_rate = duplicate_rate
+        self.missing_rate = missing_rate
+        self.price_sigma = price_sigma
+        self.base_price = base_price
+        self.rng = random.Random(seed)
+
+        self.routes = [(o, d) for o in self.airports for d in self.airports if o != d]
+        self._airline_weights = [a[3] for a in AIRLINES]
+        # Thời gian bay cơ bản của mỗi route cố định theo hash để các lần chạy giống nhau
+        self._route_minutes = {r: 60 + zlib.crc32(f"{r[0]}{r[1]}".encode()) % 120 for r in self.routes}
+
+    def random_flight(self, source: str) -> Dict:
+        rng = self.rng
+        origin, destination = rng.choice(self.routes)
+        airline, code, price_factor, _ = rng.choices(AIRLINES, weights=self._airline_weights)[0]
+
+        day = self.start_date + timedelta(days=rng.randrange(self.days))
+        departure = day + timedelta(minutes=rng.randrange(5 * 60, 23 * 60, 5))
+        duration = self._route_minutes[(origin, destination)] + rng.randrange(0, 20, 5)
+        arrival = departure + timedelta(minutes=duration)
+
+        route_factor = 0.6 + duration / 150
+        price = self.base_price * price_factor * route_factor * math.exp(rng.gauss(0, self.price_sigma))
+        price = round(price / 100) * 100
+
+        return {
+            "code": code,
+            "flight_number": rng.randrange(100, 1999),
+            "airline": airline,
+            "origin": origin,
+            "destination": destination,
+            "departure": departure,
+            "arrival": arrival,
+            "duration": duration,
+            "price": float(price),
+            "source": source,
+        }
+
+    def format_flight(self, flight: Dict, source: str, layout: str = "record") -> Dict:
+        departure, arrival = flight["departure"], flight["arrival"]
+        route = f"{flight['origin']}-{flight['destination']}"
+
+        if layout == "legacy" and source == DataSource.TRAVELOKA_DATA_SRC.value:
+            # Traveloka giữ nguyên text trên card: giờ HH:MM, giá "1.674.200 VND", thời gian "2h 5m"
+            hours, minutes = divmod(flight["duration"], 60)
+            return {
+                "airline": flight["airline"],
+                "departure_airport": flight["origin"],
+                "departure_time": departure.strftime("%H:%M"),
+                "destination_airport": flight["destination"],
+                "destination_time": arrival.strftime("%H:%M"),
+                "price": f"{int(flight['price']):,} VND".replace(",", "."),
+                "duration_time": f"{hours}h {minutes}m",
+            }
+
+        if source != DataSource.BOOKING_DATA_SRC.value:
+            # Agoda/Traveloka không có số hiệu chuyến, scraper ghép từ tên hãng và giờ bay
+            flight_code = f"{flight['airline'].split()[0].upper()}-{departure.strftime('%H%M')}"
+        else:
+            flight_code = f"{flight['code']}{flight['flight_number']}"
+
+        return {
+            "flight_code": flight_code,
+            "airline": flight["airline"],
+            "departure_airport": flight["origin"],
+            "arrival_airport": flight["destination"],
+            "departure_time": departure.strftime("%Y-%m-%d %H:%M:%S"),
+            "arrival_time": arrival.strftime("%Y-%m-%d %H:%M:%S"),
+            "duration_minutes": flight["duration"],
+            "price": flight["price"],
+            "currency": "VND",
+            "source": source,
+            "route": route,
+            "stops": 0,
+            "aircraft_type": "",
+            "baggage_info": "",
+            "meal_info": "",
+            "seat_class": "ECONOMY",
+            "booking_url": "",
+        }
+
+    def generate(self, source: str, rows: int, layout: str = "record") -> Iterator[List]:
+        """Sinh `rows` dòng (list giá trị theo thứ tự cột của columns())"""
+        columns = self.columns(source, layout)
+        missable = [i for i, c in enumerate(columns) if c in MISSABLE_FIELDS]
+        recent: List[List] = []
+
+        for _ in range(rows):
+            if recent and self.rng.random() < self.duplicate_rate:
+                yield list(self.rng.choice(recent))
+                continue
+
+            values = self.format_flight(self.random_flight(source), source, layout)
+            row = [values[c] for c in columns]
+            if missable and self.rng.random() < self.missing_rate:
+                row[self.rng.choice(missable)] = ""
+
+            # Giữ một cửa sổ nhỏ các dòng gần đây làm nguồn cho dòng trùng
+            if len(recent) < 1000:
+                recent.append(row)
+            else:
+                recent[self.rng.randrange(1000)] = row
+            yield row
+
+    @staticmethod
+    def columns(source: str, layout: str = "record") -> List[str]:
+        return LEGACY_LAYOUTS[source] if layout == "legacy" else list(FLIGHT_FIELDS)
+
+    def write_csv(self, source: str, rows: int, output_dir: str, layout: str = "record") -> str:
+        """Ghi stream ra <output_dir>/scrap_YYYYMMDD/<source>.csv (cùng cấu trúc với save_to_csv)"""
+        folder_path = os.path.join(output_dir, f"scrap_{self.start_date.strftime('%Y%m%d')}")
+        os.makedirs(folder_path, exist_ok=True)
+        file_path = os.path.join(folder_path, f"{source}.csv")
+
+        started = time.perf_counter()
+        with open(file_path, 'w', newline='', encoding='utf-8', buffering=1024 * 1024) as output_file:
+            writer = csv.writer(output_file)
+            writer.writerow(self.columns(source, layout))
+            writer.writerows(self.generate(source, rows, layout))
+
+        elapsed = time.perf_counter() - started
+        logger.info(f"Generated {rows:,} rows for {source} in {elapsed:.1f}s "
+                    f"({rows / elapsed if elapsed else 0:,.0f} rows/s): {file_path}")
+        return file_path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Synthetic flight data generator for load testing")
+    parser.add_argument('--rows', type=int, default=100000, help="Số dòng cho mỗi source")
+    parser.add_argument('--source', default="all", choices=["all"] + [s.value for s in DataSource])
+    parser.add_argument('--layout', default="record", choices=["record", "legacy"],
+                        help="record: giống save_to_csv hiện tại, legacy: layout cũ của từng scraper")
+    parser.add_argument('--airports', default=",".join(DEFAULT_AIRPORTS), help="Danh sách mã sân bay, cách nhau bởi dấu phẩy")
+    parser.add_argument('--start-date', help="YYYY-MM-DD, mặc định là ngày mai")
+    parser.add_argument('--days', type=int, default=30)
+    parser.add_argument('--duplicate-rate', type=float, default=0.05)
+    parser.add_argument('--missing-rate', type=float, default=0.01)
+    parser.add_argument('--price-sigma', type=float, default=0.25, help="Độ lệch chuẩn log-normal của giá")
+    parser.add_argument('--base-price', type=float, default=1_200_000)
+    parser.add_argument('--seed', type=int)
+    parser.add_argument('--output-dir', default=os.path.join("data", "synthetic"))
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    generator = FlightDataGenerator(
+        airports=[a.strip().upper() for a in args.airports.split(",") if a.strip()],
+        start_date=datetime.strptime(args.start_date, "%Y-%m-%d") if args.start_date else None,
+        days=args.days,
+        duplicate_rate=args.duplicate_rate,
+        missing_rate=args.missing_rate,
+        price_sigma=args.price_sigma,
+        base_price=args.base_price,
+        seed=args.seed,
+    )
+
+    sources = [s.value for s in DataSource] if args.source == "all" else [args.source]
+    for source in sources:
+        generator.write_csv(source, args.rows, args.output_dir, args.layout)
+
+
+if __name__ == "__main__":
+    main()
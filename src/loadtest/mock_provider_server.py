@@ -0,0 +1,387 @@
+"""
+Mock server giả lập Booking, Agoda và Traveloka để load test scraper mà không gọi website thật.
+
+    python -m src.loadtest.mock_provider_server --port 8765 --latency-ms 200:800 --error-rate 0.02 --rate-limit-rate 0.05
+
+Sau đó trỏ scraper sang mock bằng cách sửa cột url trong bảng config:
+    Booking.com   -> http://127.0.0.1:8765/api/flights/
+    Agoda.com     -> http://127.0.0.1:8765/flights
+    Traveloka.com -> http://127.0.0.1:8765/vi-vn/flight
+
+GET /__stats trả về số request theo loại và số lỗi đã giả lập.
+Trang kết quả Agoda/Traveloka đặt cookie mock_session; API tìm kiếm JSON ({url}/api/search, dùng cho API_REPLAY)
+chỉ trả kết quả khi có cookie hợp lệ, mỗi cookie dùng được --token-uses lần rồi trả 401.
+"""
+import argparse
+import html
+import json
+import logging
+import random
+import threading
+import time
+import uuid
+import zlib
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+from src.constant.DataSource import DataSource
+from src.loadtest.flight_generator import FlightDataGenerator
+
+logger = logging.getLogger(__name__)
+
+TRAVELOKA_CARD = '''<div data-testid="flight-inventory-card-container-{index}" class="css-1dbjc4n r-14lw9ot">
+  <div class="css-1dbjc4n r-1loqt21"><div class="css-901oao css-cens5h r-uh8wd5 r-majxgm r-fdjqy7">{airline}</div></div>
+  <div class="css-1dbjc4n r-18u37iz">
+    <div class="css-1dbjc4n r-1habvwh r-eqz5dr r-9aw3ui r-knv0ih"><div class="css-901oao">{departure_time}</div><div class="css-901oao">{origin}</div></div>
+    <div class="css-1dbjc4n r-1awozwy"><div class="css-901oao r-uh8wd5 r-majxgm r-1p4rafz r-fdjqy7">{duration}</div></div>
+    <div class="css-1dbjc4n r-obd0qt r-eqz5dr r-9aw3ui r-knv0ih"><div class="css-901oao">{arrival_time}</div><div class="css-901oao">{destination}</div></div>
+  </div>
+  <div class="css-1dbjc4n r-1h0z5md"><h3 data-testid="label_fl_inventory_price" class="css-4rbku5">{price}</h3></div>
+</div>'''
+
+AGODA_CARD = '''<div class="FlightCard__Container" data-element-name="flight-card">
+  <div class="FlightCard__Carrier"><span>{airline}</span></div>
+  <div class="FlightCard__Schedule">
+    <div><span>{departure_time}</span><span>{origin}</span></div>
+    <div><span>{duration}</span></div>
+    <div><span>{arrival_time}</span><span>{destination}</span></div>
+  </div>
+  <div class="FlightCard__Price"><span>{price}</span></div>
+</div>'''
+
+PAGE = '''<!DOCTYPE html>
+<html lang="vi"><head><meta charset="utf-8"><title>{title}</title></head>
+<body><div id="results">
+{cards}
+</div></body></html>'''
+
+
+class MockProviderConfig:
+    def __init__(self,
+                 latency_ms: Tuple[int, int] = (0, 0),
+                 error_rate: float = 0.0,
+                 rate_limit_rate: float = 0.0,
+                 retry_after: int = 1,
+                 page_size: int = 30,
+                 seed: Optional[int] = None,
+                 token_uses: int = 50):
+        self.latency_ms = latency_ms
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.page_size = page_size
+        # Số lần gọi API tìm kiếm mỗi cookie mock_session, 0 = không giới hạn
+        self.token_uses = token_uses
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+
+    def roll(self) -> Tuple[float, float]:
+        with self.lock:
+            return self.rng.random(), self.rng.uniform(*self.latency_ms) / 1000
+
+
+def _route_flights(origin: str, destination: str, date: datetime, source: str, page_size: int) -> List[Dict]:
+    """Danh sách chuyến bay cố định cho (route, ngày, source) để các lần gọi trả về cùng kết quả"""
+    seed = zlib.crc32(f"{source}|{origin}|{destination}|{date:%Y%m%d}".encode())
+    generator = FlightDataGenerator(airports=[origin, destination], start_date=date, days=1, seed=seed)
+    flights = [generator.random_flight(source) for _ in range(page_size)]
+    for flight in flights:
+        # Chỉ có 2 sân bay nên route ngẫu nhiên có thể bị đảo chiều
+        flight["origin"], flight["destination"] = origin, destination
+    return flights
+
+
+def _format_vnd(price: float) -> str:
+    return f"{int(price):,}".replace(",", ".")
+
+
+def render_booking(flights: List[Dict]) -> bytes:
+    """JSON theo cấu trúc flightOffers mà BookingApiScraper.parse_booking_data đọc"""
+    offers = []
+    for f in flights:
+        leg = {
+            "departureAirport": {"code": f["origin"]},
+            "arrivalAirport": {"code": f["destination"]},
+            "departureTime": f["departure"].strftime("%Y-%m-%dT%H:%M:%S"),
+            "arrivalTime": f["arrival"].strftime("%Y-%m-%dT%H:%M:%S"),
+            "totalTime": f["duration"] * 60,
+            "stops": 0,
+            "flightInfo": {"flightNumber": str(f["flight_number"]),
+                           "carrierInfo": {"marketingCarrier": f["code"], "operatingCarrier": f["code"]}},
+            "carriersData": [{"name": f["airline"], "code": f["code"]}],
+        }
+        offers.append({
+            "token": f"mock-{f['code']}{f['flight_number']}",
+            "priceBreakdown": {"total": {"currencyCode": "VND", "units": int(f["price"]), "nanos": 0}},
+            "segments": [{"legs": [leg]}],
+        })
+    return json.dumps({"flightOffers": offers}).encode("utf-8")
+
+
+def render_traveloka_api(flights: List[Dict]) -> bytes:
+    """JSON theo mapping_config "traveloka" trong provider_configs.json"""
+    results = [{
+        "flightCode": f"{f['code']}{f['flight_number']}",
+        "airline": {"name": f["airline"]},
+        "origin": {"airportCode": f["origin"]},
+        "destination": {"airportCode": f["destination"]},
+        "schedule": {"date": f["departure"].strftime("%Y-%m-%d"),
+                     "departureTime": f["departure"].strftime("%H:%M"),
+                     "arrivalTime": f["arrival"].strftime("%H:%M")},
+        "duration": f["duration"],
+        "priceDetail": {"total": int(f["price"]), "currency": "VND"},
+        "transitCount": 0,
+    } for f in flights]
+    return json.dumps({"data": {"flights": results}}).encode("utf-8")
+
+
+def render_agoda_api(flights: List[Dict]) -> bytes:
+    """JSON theo mapping_config + extractors "agoda" trong provider_configs.json"""
+    results = [{
+        "flight_no": f"{f['code']} {f['flight_number']}",
+        "carrier": {"name": f["airline"]},
+        "origin": {"code": f["origin"]},
+        "destination": {"code": f["destination"]},
+        "departure": {"time": f["departure"].strftime("%Y-%m-%dT%H:%M:%S")},
+        "arrival": {"time": f["arrival"].strftime("%Y-%m-%dT%H:%M:%S")},
+        "duration_minutes": f["duration"],
+        "pricing": {"amount": int(f["price"]), "currency": "VND"},
+        "segments": [{"carrier": f["code"]}],
+    } for f in flights]
+    return json.dumps({"results": results}).encode("utf-8")
+
+
+def render_cards(template: str, flights: List[Dict], price_suffix: str, title: str) -> bytes:
+    cards = []
+    for index, f in enumerate(flights):
+        hours, minutes = divmod(f["duration"], 60)
+        cards.append(template.format(
+            index=index,
+            airline=html.escape(f["airline"]),
+            origin=f["origin"],
+            destination=f["destination"],
+            departure_time=f["departure"].strftime("%H:%M"),
+            arrival_time=f["arrival"].strftime("%H:%M"),
+            duration=f"{hours}h {minutes}m",
+            price=f"{_format_vnd(f['price'])} {price_suffix}",
+        ))
+    return PAGE.format(title=title, cards="\n".join(cards)).encode("utf-8")
+
+
+class _ThreadingServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # Cho phép nhiều kết nối chờ khi load test hàng trăm route đồng thời
+    request_queue_size = 1024
+
+
+class MockProviderServer:
+    def __init__(self, host: str = "127.0.0.1", port: int = 8765, config: MockProviderConfig = None):
+        self.config = config or MockProviderConfig()
+        self.stats: Dict[str, int] = {}
+        self._stats_lock = threading.Lock()
+        # cookie mock_session -> số lần gọi API còn lại
+        self.tokens: Dict[str, int] = {}
+        self.httpd = _ThreadingServer((host, port), self._make_handler())
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def count(self, key: str):
+        with self._stats_lock:
+            self.stats[key] = self.stats.get(key, 0) + 1
+
+    def issue_token(self) -> str:
+        token = uuid.uuid4().hex
+        with self._stats_lock:
+            self.tokens[token] = self.config.token_uses
+        return token
+
+    def use_token(self, token: Optional[str]) -> bool:
+        with self._stats_lock:
+            remaining = self.tokens.get(token)
+            if remaining is None:
+                return False
+            if self.config.token_uses:
+                if remaining <= 0:
+                    return False
+                self.tokens[token] = remaining - 1
+            return True
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                self._handle()
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                try:
+                    body = json.loads(self.rfile.read(length) or b"{}")
+                except ValueError:
+                    return self._send(400, b"Bad request: invalid JSON", "text/plain")
+                self._handle({k: str(v) for k, v in body.items()})
+
+            def _handle(self, form: Dict[str, str] = None):
+                url = urlparse(self.path)
+                query = {k: v[0] for k, v in parse_qs(url.query).items()}
+                query.update(form or {})
+
+                if url.path == "/__stats":
+                    with server._stats_lock:
+                        body = json.dumps(server.stats).encode("utf-8")
+                    return self._send(200, body, "application/json")
+
+                kind = self._detect_kind(url.path)
+                if kind is None:
+                    server.count("not_found")
+                    return self._send(404, b"Not found", "text/plain")
+
+                server.count(f"{kind}_requests")
+                roll, latency = server.config.roll()
+                if latency:
+                    time.sleep(latency)
+
+                if roll < server.config.rate_limit_rate:
+                    server.count(f"{kind}_429")
+                    return self._send(429, b"Too many requests", "text/plain",
+                                      {"Retry-After": str(server.config.retry_after)})
+                if roll < server.config.rate_limit_rate + server.config.error_rate:
+                    server.count(f"{kind}_500")
+                    return self._send(500, b"Internal server error", "text/plain")
+
+                if kind.endswith("_api") and not server.use_token(self._session_cookie()):
+                    server.count(f"{kind}_401")
+                    return self._send(401, b'{"error": "session expired"}', "application/json")
+
+                try:
+                    body, content_type = self._render(kind, query)
+                except (KeyError, ValueError) as e:
+                    server.count(f"{kind}_400")
+                    return self._send(400, f"Bad request: {e}".encode("utf-8"), "text/plain")
+                headers = None
+                if kind in ("agoda", "traveloka"):
+                    headers = {"Set-Cookie": f"mock_session={server.issue_token()}; Path=/"}
+                self._send(200, body, content_type, headers)
+
+            def _session_cookie(self) -> Optional[str]:
+                for item in (self.headers.get("Cookie") or "").split(";"):
+                    name, _, value = item.strip().partition("=")
+                    if name == "mock_session":
+                        return value
+                return None
+
+            def _detect_kind(self, path: str) -> Optional[str]:
+                if "/api/flights" in path:
+                    return "booking"
+                if path.rstrip("/").endswith("/api/search"):
+                    return "agoda_api" if "/flights/" in path else "traveloka_api"
+                if path.rstrip("/").endswith("/fullsearch"):
+                    return "traveloka"
+                if path.rstrip("/").endswith("/results"):
+                    return "agoda"
+                return None
+
+            def _render(self, kind: str, query: Dict[str, str]) -> Tuple[bytes, str]:
+                page_size = int(query.get("pageSize", server.config.page_size))
+                if kind == "booking":
+                    origin = query["from"].split(".")[0]
+                    destination = query["to"].split(".")[0]
+                    date = datetime.strptime(query["depart"], "%Y-%m-%d")
+                    flights = _route_flights(origin, destination, date, DataSource.BOOKING_DATA_SRC.value, page_size)
+                    return render_booking(flights), "application/json"
+
+                if kind == "traveloka":
+                    # ap=DEST.ORIGIN&dt=DD-MM-YYYY.NA (giống TravelScraperV2.build_search_url)
+                    destination, origin = query["ap"].split(".")[:2]
+                    date = datetime.strptime(query["dt"].split(".")[0], "%d-%m-%Y")
+                    flights = _route_flights(origin, destination, date, DataSource.TRAVELOKA_DATA_SRC.value, page_size)
+                    return render_cards(TRAVELOKA_CARD, flights, "VND", "Traveloka"), "text/html; charset=utf-8"
+
+                if kind == "traveloka_api":
+                    date = datetime.strptime(query["date"], "%d-%m-%Y")
+                    flights = _route_flights(query["origin"], query["destination"], date,
+                                             DataSource.TRAVELOKA_DATA_SRC.value, page_size)
+                    return render_traveloka_api(flights), "application/json"
+
+                if kind == "agoda_api":
+                    date = datetime.strptime(query["departDate"], "%Y-%m-%d")
+                    flights = _route_flights(query["origin"], query["destination"], date,
+                                             DataSource.AGODA_DATA_SRC.value, page_size)
+                    return render_agoda_api(flights), "application/json"
+
+                origin, destination = query["departureFrom"], query["arrivalTo"]
+                date = datetime.strptime(query["departDate"], "%Y-%m-%d")
+                flights = _route_flights(origin, destination, date, DataSource.AGODA_DATA_SRC.value, page_size)
+                return render_cards(AGODA_CARD, flights, "₫", "Agoda"), "text/html; charset=utf-8"
+
+            def _send(self, status: int, body: bytes, content_type: str, headers: Dict[str, str] = None):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        """Chạy server ở background thread (dùng trong test/benchmark)"""
+        threading.Thread(target=self.httpd.serve_forever, name="mock-provider", daemon=True).start()
+        return self
+
+    def serve_forever(self):
+        self.httpd.serve_forever()
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def _parse_latency(value: str) -> Tuple[int, int]:
+    parts = [int(p) for p in value.split(":")]
+    return (parts[0], parts[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local mock server for Booking/Agoda/Traveloka")
+    parser.add_argument('--host', default="127.0.0.1")
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency-ms', type=_parse_latency, default=(0, 0), help="min:max, ví dụ 200:800")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Tỉ lệ trả về HTTP 500")
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help="Tỉ lệ trả về HTTP 429")
+    parser.add_argument('--retry-after', type=int, default=1, help="Giá trị header Retry-After cho 429")
+    parser.add_argument('--page-size', type=int, default=30, help="Số chuyến bay mỗi trang kết quả")
+    parser.add_argument('--seed', type=int)
+    parser.add_argument('--token-uses', type=int, default=50,
+                        help="Số lần gọi API tìm kiếm mỗi cookie mock_session, 0 = không giới hạn")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    config = MockProviderConfig(args.latency_ms, args.error_rate, args.rate_limit_rate,
+                                args.retry_after, args.page_size, args.seed, args.token_uses)
+    server = MockProviderServer(args.host, args.port, config)
+    logger.info(f"Mock provider server listening on {server.base_url}")
+    logger.info(f"  Booking.com   url: {server.base_url}/api/flights/")
+    logger.info(f"  Agoda.com     url: {server.base_url}/flights")
+    logger.info(f"  Traveloka.com url: {server.base_url}/vi-vn/flight")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,31 @@
+import argparse
 import csv
+import glob
 import logging
 import os
+import time
 from datetime import datetime, timedelta
 from src.config.db_manager import get_active_configs, log_message
+from src.config.log_sink import start_log_sink, stop_log_sink
+from src.config import load_manifest, parquet_store
+from src.config.csv_reader import iter_csv_chunks
 from src.scrapers.ScraperManager import ScraperManager
+from src.scrapers.CircuitBreaker import circuit_breakers
 from src.config.db_connector import get_db_connection
 from src.config.sqlite_connector import get_sqlite_connection, clear_sqlite_db, init_sqlite_db
 from src.constant.DataSource import DataSource
 from src.config.db_manager import get_airport
 from src.helpper.hepper import buidl_origin_destination
+from src.model.FlightBatch import FlightBatch
+from src.model.FlightRecord import FlightRecord, FLIGHT_FIELDS, SQLITE_COLUMNS, SQLITE_FIELDS
+from src.monitoring.metrics import metrics
+from src.monitoring.profiler import profile_stage, enable_profiling
 from rich.logging import RichHandler
 
-from src.transform.transform_data import transform_data
+from src.transform.transform_data import transform_data, TRANSFORM_ENGINE, TRANSFORM_ENGINES
+from src.transform.warehouse_transfer import transfer_to_warehouse, WAREHOUSE_TRANSFER
+from src.scheduler.scheduler import Scheduler, MAX_BROWSERS
+from src.scrapers.DriverGovernor import driver_governor
 
 logging.basicConfig(
     level=logging.INFO,
@@ -21,36 +35,70 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+METRICS_FILE = os.getenv('METRICS_FILE', os.path.join("data", "metrics", "pipeline.prom"))
+METRICS_PORT = os.getenv('METRICS_PORT')
 
+# Chu kỳ mặc định (giây) của chế độ --mode schedule, ghi đè bằng --interval SOURCE=SECONDS
+DEFAULT_SCRAPE_INTERVALS = {
+    DataSource.TRAVELOKA_DATA_SRC.value: 6 * 3600,
+    DataSource.AGODA_DATA_SRC.value: 6 * 3600,
+    DataSource.BOOKING_DATA_SRC.value: 3 * 3600,
+}
+# Số ngày bay được scrape mỗi lần (lịch giá), ghi đè bằng --days
+SCRAPE_DAYS = int(os.getenv('SCRAPE_DAYS', 1))
+TRANSFORM_INTERVAL = int(os.getenv('TRANSFORM_INTERVAL', 3600))
+METRICS_EXPORT_INTERVAL = int(os.getenv('METRICS_EXPORT_INTERVAL', 60))
+# Các source scrape bằng Selenium, chiếm một slot trình duyệt của scheduler
+BROWSER_SOURCES = {DataSource.TRAVELOKA_DATA_SRC.value, DataSource.AGODA_DATA_SRC.value}
 
-def scrape_single_source(data_src: DataSource):
-    connection = get_db_connection()
-    if not connection:
-        logger.error("Cannot connect to database. Program terminated.")
-        return None
-    search_date = datetime.now() + timedelta(days=1)
-    airport_code = get_airport(connection)
-    routes = buidl_origin_destination(airport_code)
-    configs = get_active_configs(connection)
 
-    for config in configs:
-        if config.get('source_name') == data_src.value:
-            scraperManager = ScraperManager()
-            flights = scraperManager.scrape_single_source(config, routes, search_date)
-            csv_path=  save_to_csv(flights, data_src.value)
-            load_csv_to_sqlite(csv_path)
 
-    #         TODO: Create log
+@profile_stage('scrape_single_source')
+def scrape_single_source(data_src: DataSource, days: int = SCRAPE_DAYS):
+    """
+    Scrape các route cho `days` ngày bay liên tiếp bắt đầu từ ngày mai.
+    Raise khi không kết nối được database hoặc source không có chuyến bay nào và scraper báo lỗi,
+    để scheduler ghi nhận lần chạy là thất bại.
+    """
+    connection = get_db_connection()
+    if not connection:
+        raise ConnectionError("Cannot connect to database")
+    try:
+        search_dates = [datetime.now() + timedelta(days=1 + i) for i in range(max(1, days))]
+        airport_code = get_airport(connection)
+        routes = buidl_origin_destination(airport_code)
+        configs = get_active_configs(connection)
 
+        for config in configs:
+            if config.get('source_name') == data_src.value:
+                log_message(connection, 'INFO', f"Start scraping {len(routes)} routes for {len(search_dates)} days "
+                                                f"from {search_dates[0].strftime('%Y-%m-%d')}", data_src.value)
+                scraperManager = ScraperManager()
+                flights = scraperManager.scrape_matrix(config, routes, search_dates)
+                log_message(connection, 'INFO' if flights else 'WARNING', f"Scraped {len(flights)} flights",
+                            data_src.value)
+                error = scraperManager.last_errors.get(data_src.value)
+                if not flights and error:
+                    raise RuntimeError(f"Scraping {data_src.value} failed: {error}")
+                csv_path=  save_to_csv(flights, data_src.value)
+                save_to_parquet(flights, data_src.value)
+                if csv_path:
+                    # Batch vừa scrape đã có sẵn theo cột, load thẳng thay vì đọc lại file CSV
+                    load_batch_to_sqlite(flights, data_src.value, csv_path)
+                    log_message(connection, 'INFO', f"Loaded {csv_path} into SQLite", data_src.value)
+    finally:
+        connection.close()
 
     return None
 
 
+@profile_stage('save_to_csv')
 def save_to_csv(flights, file_name, base_folder="data"):
     if not flights:
         logger.warning("No flights to save to CSV.")
         return
 
+    source_name = file_name
     today_str = datetime.now().strftime("%Y%m%d")
     folder_name= f"scrap_{today_str}"
     folder_path = os.path.join(base_folder, folder_name)
@@ -58,59 +106,246 @@ def save_to_csv(flights, file_name, base_folder="data"):
     file_name = f"{file_name}.csv"
     file_path = os.path.join(folder_path, file_name)
 
-    column = flights[0].keys()
-    with open(file_path, 'w', newline='', encoding='utf-8') as output_file:
-        writer = csv.DictWriter(output_file, column)
-        writer.writeheader()
-        writer.writerows(flights)
+    with metrics.timer('csv_write', source_name):
+        with open(file_path, 'w', newline='', encoding='utf-8') as output_file:
+            writer = csv.writer(output_file)
+            writer.writerow(FLIGHT_FIELDS)
+            if isinstance(flights, FlightBatch):
+                writer.writerows(flights.iter_db_tuples())
+            else:
+                writer.writerows(FlightRecord.coerce(f).to_db_tuple() for f in flights)
+    metrics.inc('rows_written', len(flights), source=source_name, stage='csv_write')
 
     logger.info(f"Saved {len(flights)} flights to CSV file: {file_name}")
     return file_path
 
-def load_csv_to_sqlite(file_path):
+@profile_stage('save_to_parquet')
+def save_to_parquet(flights, source_name, scrape_date=None):
+    """Ghi thêm bản Parquet (partition theo ngày scrape/source) song song với CSV"""
+    if not flights:
+        return None
+    try:
+        with metrics.timer('parquet_write', source_name):
+            file_path = parquet_store.write_parquet(flights, source_name, scrape_date)
+    except Exception as e:
+        logger.error(f"Error writing Parquet file: {e}")
+        return None
+    if file_path:
+        metrics.inc('rows_written', len(flights), source=source_name, stage='parquet_write')
+        logger.info(f"Saved {len(flights)} flights to Parquet file: {file_path}")
+    return file_path
 
+@profile_stage('load_csv_to_sqlite')
+def load_csv_to_sqlite(file_path, force=False):
+    """
+    Load một file CSV qua load_manifest: file đã load và không đổi thì bỏ qua (trả về 0),
+    file đã đổi thì chỉ thay các dòng của chính file đó. force=True để load lại dù không đổi.
+    """
     sqlite_connector = get_sqlite_connection()
     if not sqlite_connector:
         logger.error("Cannot connect to SQLite database. Program terminated.")
         return None
+    source_name = os.path.splitext(os.path.basename(file_path))[0]
+    load_started = time.perf_counter()
+    rows_loaded = 0
     try:
-        with open(file_path, 'r', encoding='utf-8') as csv_file:
-            csv_reader = csv.DictReader(csv_file)
-            rows_to_insert = []
-
-            for row in csv_reader:
-                rows_to_insert.append((
-                    row['airline'],
-                    row['departure_airport'],
-                    row['departure_time'],
-                    row['destination_airport'],
-                    row['destination_time'],
-                    row['price'],
-                    row['duration_time']
-                ))
-
-            insert_query = """
-                               INSERT INTO flights_metadata (
-                               airline, departure_airport, departure_time,
-                                   destination_airport, destination_time, duration_time, price,
-                               )
-                               VALUES (?, ?, ?, ?, ?, ?, ?) \
-                               """
-
-            cursor = sqlite_connector.cursor()
-            cursor.executemany(insert_query, rows_to_insert)
-            sqlite_connector.commit()
+        file = load_manifest.fingerprint(file_path) if force else load_manifest.changed_file(sqlite_connector, file_path)
+        if file is None:
+            logger.info(f"Skipping {file_path}: already loaded and unchanged")
+            metrics.inc('files_skipped', source=source_name, stage='sqlite_load')
+            return 0
+        # Đọc theo chunk, header của mọi layout (tên cột cũ của Traveloka, Agoda/Booking) được map một lần
+        chunks = iter_csv_chunks(file_path, SQLITE_FIELDS, default_source=source_name)
+        rows_loaded = load_manifest.replace_file_rows(sqlite_connector, file, chunks, source_name)
+        metrics.inc('rows_loaded', rows_loaded, source=source_name, stage='sqlite_load')
+        return rows_loaded
 
     except Exception as e:
         logger.error(f"Error reading CSV file: {e}")
+        return None
 
     finally:
+        metrics.observe('sqlite_load', time.perf_counter() - load_started, source_name)
         sqlite_connector.close()
-        return None
+
+
+@profile_stage('backfill_csv_to_sqlite')
+def backfill_csv_to_sqlite(pattern=os.path.join("data", "scrap_*", "*.csv"), force=False):
+    """Load toàn bộ lịch sử CSV, file đã có trong manifest và không đổi được bỏ qua"""
+    files = sorted(glob.glob(pattern))
+    loaded = skipped = rows = 0
+    for file_path in files:
+        result = load_csv_to_sqlite(file_path, force)
+        if result:
+            loaded += 1
+            rows += result
+        elif result == 0:
+            skipped += 1
+    logger.info(f"Backfill: {loaded} files loaded ({rows} rows), {skipped} skipped of {len(files)}")
+    return rows
+
+
+def insert_into_sqlite(sqlite_connector, rows):
+    insert_query = f"""
+                       INSERT INTO flights_metadata ({', '.join(SQLITE_COLUMNS)})
+                       VALUES ({', '.join('?' * len(SQLITE_COLUMNS))})
+                       """
+    cursor = sqlite_connector.cursor()
+    cursor.executemany(insert_query, rows)
+    sqlite_connector.commit()
+    return cursor.rowcount
+
+
+@profile_stage('load_batch_to_sqlite')
+def load_batch_to_sqlite(batch: FlightBatch, source_name, source_file=None):
+    """
+    Load FlightBatch vào flights_metadata, tuple được sinh dần từ các cột.
+    source_file: file CSV vừa ghi từ chính batch này, các dòng được gắn với file đó và ghi vào
+    load_manifest để backfill sau không load lại (thay dòng cũ của file nếu file bị ghi đè).
+    """
+    if not batch:
+        return 0
+    sqlite_connector = get_sqlite_connection()
+    if not sqlite_connector:
+        logger.error("Cannot connect to SQLite database. Program terminated.")
+        return 0
+    load_started = time.perf_counter()
+    try:
+        if source_file:
+            inserted = load_manifest.replace_file_rows(sqlite_connector, load_manifest.fingerprint(source_file),
+                                                       [batch.iter_sqlite_tuples()], source_name)
+        else:
+            inserted = insert_into_sqlite(sqlite_connector, batch.iter_sqlite_tuples())
+        metrics.inc('rows_loaded', inserted, source=source_name, stage='sqlite_load')
+        return inserted
+    except Exception as e:
+        logger.error(f"Error loading flights into SQLite: {e}")
+        return 0
+    finally:
+        metrics.observe('sqlite_load', time.perf_counter() - load_started, source_name)
+        sqlite_connector.close()
+
+
+@profile_stage('load_parquet_to_sqlite')
+def load_parquet_to_sqlite(start_date=None, end_date=None, sources=None, routes=None):
+    """Load lịch sử từ data/parquet vào flights_metadata, chỉ đọc các partition/row group cần thiết"""
+    load_started = time.perf_counter()
+    table = parquet_store.read_flights(start_date, end_date, sources, routes)
+    if table.num_rows == 0:
+        return 0
+    sqlite_connector = get_sqlite_connection()
+    if not sqlite_connector:
+        logger.error("Cannot connect to SQLite database. Program terminated.")
+        return 0
+    try:
+        inserted = insert_into_sqlite(sqlite_connector, parquet_store.iter_sqlite_rows(table, SQLITE_FIELDS))
+        metrics.inc('rows_loaded', inserted, source='parquet', stage='sqlite_load')
+        return inserted
+    except Exception as e:
+        logger.error(f"Error loading Parquet flights into SQLite: {e}")
+        return 0
+    finally:
+        metrics.observe('sqlite_load', time.perf_counter() - load_started, 'parquet')
+        sqlite_connector.close()
+
+
+def transform_and_transfer(engine=None, transfer=WAREHOUSE_TRANSFER):
+    """Transform, sau đó chuyển các dòng mới đã làm sạch của flights_metadata sang bảng flights (MySQL)"""
+    transform_data(engine)
+    if not transfer:
+        return
+    if (engine or TRANSFORM_ENGINE) != 'sqlite':
+        # Engine duckdb không làm sạch bảng SQLite, kết quả nằm ở data/cleaned
+        logger.warning("Warehouse transfer reads the SQLite table and needs --engine sqlite, skipping.")
+        return
+    if transfer_to_warehouse() is None:
+        raise ConnectionError("Cannot connect to database")
+
+
+def export_metrics():
+    """Ghi metrics Prometheus ra file và in p50/p95 của từng stage"""
+    try:
+        metrics.write_prometheus(METRICS_FILE)
+        logger.info(f"Metrics written to {METRICS_FILE}")
+    except OSError as e:
+        logger.error(f"Error writing metrics file: {e}")
+    metrics.log_summary()
+
+
+def interval_arg(value):
+    source_name, _, seconds = value.partition('=')
+    if source_name not in DEFAULT_SCRAPE_INTERVALS or not seconds.isdigit():
+        raise argparse.ArgumentTypeError(f"invalid interval {value!r}, expected SOURCE=SECONDS")
+    return source_name, int(seconds)
+
+
+def parse_intervals(values):
+    intervals = dict(DEFAULT_SCRAPE_INTERVALS)
+    intervals.update(values or [])
+    return intervals
+
+
+def build_scheduler(args) -> Scheduler:
+    """Mỗi source một job scrape (đã gồm load vào SQLite), cộng với job transform và job ghi metrics"""
+    # Số trình duyệt chạy song song không vượt quá RAM trống/số CPU của máy
+    scheduler = Scheduler(max_browsers=driver_governor.recommended_browsers(MAX_BROWSERS))
+    intervals = parse_intervals(args.interval)
+    sources = args.sources or [s.value for s in DataSource]
+    for data_src in DataSource:
+        if data_src.value not in sources or intervals[data_src.value] <= 0:
+            continue
+        scheduler.add_job(f"scrape:{data_src.value}",
+                          lambda data_src=data_src: scrape_single_source(data_src, args.days),
+                          intervals[data_src.value], source=data_src.value,
+                          uses_browser=data_src.value in BROWSER_SOURCES)
+    # Source đang bị chặn (circuit breaker mở) thì bỏ qua, slot trình duyệt dành cho source khác
+    scheduler.add_skip_check(lambda job: circuit_breakers.skip_reason(job.source))
+    scheduler.add_job("transform", lambda: transform_and_transfer(args.engine, args.transfer), TRANSFORM_INTERVAL)
+    scheduler.add_job("export_metrics", export_metrics, METRICS_EXPORT_INTERVAL, record_history=False)
+    return scheduler
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Flight scraper pipeline")
+    parser.add_argument('--mode', choices=('once', 'schedule', 'backfill'), default='once',
+                        help="once: chạy transform một lần; schedule: chạy liên tục scrape/load/transform theo lịch; "
+                             "backfill: load các file data/scrap_*/*.csv chưa có trong load_manifest")
+    parser.add_argument('--sources', nargs='+', choices=[s.value for s in DataSource],
+                        help="Các source được lên lịch (mặc định tất cả)")
+    parser.add_argument('--interval', action='append', type=interval_arg, metavar='SOURCE=SECONDS',
+                        help="Chu kỳ scrape của một source, 0 để tắt (có thể lặp lại)")
+    parser.add_argument('--days', type=int, default=SCRAPE_DAYS,
+                        help="Số ngày bay liên tiếp được scrape mỗi lần, bắt đầu từ ngày mai (mặc định SCRAPE_DAYS, 1)")
+    parser.add_argument('--profile', action='store_true',
+                        help="Profile từng stage bằng cProfile/tracemalloc (hoặc đặt PIPELINE_PROFILE=1)")
+    parser.add_argument('--engine', choices=TRANSFORM_ENGINES, default=None,
+                        help="Engine cho bước transform (mặc định theo TRANSFORM_ENGINE, sqlite)")
+    parser.add_argument('--transfer', action='store_true', default=WAREHOUSE_TRANSFER,
+                        help="Sau transform chuyển các dòng mới của SQLite sang bảng flights MySQL "
+                             "(hoặc đặt WAREHOUSE_TRANSFER=1)")
+    return parser.parse_args()
 
 
 if __name__ == "__main__":
-    # init_sqlite_db()
-    # clear_sqlite_db()
-    # scrape_single_source(DataSource.TRAVELOKA_DATA_SRC)
-    transform_data()
+    args = parse_args()
+    if args.profile:
+        enable_profiling()
+    if METRICS_PORT:
+        metrics.serve(int(METRICS_PORT))
+    start_log_sink()
+    try:
+        if args.mode == 'schedule':
+            init_sqlite_db()
+            build_scheduler(args).run_forever()
+        elif args.mode == 'backfill':
+            init_sqlite_db()
+            backfill_csv_to_sqlite()
+        else:
+            # init_sqlite_db()
+            # clear_sqlite_db()
+            # scrape_single_source(DataSource.TRAVELOKA_DATA_SRC)
+            transform_and_transfer(args.engine, args.transfer)
+    finally:
+        # Transfer lỗi vẫn raise ra ngoài (exit code khác 0) nhưng metrics vẫn được ghi
+        stop_log_sink()
+        export_metrics()
@@ -0,0 +1,299 @@
+import inspect
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from .FlightRecord import FLIGHT_FIELDS, SQLITE_FIELDS, FlightRecord
+
+# Các cột chuỗi được mã hóa bằng dictionary (int32 code, -1 = thiếu)
+STRING_FIELDS = (
+    'flight_code', 'airline', 'departure_airport', 'arrival_airport', 'currency', 'source', 'route',
+    'aircraft_type', 'baggage_info', 'meal_info', 'seat_class', 'booking_url',
+)
+DATETIME_FIELDS = ('departure_time', 'arrival_time')
+# Cột số: NaN (float) hoặc -1 (int) = thiếu
+NUMERIC_FIELDS = {
+    'duration_minutes': np.int32,
+    'price': np.float64,
+    'stops': np.int16,
+}
+INT_MISSING = -1
+# Định dạng thời gian duy nhất được chấp nhận cho cột datetime
+DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# Với cột datetime/số: mask các ô có giá trị nhưng không parse được (để validate phân biệt thiếu và sai kiểu)
+INVALID_COLUMNS = {f: f'{f}__invalid' for f in DATETIME_FIELDS + tuple(NUMERIC_FIELDS)}
+COLUMN_NAMES = FLIGHT_FIELDS + tuple(INVALID_COLUMNS.values())
+
+# Giá trị thay cho ô thiếu khi xuất ra, giống giá trị mặc định của FlightRecord (currency='VND', stops=0, ...)
+FIELD_DEFAULTS = {name: param.default for name, param in inspect.signature(FlightRecord.__init__).parameters.items()
+                  if name in FLIGHT_FIELDS}
+
+# Số record được gom lại trước khi chuyển thành mảng NumPy
+APPEND_CHUNK_SIZE = 8192
+
+
+class StringDictionary:
+    """Ánh xạ chuỗi <-> mã int32, dùng chung cho cả batch"""
+
+    def __init__(self):
+        self.values: List[str] = []
+        self._codes: Dict[str, int] = {}
+
+    def encode(self, value) -> int:
+        if value is None or value == '':
+            return INT_MISSING
+        value = str(value)
+        code = self._codes.get(value)
+        if code is None:
+            code = len(self.values)
+            self._codes[value] = code
+            self.values.append(value)
+        return code
+
+    def encode_many(self, values: Iterable) -> np.ndarray:
+        encode = self.encode
+        return np.fromiter((encode(v) for v in values), dtype=np.int32)
+
+    def decode_array(self, codes: np.ndarray, missing=None) -> np.ndarray:
+        """Mảng object các chuỗi (`missing` cho mã -1)"""
+        lookup = np.array(self.values + [missing], dtype=object)
+        return lookup[np.where(codes < 0, len(self.values), codes)]
+
+    def __len__(self):
+        return len(self.values)
+
+
+class FlightBatch:
+    """
+    Lưu nhiều chuyến bay theo cột (NumPy), cột chuỗi dùng dictionary encoding.
+    Scraper append từng FlightRecord; validate/normalize làm trên cả cột; loader đọc thẳng từ cột.
+    """
+
+    def __init__(self):
+        self.dictionaries: Dict[str, StringDictionary] = {f: StringDictionary() for f in STRING_FIELDS}
+        self._chunks: List[Dict[str, np.ndarray]] = []
+        self._columns: Optional[Dict[str, np.ndarray]] = None
+        self._pending: List[FlightRecord] = []
+
+    # ---- Xây dựng batch ----
+    @classmethod
+    def from_records(cls, records: Iterable) -> 'FlightBatch':
+        batch = cls()
+        batch.extend(records)
+        return batch
+
+    def append(self, record):
+        self._pending.append(FlightRecord.coerce(record))
+        if len(self._pending) >= APPEND_CHUNK_SIZE:
+            self._flush_pending()
+
+    def extend(self, records: Iterable):
+        if isinstance(records, FlightBatch):
+            records = records.iter_records()
+        for record in records:
+            self.append(record)
+
+    def _flush_pending(self):
+        if not self._pending:
+            return
+        records, self._pending = self._pending, []
+        chunk = {}
+        for field in STRING_FIELDS:
+            chunk[field] = self.dictionaries[field].encode_many(getattr(r, field) for r in records)
+        for field in DATETIME_FIELDS:
+            chunk[field], chunk[INVALID_COLUMNS[field]] = _parse_datetimes([getattr(r, field) for r in records])
+        for field, dtype in NUMERIC_FIELDS.items():
+            chunk[field], chunk[INVALID_COLUMNS[field]] = _to_numeric([getattr(r, field) for r in records], dtype)
+        self._chunks.append(chunk)
+        self._columns = None
+
+    @property
+    def columns(self) -> Dict[str, np.ndarray]:
+        """Các cột đã gộp (code cho cột chuỗi, datetime64[s] và số cho các cột còn lại)"""
+        self._flush_pending()
+        if self._columns is None:
+            if not self._chunks:
+                self._columns = _empty_columns()
+            elif len(self._chunks) == 1:
+                self._columns = self._chunks[0]
+            else:
+                self._columns = {f: np.concatenate([c[f] for c in self._chunks]) for f in COLUMN_NAMES}
+                self._chunks = [self._columns]
+        return self._columns
+
+    def __len__(self):
+        pending = len(self._pending)
+        if self._columns is not None:
+            return len(self._columns['price']) + pending
+        return sum(len(c['price']) for c in self._chunks) + pending
+
+    def __bool__(self):
+        return len(self) > 0
+
+    def __iter__(self) -> Iterator[FlightRecord]:
+        return self.iter_records()
+
+    # ---- Thao tác trên cột ----
+    def filter(self, mask: np.ndarray) -> 'FlightBatch':
+        """Batch mới chỉ gồm các dòng có mask = True (dùng chung dictionary)"""
+        columns = self.columns
+        result = FlightBatch()
+        result.dictionaries = dict(self.dictionaries)
+        result._chunks = [{f: columns[f][mask] for f in COLUMN_NAMES}]
+        return result
+
+    def decoded(self, field: str) -> np.ndarray:
+        """Cột dưới dạng giá trị Python (object array), ô thiếu nhận giá trị mặc định của FlightRecord"""
+        column = self.columns[field]
+        missing = FIELD_DEFAULTS[field]
+        if field in STRING_FIELDS:
+            return self.dictionaries[field].decode_array(column, missing)
+        if field in DATETIME_FIELDS:
+            text = np.char.replace(np.datetime_as_string(column, unit='s'), 'T', ' ').astype(object)
+            text[np.isnat(column)] = missing
+            return text
+        values = column.astype(object)
+        values[self.null_mask(field)] = missing
+        return values
+
+    def null_mask(self, field: str) -> np.ndarray:
+        """True cho các dòng không có giá trị dùng được ở cột `field` (thiếu hoặc không parse được)"""
+        column = self.columns[field]
+        if field in DATETIME_FIELDS:
+            return np.isnat(column)
+        if column.dtype.kind == 'f':
+            return np.isnan(column)
+        return column == INT_MISSING
+
+    def invalid_mask(self, field: str) -> np.ndarray:
+        """True cho các dòng có giá trị ở cột `field` nhưng sai kiểu/định dạng (luôn False với cột chuỗi)"""
+        if field not in INVALID_COLUMNS:
+            return np.zeros(len(self), dtype=bool)
+        return self.columns[INVALID_COLUMNS[field]]
+
+    def missing_mask(self, field: str) -> np.ndarray:
+        """True cho các dòng hoàn toàn thiếu giá trị ở cột `field`"""
+        return self.null_mask(field) & ~self.invalid_mask(field)
+
+    def required_mask(self, fields: Iterable[str]) -> np.ndarray:
+        """True cho các dòng có đủ giá trị dùng được ở mọi cột trong `fields`"""
+        mask = np.ones(len(self), dtype=bool)
+        for field in fields:
+            mask &= ~self.null_mask(field)
+        return mask
+
+    def normalize(self):
+        """
+        Chuẩn hóa các cột chuỗi: mã sân bay/tiền tệ viết hoa, bỏ khoảng trắng thừa.
+        Chỉ xử lý trên dictionary (mỗi giá trị khác nhau một lần) rồi ánh xạ lại mã, không duyệt từng dòng.
+        """
+        columns = self.columns
+        for field in STRING_FIELDS:
+            upper = field in ('departure_airport', 'arrival_airport', 'currency', 'route')
+            old = self.dictionaries[field]
+            new = StringDictionary()
+            remap = np.empty(len(old) + 1, dtype=np.int32)
+            for code, value in enumerate(old.values):
+                value = ' '.join(value.split())
+                remap[code] = new.encode(value.upper() if upper else value)
+            remap[len(old)] = INT_MISSING
+            columns[field] = remap[np.where(columns[field] < 0, len(old), columns[field])]
+            self.dictionaries[field] = new
+        return self
+
+    def duplicate_mask(self, fields=('airline', 'departure_airport', 'departure_time', 'arrival_airport',
+                                     'arrival_time', 'duration_minutes', 'price')) -> np.ndarray:
+        """True cho các dòng trùng với một dòng xuất hiện trước (giống process_duplicate_data)"""
+        columns = self.columns
+        if len(self) == 0:
+            return np.zeros(0, dtype=bool)
+        # datetime/float so sánh theo bit để NaT/NaN cũng được coi là bằng nhau như GROUP BY
+        keys = np.rec.fromarrays([columns[f].view(np.int64) if columns[f].dtype.kind in 'fM' else columns[f]
+                                  for f in fields])
+        _, first_index = np.unique(keys, return_index=True)
+        mask = np.ones(len(self), dtype=bool)
+        mask[first_index] = False
+        return mask
+
+    def nbytes(self) -> int:
+        """Bộ nhớ ước tính của batch (mảng + dictionary)"""
+        columns = self.columns
+        total = sum(c.nbytes for c in columns.values())
+        for dictionary in self.dictionaries.values():
+            total += sum(len(v) + 49 for v in dictionary.values) + 8 * len(dictionary)
+        return total
+
+    # ---- Xuất dữ liệu ----
+    def iter_rows(self, fields=FLIGHT_FIELDS) -> Iterator[tuple]:
+        """Tuple theo thứ tự `fields`, sinh dần từ các cột (không giữ list toàn bộ dòng)"""
+        if len(self) == 0:
+            return iter(())
+        return zip(*(self.decoded(f) for f in fields))
+
+    def iter_db_tuples(self) -> Iterator[tuple]:
+        return self.iter_rows(FLIGHT_FIELDS)
+
+    def iter_sqlite_tuples(self) -> Iterator[tuple]:
+        return self.iter_rows(SQLITE_FIELDS)
+
+    def iter_records(self) -> Iterator[FlightRecord]:
+        for row in self.iter_rows(FLIGHT_FIELDS):
+            yield FlightRecord(*row)
+
+    def to_records(self) -> List[FlightRecord]:
+        return list(self.iter_records())
+
+
+def _is_datetime_text(value) -> bool:
+    """Kiểm tra nhanh đúng dạng DATETIME_FORMAT ('YYYY-MM-DD HH:MM:SS'), numpy kiểm tra phần còn lại"""
+    return (isinstance(value, str) and len(value) == 19 and value[4] == '-' and value[7] == '-'
+            and value[10] == ' ' and value[13] == ':' and value[16] == ':')
+
+
+def _parse_datetimes(values: List) -> Tuple[np.ndarray, np.ndarray]:
+    """(datetime64[s], mask giá trị sai định dạng)"""
+    present = np.fromiter((v is not None and v != '' for v in values), dtype=bool, count=len(values))
+    cleaned = [v if _is_datetime_text(v) else '' for v in values]
+    try:
+        result = np.array(cleaned, dtype='datetime64[s]')
+    except ValueError:
+        # Có ngày/giờ không tồn tại (vd. 2025-02-30), parse lại từng ô
+        result = np.empty(len(cleaned), dtype='datetime64[s]')
+        for i, value in enumerate(cleaned):
+            try:
+                result[i] = np.datetime64(value, 's') if value else np.datetime64('NaT')
+            except ValueError:
+                result[i] = np.datetime64('NaT')
+    return result, present & np.isnat(result)
+
+
+def _to_numeric(values: List, dtype) -> Tuple[np.ndarray, np.ndarray]:
+    """(mảng số, mask giá trị không phải số)"""
+    is_float = np.dtype(dtype).kind == 'f'
+    result = np.empty(len(values), dtype=np.float64)
+    invalid = np.zeros(len(values), dtype=bool)
+    for i, value in enumerate(values):
+        if value is None or value == '':
+            result[i] = np.nan
+            continue
+        try:
+            result[i] = float(value)
+        except (TypeError, ValueError):
+            result[i] = np.nan
+            invalid[i] = True
+    invalid |= np.isinf(result)
+    if not is_float:
+        invalid |= ~np.isnan(result) & (result != np.round(result))
+    result[invalid] = np.nan
+    if is_float:
+        return result.astype(dtype), invalid
+    return np.where(np.isnan(result), INT_MISSING, result).astype(dtype), invalid
+
+
+def _empty_columns() -> Dict[str, np.ndarray]:
+    columns = {f: np.zeros(0, dtype=np.int32) for f in STRING_FIELDS}
+    columns.update({f: np.zeros(0, dtype='datetime64[s]') for f in DATETIME_FIELDS})
+    columns.update({f: np.zeros(0, dtype=dtype) for f, dtype in NUMERIC_FIELDS.items()})
+    columns.update({c: np.zeros(0, dtype=bool) for c in INVALID_COLUMNS.values()})
+    return columns
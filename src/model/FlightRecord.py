@@ -0,0 +1,116 @@
+from typing import Any, Dict, Iterable, Tuple, Union
+
+# Thứ tự cột chung cho CSV, bảng flights và các loader
+FLIGHT_FIELDS = (
+    'flight_code', 'airline', 'departure_airport', 'arrival_airport', 'departure_time', 'arrival_time',
+    'duration_minutes', 'price', 'currency', 'source', 'route', 'stops', 'aircraft_type', 'baggage_info',
+    'meal_info', 'seat_class', 'booking_url',
+)
+
+# Tên cột cũ (Traveloka, bảng flights_metadata) -> tên field chuẩn
+FIELD_ALIASES = {
+    'destination_airport': 'arrival_airport',
+    'destination_time': 'arrival_time',
+    'duration_time': 'duration_minutes',
+}
+
+# Thứ tự cột khi ghi vào bảng SQLite flights_metadata
+SQLITE_FIELDS = (
+    'airline', 'departure_airport', 'departure_time', 'arrival_airport', 'arrival_time',
+    'duration_minutes', 'price', 'flight_code', 'source', 'currency',
+)
+SQLITE_COLUMNS = (
+    'airline', 'departure_airport', 'departure_time', 'destination_airport', 'destination_time',
+    'duration_time', 'price', 'flight_code', 'source', 'currency',
+)
+
+
+class FlightRecord:
+    """
+    Một chuyến bay, dùng chung cho mọi scraper, clean_flight_data, save_to_csv và các loader.
+    Dùng __slots__ thay cho dict để giảm bộ nhớ cho mỗi chuyến bay.
+    """
+
+    __slots__ = FLIGHT_FIELDS
+
+    def __init__(self, flight_code=None, airline=None, departure_airport=None, arrival_airport=None,
+                 departure_time=None, arrival_time=None, duration_minutes=None, price=None, currency='VND',
+                 source=None, route=None, stops=0, aircraft_type='', baggage_info='', meal_info='',
+                 seat_class='', booking_url=''):
+        self.flight_code = flight_code
+        self.airline = airline
+        self.departure_airport = departure_airport
+        self.arrival_airport = arrival_airport
+        self.departure_time = departure_time
+        self.arrival_time = arrival_time
+        self.duration_minutes = duration_minutes
+        self.price = price
+        self.currency = currency
+        self.source = source
+        self.route = route or (f"{departure_airport}-{arrival_airport}"
+                               if departure_airport and arrival_airport else None)
+        self.stops = stops
+        self.aircraft_type = aircraft_type
+        self.baggage_info = baggage_info
+        self.meal_info = meal_info
+        self.seat_class = seat_class
+        self.booking_url = booking_url
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'FlightRecord':
+        """Tạo record từ dict/CSV row, chấp nhận tên cột cũ; giá trị rỗng được coi là thiếu"""
+        values = {}
+        for key, value in data.items():
+            if value is None or value == '':
+                continue
+            field = FIELD_ALIASES.get(key, key)
+            if field in FLIGHT_FIELDS:
+                values[field] = value
+        return cls(**values)
+
+    @classmethod
+    def coerce(cls, flight: Union['FlightRecord', Dict[str, Any]]) -> 'FlightRecord':
+        return flight if isinstance(flight, cls) else cls.from_dict(flight)
+
+    # Các hàm giống dict để code cũ (f.get('price'), f['airline']) vẫn chạy được
+    def get(self, name: str, default=None):
+        value = getattr(self, FIELD_ALIASES.get(name, name), None)
+        return default if value is None else value
+
+    def __getitem__(self, name: str):
+        try:
+            return getattr(self, FIELD_ALIASES.get(name, name))
+        except AttributeError:
+            raise KeyError(name)
+
+    def keys(self) -> Tuple[str, ...]:
+        return FLIGHT_FIELDS
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {field: getattr(self, field) for field in FLIGHT_FIELDS}
+
+    def to_db_tuple(self) -> tuple:
+        """Tuple theo thứ tự FLIGHT_FIELDS (bảng flights và CSV)"""
+        return (self.flight_code, self.airline, self.departure_airport, self.arrival_airport,
+                self.departure_time, self.arrival_time, self.duration_minutes, self.price, self.currency,
+                self.source, self.route, self.stops, self.aircraft_type, self.baggage_info, self.meal_info,
+                self.seat_class, self.booking_url)
+
+    def to_sqlite_tuple(self) -> tuple:
+        """Tuple theo thứ tự SQLITE_COLUMNS của bảng flights_metadata"""
+        return (self.airline, self.departure_airport, self.departure_time, self.arrival_airport,
+                self.arrival_time, self.duration_minutes, self.price, self.flight_code, self.source,
+                self.currency)
+
+    def __eq__(self, other):
+        if not isinstance(other, FlightRecord):
+            return NotImplemented
+        return self.to_db_tuple() == other.to_db_tuple()
+
+    def __repr__(self):
+        return (f"FlightRecord({self.flight_code!r}, {self.airline!r}, {self.route!r}, "
+                f"{self.departure_time!r}, {self.price!r})")
+
+
+def to_db_tuples(flights: Iterable[Union[FlightRecord, Dict[str, Any]]]):
+    return [FlightRecord.coerce(f).to_db_tuple() for f in flights]
@@ -0,0 +1,155 @@
+import re
+from typing import Any, Callable, Dict, List, Tuple
+
+import numpy as np
+
+from .FlightBatch import DATETIME_FIELDS, DATETIME_FORMAT, NUMERIC_FIELDS, STRING_FIELDS, FlightBatch
+
+# Schema khai báo cho một chuyến bay hợp lệ trước khi lưu:
+#   required: bắt buộc có giá trị         type: string | number | integer | datetime
+#   min/max: khoảng giá trị (gt/lt: khoảng mở)   format: định dạng datetime   pattern: regex cho chuỗi
+#   after: cột datetime phải không sớm hơn cột được chỉ định
+FLIGHT_SCHEMA: Dict[str, Dict[str, Any]] = {
+    'flight_code': {'required': True, 'type': 'string'},
+    'airline': {'required': True, 'type': 'string'},
+    'departure_airport': {'required': True, 'type': 'string'},
+    'arrival_airport': {'required': True, 'type': 'string'},
+    'departure_time': {'required': True, 'type': 'datetime', 'format': DATETIME_FORMAT},
+    'arrival_time': {'required': True, 'type': 'datetime', 'format': DATETIME_FORMAT, 'after': 'departure_time'},
+    'price': {'required': True, 'type': 'number', 'gt': 0},
+    'source': {'required': True, 'type': 'string'},
+    'duration_minutes': {'type': 'integer', 'min': 1, 'max': 48 * 60},
+    'currency': {'type': 'string', 'pattern': r'^[A-Z]{3}$'},
+    'stops': {'type': 'integer', 'min': 0, 'max': 5},
+}
+
+FIELD_TYPES = {
+    'string': STRING_FIELDS,
+    'datetime': DATETIME_FIELDS,
+    'number': tuple(f for f, dtype in NUMERIC_FIELDS.items() if np.dtype(dtype).kind == 'f'),
+    'integer': tuple(f for f, dtype in NUMERIC_FIELDS.items() if np.dtype(dtype).kind == 'i'),
+}
+
+# (tên rule, hàm trả về mask các dòng vi phạm)
+Rule = Tuple[str, Callable[[FlightBatch], np.ndarray]]
+
+
+class ValidationResult:
+    """Kết quả validate một batch: mask dòng hợp lệ và số dòng vi phạm theo từng rule"""
+
+    def __init__(self, valid: np.ndarray, rejections: Dict[str, int]):
+        self.valid = valid
+        self.rejections = rejections
+
+    @property
+    def total(self) -> int:
+        return len(self.valid)
+
+    @property
+    def rejected(self) -> int:
+        return int(self.total - self.valid.sum())
+
+    def summary(self) -> str:
+        details = ', '.join(f"{rule}={count}" for rule, count in sorted(self.rejections.items(),
+                                                                       key=lambda item: -item[1]))
+        return f"Rejected {self.rejected}/{self.total} flights ({details})" if self.rejected else \
+            f"All {self.total} flights valid"
+
+
+class FlightValidator:
+    """Schema đã compile thành danh sách rule, mỗi rule kiểm tra cả cột của FlightBatch một lần"""
+
+    def __init__(self, schema: Dict[str, Dict[str, Any]] = None):
+        self.schema = schema or FLIGHT_SCHEMA
+        self.rules: List[Rule] = compile_schema(self.schema)
+
+    def validate(self, batch: FlightBatch) -> ValidationResult:
+        valid = np.ones(len(batch), dtype=bool)
+        rejections = {}
+        for name, failed in self.rules:
+            mask = failed(batch)
+            count = int(mask.sum())
+            if count:
+                rejections[name] = count
+                valid &= ~mask
+        return ValidationResult(valid, rejections)
+
+
+def compile_schema(schema: Dict[str, Dict[str, Any]]) -> List[Rule]:
+    """Chuyển schema thành các rule; lỗi khai báo được báo ngay lúc compile thay vì lúc validate"""
+    rules: List[Rule] = []
+    for field, spec in schema.items():
+        field_type = spec.get('type')
+        if field_type not in FIELD_TYPES:
+            raise ValueError(f"Unknown type {field_type!r} for field {field}")
+        if field not in FIELD_TYPES[field_type]:
+            raise ValueError(f"Field {field} is not stored as {field_type} in FlightBatch")
+
+        if spec.get('required'):
+            rules.append((f"required:{field}", _missing_rule(field)))
+        if field_type in ('number', 'integer'):
+            rules.append((f"type:{field}", _invalid_rule(field)))
+        if field_type == 'datetime':
+            if spec.get('format', DATETIME_FORMAT) != DATETIME_FORMAT:
+                raise ValueError(f"FlightBatch only parses datetimes as {DATETIME_FORMAT!r}, got {spec['format']!r}")
+            rules.append((f"format:{field}", _invalid_rule(field)))
+            if spec.get('after'):
+                rules.append((f"order:{field}", _after_rule(field, spec['after'])))
+
+        bounds = {key: spec[key] for key in ('min', 'max', 'gt', 'lt') if key in spec}
+        if bounds:
+            if field_type not in ('number', 'integer'):
+                raise ValueError(f"Range only applies to numeric fields, got {field}")
+            rules.append((f"range:{field}", _range_rule(field, **bounds)))
+        if spec.get('pattern'):
+            if field_type != 'string':
+                raise ValueError(f"Pattern only applies to string fields, got {field}")
+            rules.append((f"pattern:{field}", _pattern_rule(field, re.compile(spec['pattern']))))
+    return rules
+
+
+def _missing_rule(field):
+    return lambda batch: batch.missing_mask(field)
+
+
+def _invalid_rule(field):
+    return lambda batch: batch.invalid_mask(field)
+
+
+def _range_rule(field, min=None, max=None, gt=None, lt=None):
+    def failed(batch: FlightBatch) -> np.ndarray:
+        values = batch.columns[field]
+        present = ~batch.null_mask(field)
+        out = np.zeros(len(values), dtype=bool)
+        if min is not None:
+            out |= values < min
+        if max is not None:
+            out |= values > max
+        if gt is not None:
+            out |= values <= gt
+        if lt is not None:
+            out |= values >= lt
+        return out & present
+    return failed
+
+
+def _pattern_rule(field, pattern: re.Pattern):
+    def failed(batch: FlightBatch) -> np.ndarray:
+        # Regex chỉ chạy trên các giá trị khác nhau trong dictionary, rồi ánh xạ về từng dòng qua mã
+        codes = batch.columns[field]
+        dictionary = batch.dictionaries[field]
+        bad_values = np.fromiter((pattern.search(v) is None for v in dictionary.values), dtype=bool,
+                                 count=len(dictionary))
+        return np.append(bad_values, False)[np.where(codes < 0, len(dictionary), codes)]
+    return failed
+
+
+def _after_rule(field, earlier_field):
+    def failed(batch: FlightBatch) -> np.ndarray:
+        columns = batch.columns
+        present = ~batch.null_mask(field) & ~batch.null_mask(earlier_field)
+        return present & (columns[field] < columns[earlier_field])
+    return failed
+
+
+FLIGHT_VALIDATOR = FlightValidator()
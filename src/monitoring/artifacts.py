@@ -0,0 +1,165 @@
+import atexit
+import logging
+import os
+import queue
+import random
+import threading
+from datetime import datetime
+from typing import Dict, Optional, Union
+
+from .metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+CAPTURE_OFF = 'off'
+CAPTURE_ON_FAILURE = 'on_failure'
+CAPTURE_SAMPLED = 'sampled'
+
+# off: không lưu gì; on_failure: chỉ route lỗi/bị chặn/không có kết quả;
+# sampled: route lỗi và thêm ARTIFACT_SAMPLE_RATE (0-1) số route thành công
+ARTIFACT_CAPTURE = os.getenv('ARTIFACT_CAPTURE', CAPTURE_ON_FAILURE)
+ARTIFACT_SAMPLE_RATE = float(os.getenv('ARTIFACT_SAMPLE_RATE', 0.05))
+ARTIFACT_DIR = os.getenv('ARTIFACT_DIR', os.path.join("data", "debug_artifacts"))
+# Vượt dung lượng này thì xóa artifact cũ nhất
+ARTIFACT_MAX_MB = int(os.getenv('ARTIFACT_MAX_MB', 200))
+ARTIFACT_QUEUE_SIZE = 16
+
+
+class ArtifactWriter:
+    """
+    Lưu screenshot/HTML debug theo policy (off, on_failure, sampled).
+    Screenshot và page_source phải lấy trên thread của scraper, việc ghi file và xoay vòng thư mục
+    (giới hạn max_mb, xóa file cũ nhất) chạy ở background thread. capture() không bao giờ block,
+    queue đầy thì bỏ artifact.
+    """
+
+    def __init__(self, policy: str = ARTIFACT_CAPTURE, sample_rate: float = ARTIFACT_SAMPLE_RATE,
+                 directory: str = ARTIFACT_DIR, max_mb: int = ARTIFACT_MAX_MB, queue_size: int = ARTIFACT_QUEUE_SIZE):
+        if policy not in (CAPTURE_OFF, CAPTURE_ON_FAILURE, CAPTURE_SAMPLED):
+            logger.warning(f"Unknown ARTIFACT_CAPTURE={policy!r}, using {CAPTURE_ON_FAILURE}")
+            policy = CAPTURE_ON_FAILURE
+        self.policy = policy
+        self.sample_rate = sample_rate
+        self.directory = directory
+        self.max_bytes = max_mb * 1024 * 1024
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._files: Optional[Dict[str, int]] = None
+        self._total_bytes = 0
+
+        self.written = 0
+        self.dropped = 0
+        self.rotated = 0
+
+    def should_capture(self, failed: bool) -> bool:
+        if self.policy == CAPTURE_OFF:
+            return False
+        if failed:
+            return True
+        return self.policy == CAPTURE_SAMPLED and random.random() < self.sample_rate
+
+    def capture(self, driver, source: str, route: str, reason: str, failed: bool = True) -> bool:
+        """Chụp screenshot + HTML của tab hiện tại nếu policy cho phép, trả về True nếu đã đưa vào queue"""
+        if driver is None or not self.should_capture(failed):
+            return False
+        name = f"{_safe_name(source)}_{_safe_name(route or 'unknown')}_{datetime.now():%Y%m%d_%H%M%S_%f}_{reason}"
+        files: Dict[str, Union[bytes, str]] = {}
+        try:
+            files['.png'] = driver.get_screenshot_as_png()
+        except Exception as e:
+            logger.debug(f"Screenshot failed for {name}: {e}")
+        try:
+            files['.html'] = driver.page_source
+        except Exception as e:
+            logger.debug(f"page_source failed for {name}: {e}")
+        return self.submit(name, files, source, route)
+
+    def submit(self, name: str, files: Dict[str, Union[bytes, str]], source: str = None, route: str = None) -> bool:
+        if not files:
+            return False
+        self._ensure_started()
+        try:
+            self._queue.put_nowait((name, files))
+        except queue.Full:
+            self.dropped += 1
+            metrics.inc('artifacts_dropped', source=source, route=route, stage='artifacts')
+            return False
+        metrics.inc('artifacts_captured', source=source, route=route, stage='artifacts')
+        return True
+
+    def flush(self, timeout: float = 10.0):
+        """Chờ ghi hết artifact trong queue (gọi khi kết thúc process)"""
+        if self._thread is None:
+            return
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            return
+        self._thread.join(timeout)
+        self._thread = None
+
+    def stats(self):
+        return {'policy': self.policy, 'written': self.written, 'dropped': self.dropped,
+                'rotated': self.rotated, 'pending': self._queue.qsize(), 'bytes': self._total_bytes}
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="artifact-writer", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            name, files = item
+            try:
+                self._write(name, files)
+            except OSError as e:
+                logger.error(f"Cannot write debug artifact {name}: {e}")
+
+    def _write(self, name: str, files: Dict[str, Union[bytes, str]]):
+        os.makedirs(self.directory, exist_ok=True)
+        if self._files is None:
+            self._scan()
+        for ext, content in files.items():
+            path = os.path.join(self.directory, name + ext)
+            data = content if isinstance(content, bytes) else content.encode('utf-8')
+            with open(path, 'wb') as f:
+                f.write(data)
+            self._files[path] = len(data)
+            self._total_bytes += len(data)
+        self.written += 1
+        logger.info(f"Debug artifact saved: {os.path.join(self.directory, name)}.*")
+        self._rotate()
+
+    def _scan(self):
+        """Đọc các artifact của lần chạy trước, theo thứ tự cũ -> mới"""
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file():
+                stat = entry.stat()
+                entries.append((stat.st_mtime, entry.path, stat.st_size))
+        self._files = {path: size for _, path, size in sorted(entries)}
+        self._total_bytes = sum(self._files.values())
+
+    def _rotate(self):
+        while self._total_bytes > self.max_bytes and len(self._files) > 1:
+            path = next(iter(self._files))
+            size = self._files.pop(path)
+            self._total_bytes -= size
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            self.rotated += 1
+
+
+def _safe_name(value: str) -> str:
+    return "".join(c if c.isalnum() or c in '.-_' else '_' for c in value)
+
+
+artifact_writer = ArtifactWriter()
+atexit.register(artifact_writer.flush)
@@ -0,0 +1,207 @@
+import logging
+import math
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+METRIC_PREFIX = "flight_pipeline"
+# Số sample tối đa giữ lại cho mỗi (stage, labels) để tính percentile
+MAX_SAMPLES_PER_SERIES = 10000
+QUANTILES = (0.5, 0.95)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, Optional[str]]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items() if v is not None))
+
+
+def _format_labels(label_key: LabelKey, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+    items = label_key + extra
+    if not items:
+        return ""
+    escaped = [(k, v.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')) for k, v in items]
+    return "{" + ",".join(f'{k}="{v}"' for k, v in escaped) + "}"
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """Percentile theo nearest-rank trên danh sách đã sort"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(q * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+class MetricsRegistry:
+    """Lưu counter và thời gian xử lý theo source, route, stage của pipeline"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[Tuple[str, LabelKey], float] = {}
+        self._timings: Dict[Tuple[str, LabelKey], List[float]] = {}
+        self._timing_totals: Dict[Tuple[str, LabelKey], Tuple[int, float]] = {}
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    def inc(self, name: str, value: float = 1, source: str = None, route: str = None, stage: str = None):
+        """Tăng counter, ví dụ pages_loaded, bytes_transferred, cards_parsed, rows_loaded, rows_deduped"""
+        key = (name, _label_key({'source': source, 'route': route, 'stage': stage}))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, stage: str, seconds: float, source: str = None, route: str = None):
+        key = (stage, _label_key({'source': source, 'route': route}))
+        with self._lock:
+            samples = self._timings.setdefault(key, [])
+            count, total = self._timing_totals.get(key, (0, 0.0))
+            if len(samples) < MAX_SAMPLES_PER_SERIES:
+                samples.append(seconds)
+            else:
+                # Reservoir sampling để giữ phân phối khi số sample vượt giới hạn
+                index = random.randrange(count + 1)
+                if index < MAX_SAMPLES_PER_SERIES:
+                    samples[index] = seconds
+            self._timing_totals[key] = (count + 1, total + seconds)
+
+    @contextmanager
+    def timer(self, stage: str, source: str = None, route: str = None):
+        """Đo thời gian một stage: with metrics.timer('scrolling', source, route): ..."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start, source, route)
+
+    def get_counter(self, name: str, source: str = None, route: str = None, stage: str = None) -> float:
+        key = (name, _label_key({'source': source, 'route': route, 'stage': stage}))
+        with self._lock:
+            return self._counters.get(key, 0)
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._timings.clear()
+            self._timing_totals.clear()
+
+    def stage_summary(self) -> Dict[str, Dict[str, float]]:
+        """Tổng hợp count, tổng thời gian, p50, p95 cho từng stage (gộp mọi source/route)"""
+        with self._lock:
+            by_stage: Dict[str, List[float]] = {}
+            totals: Dict[str, Tuple[int, float]] = {}
+            for (stage, _), samples in self._timings.items():
+                by_stage.setdefault(stage, []).extend(samples)
+            for (stage, _), (count, total) in self._timing_totals.items():
+                c, t = totals.get(stage, (0, 0.0))
+                totals[stage] = (c + count, t + total)
+
+        summary = {}
+        for stage, samples in by_stage.items():
+            samples.sort()
+            count, total = totals[stage]
+            summary[stage] = {
+                'count': count,
+                'total_seconds': total,
+                'p50_seconds': percentile(samples, 0.5),
+                'p95_seconds': percentile(samples, 0.95),
+            }
+        return summary
+
+    def log_summary(self):
+        summary = self.stage_summary()
+        if not summary:
+            logger.info("No pipeline metrics recorded.")
+            return
+        logger.info("Pipeline stage timings:")
+        for stage, s in sorted(summary.items()):
+            logger.info(f"  {stage:<16} count={s['count']:<6} total={s['total_seconds']:.2f}s "
+                        f"p50={s['p50_seconds']:.3f}s p95={s['p95_seconds']:.3f}s")
+
+    def to_prometheus(self) -> str:
+        """Xuất metrics theo Prometheus text format"""
+        with self._lock:
+            counters = dict(self._counters)
+            timings = {k: sorted(v) for k, v in self._timings.items()}
+            totals = dict(self._timing_totals)
+
+        lines = []
+        for name in sorted({name for name, _ in counters}):
+            metric = f"{METRIC_PREFIX}_{name}_total"
+            lines.append(f"# TYPE {metric} counter")
+            for (n, labels), value in sorted(counters.items()):
+                if n == name:
+                    lines.append(f"{metric}{_format_labels(labels)} {value:g}")
+
+        if timings:
+            metric = f"{METRIC_PREFIX}_stage_duration_seconds"
+            lines.append(f"# TYPE {metric} summary")
+            for (stage, labels), samples in sorted(timings.items()):
+                label_key = (('stage', stage),) + labels
+                for q in QUANTILES:
+                    lines.append(f"{metric}{_format_labels(label_key, (('quantile', str(q)),))} {percentile(samples, q):.6f}")
+                count, total = totals[(stage, labels)]
+                lines.append(f"{metric}_sum{_format_labels(label_key)} {total:.6f}")
+                lines.append(f"{metric}_count{_format_labels(label_key)} {count}")
+
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, file_path: str) -> str:
+        """Ghi metrics ra file (ghi file tạm rồi rename để node_exporter không đọc file dở)"""
+        os.makedirs(os.path.dirname(file_path) or ".", exist_ok=True)
+        tmp_path = f"{file_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(self.to_prometheus())
+        os.replace(tmp_path, file_path)
+        return file_path
+
+    def serve(self, port: int, host: str = "127.0.0.1"):
+        """Chạy HTTP server local trả về metrics tại /metrics"""
+        if self._server:
+            return self._server
+        registry = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.rstrip('/') not in ('', '/metrics'):
+                    self.send_error(404)
+                    return
+                body = registry.to_prometheus().encode('utf-8')
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), MetricsHandler)
+        threading.Thread(target=self._server.serve_forever, name="metrics-server", daemon=True).start()
+        logger.info(f"Serving metrics on http://{host}:{port}/metrics")
+        return self._server
+
+    def stop_server(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+def page_transfer_bytes(driver) -> int:
+    """Tổng số byte đã tải của trang hiện tại theo Resource Timing API của trình duyệt"""
+    try:
+        value = driver.execute_script(
+            "var n = performance.getEntriesByType('navigation')[0];"
+            "return (n ? n.transferSize : 0) + performance.getEntriesByType('resource')"
+            ".reduce(function(s, e) { return s + (e.transferSize || 0); }, 0);"
+        )
+        return int(value or 0)
+    except Exception:
+        return 0
+
+
+metrics = MetricsRegistry()
@@ -0,0 +1,120 @@
+import cProfile
+import functools
+import io
+import logging
+import os
+import pstats
+import threading
+import tracemalloc
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+PROFILE_ENV = 'PIPELINE_PROFILE'
+PROFILE_BASE_FOLDER = "data"
+TOP_ALLOCATIONS = 25
+
+_enabled = os.getenv(PROFILE_ENV, 'false').lower() in ('1', 'true', 'yes')
+_state = threading.local()
+_tracemalloc_lock = threading.Lock()
+_tracemalloc_users = 0
+
+
+def enable_profiling(enabled: bool = True):
+    """Bật/tắt chế độ profiling (tương đương biến môi trường PIPELINE_PROFILE=1)"""
+    global _enabled
+    _enabled = enabled
+
+
+def is_profiling_enabled() -> bool:
+    return _enabled
+
+
+def get_profile_folder(base_folder: str = PROFILE_BASE_FOLDER) -> str:
+    """Thư mục profile của lần chạy: data/scrap_YYYYMMDD/profiles"""
+    today_str = datetime.now().strftime("%Y%m%d")
+    folder_path = os.path.join(base_folder, f"scrap_{today_str}", "profiles")
+    os.makedirs(folder_path, exist_ok=True)
+    return folder_path
+
+
+def _start_tracemalloc():
+    global _tracemalloc_users
+    with _tracemalloc_lock:
+        if _tracemalloc_users == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        _tracemalloc_users += 1
+
+
+def _stop_tracemalloc():
+    global _tracemalloc_users
+    with _tracemalloc_lock:
+        _tracemalloc_users -= 1
+        if _tracemalloc_users == 0 and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+
+def profile_stage(stage_name: str):
+    """
+    Decorator bọc một stage của pipeline bằng cProfile và tracemalloc khi profiling được bật.
+    Khi tắt chỉ tốn một lần kiểm tra biến global.
+    Stage lồng nhau (vd. save_to_csv trong scrape_single_source) chỉ ghi báo cáo bộ nhớ,
+    thời gian CPU của chúng đã nằm trong file .prof của stage ngoài.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            return _run_profiled(stage_name, func, args, kwargs)
+        return wrapper
+    return decorator
+
+
+def _run_profiled(stage_name, func, args, kwargs):
+    nested = getattr(_state, 'active', False)
+    profiler = None if nested else cProfile.Profile()
+
+    _start_tracemalloc()
+    if not nested:
+        tracemalloc.reset_peak()
+    before = tracemalloc.take_snapshot()
+    _state.active = True
+    try:
+        if profiler:
+            return profiler.runcall(func, *args, **kwargs)
+        return func(*args, **kwargs)
+    finally:
+        _state.active = nested
+        after = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+        _stop_tracemalloc()
+        try:
+            _write_reports(stage_name, profiler, before, after, peak)
+        except Exception as e:
+            logger.error(f"Error writing profile for stage {stage_name}: {e}")
+
+
+def _write_reports(stage_name, profiler, before, after, peak):
+    folder_path = get_profile_folder()
+    prefix = os.path.join(folder_path, f"{stage_name}_{datetime.now().strftime('%H%M%S_%f')}")
+
+    if profiler:
+        profiler.dump_stats(f"{prefix}.prof")
+
+    stats = after.compare_to(before, 'lineno')
+    with open(f"{prefix}_alloc.txt", 'w', encoding='utf-8') as f:
+        f.write(f"Stage: {stage_name}\n")
+        f.write(f"Peak traced memory: {peak / 1024 / 1024:.2f} MiB\n")
+        f.write(f"Net allocated: {sum(s.size_diff for s in stats) / 1024 / 1024:.2f} MiB\n\n")
+        f.write(f"Top {TOP_ALLOCATIONS} allocations by size difference:\n")
+        for stat in stats[:TOP_ALLOCATIONS]:
+            f.write(f"{stat}\n")
+
+        if profiler:
+            buffer = io.StringIO()
+            pstats.Stats(profiler, stream=buffer).sort_stats('cumulative').print_stats(TOP_ALLOCATIONS)
+            f.write(f"\nTop {TOP_ALLOCATIONS} functions by cumulative time:\n")
+            f.write(buffer.getvalue())
+
+    logger.info(f"Profile for stage {stage_name} written to {prefix}*")
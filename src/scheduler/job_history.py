@@ -0,0 +1,137 @@
+import logging
+import socket
+import sqlite3
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from src.config.sqlite_connector import get_sqlite_connection
+
+JOB_RUNNING = 'running'
+JOB_SUCCESS = 'success'
+JOB_FAILED = 'failed'
+JOB_SKIPPED = 'skipped'
+
+
+def init_job_history():
+    connection = get_sqlite_connection()
+    if not connection:
+        return
+    try:
+        with connection:
+            connection.execute("""
+                CREATE TABLE IF NOT EXISTS job_history (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                job_name TEXT NOT NULL,
+                source TEXT,
+                host TEXT,
+                status TEXT NOT NULL,
+                started_at TEXT NOT NULL,
+                finished_at TEXT,
+                duration_seconds REAL,
+                message TEXT
+                );
+            """)
+            connection.execute("CREATE INDEX IF NOT EXISTS idx_job_history_name ON job_history (job_name, started_at)")
+    except sqlite3.Error as e:
+        logging.error(f"Error initializing job_history table: {e}")
+    finally:
+        connection.close()
+
+
+def _now() -> str:
+    return datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+
+def record_job_start(job_name: str, source: Optional[str] = None) -> Optional[int]:
+    """Ghi một lần chạy đang 'running', trả về id để cập nhật khi xong"""
+    connection = get_sqlite_connection()
+    if not connection:
+        return None
+    try:
+        with connection:
+            cursor = connection.execute(
+                "INSERT INTO job_history (job_name, source, host, status, started_at) VALUES (?, ?, ?, ?, ?)",
+                (job_name, source, socket.gethostname(), JOB_RUNNING, _now()))
+            return cursor.lastrowid
+    except sqlite3.Error as e:
+        logging.error(f"Error recording job start: {e}")
+        return None
+    finally:
+        connection.close()
+
+
+def record_job_end(job_id: Optional[int], status: str, duration_seconds: float, message: str = None):
+    if job_id is None:
+        return
+    connection = get_sqlite_connection()
+    if not connection:
+        return
+    try:
+        with connection:
+            connection.execute(
+                "UPDATE job_history SET status = ?, finished_at = ?, duration_seconds = ?, message = ? WHERE id = ?",
+                (status, _now(), duration_seconds, message, job_id))
+    except sqlite3.Error as e:
+        logging.error(f"Error recording job end: {e}")
+    finally:
+        connection.close()
+
+
+def record_job_skipped(job_name: str, source: Optional[str], reason: str):
+    job_id = record_job_start(job_name, source)
+    record_job_end(job_id, JOB_SKIPPED, 0.0, reason)
+
+
+def mark_interrupted_jobs() -> int:
+    """Các job còn 'running' từ lần chạy trước (process bị kill) được đánh dấu failed"""
+    connection = get_sqlite_connection()
+    if not connection:
+        return 0
+    try:
+        with connection:
+            cursor = connection.execute(
+                "UPDATE job_history SET status = ?, message = ? WHERE status = ? AND host = ?",
+                (JOB_FAILED, 'interrupted', JOB_RUNNING, socket.gethostname()))
+            return cursor.rowcount
+    except sqlite3.Error as e:
+        logging.error(f"Error marking interrupted jobs: {e}")
+        return 0
+    finally:
+        connection.close()
+
+
+def get_recent_jobs(limit: int = 50, job_name: str = None) -> List[Dict]:
+    connection = get_sqlite_connection()
+    if not connection:
+        return []
+    try:
+        connection.row_factory = sqlite3.Row
+        query = "SELECT * FROM job_history"
+        params = ()
+        if job_name:
+            query += " WHERE job_name = ?"
+            params = (job_name,)
+        rows = connection.execute(f"{query} ORDER BY id DESC LIMIT ?", params + (limit,)).fetchall()
+        return [dict(row) for row in rows]
+    except sqlite3.Error as e:
+        logging.error(f"Error fetching job history: {e}")
+        return []
+    finally:
+        connection.close()
+
+
+def get_last_success(job_name: str) -> Optional[datetime]:
+    """Thời điểm bắt đầu lần chạy thành công gần nhất, để lịch không chạy lại ngay sau khi restart"""
+    connection = get_sqlite_connection()
+    if not connection:
+        return None
+    try:
+        row = connection.execute(
+            "SELECT max(started_at) FROM job_history WHERE job_name = ? AND status = ?",
+            (job_name, JOB_SUCCESS)).fetchone()
+        return datetime.strptime(row[0], '%Y-%m-%d %H:%M:%S') if row and row[0] else None
+    except sqlite3.Error as e:
+        logging.error(f"Error fetching last job run: {e}")
+        return None
+    finally:
+        connection.close()
@@ -0,0 +1,166 @@
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from src.monitoring.metrics import metrics
+from src.scheduler import job_history
+
+logger = logging.getLogger(__name__)
+
+# Số trình duyệt Chrome tối đa chạy cùng lúc trên máy (tất cả source)
+MAX_BROWSERS = int(os.getenv('SCHEDULER_MAX_BROWSERS', 2))
+# Số job của cùng một source được chạy song song
+PER_SOURCE_CONCURRENCY = int(os.getenv('SCHEDULER_PER_SOURCE_CONCURRENCY', 1))
+SCHEDULER_WORKERS = int(os.getenv('SCHEDULER_WORKERS', 4))
+TICK_SECONDS = 1.0
+
+
+class ScheduledJob:
+    """Một job chạy lặp lại mỗi `interval_seconds`"""
+
+    def __init__(self, name: str, func: Callable[[], object], interval_seconds: float, source: str = None,
+                 uses_browser: bool = False, record_history: bool = True):
+        self.name = name
+        self.func = func
+        self.interval_seconds = interval_seconds
+        self.source = source
+        self.uses_browser = uses_browser
+        self.record_history = record_history
+        self.next_run = time.monotonic()
+        self.running = False
+        self.runs = 0
+        self.skips = 0
+
+
+class Scheduler:
+    """
+    Chạy các job scrape/load/transform theo lịch trong một process sống lâu.
+    - Một job đang chạy thì lần đến hạn tiếp theo bị bỏ qua (không chồng lên nhau).
+    - Mỗi source chạy tối đa `per_source_concurrency` job, vượt quá thì bỏ qua.
+    - Job dùng trình duyệt phải chờ slot trong giới hạn `max_browsers` chung.
+    Mọi lần chạy/bỏ qua đều được ghi vào bảng job_history.
+    """
+
+    def __init__(self, max_workers: int = SCHEDULER_WORKERS, max_browsers: int = MAX_BROWSERS,
+                 per_source_concurrency: int = PER_SOURCE_CONCURRENCY, tick_seconds: float = TICK_SECONDS):
+        self.max_workers = max_workers
+        self.per_source_concurrency = per_source_concurrency
+        self.tick_seconds = tick_seconds
+        self.jobs: List[ScheduledJob] = []
+        self.skip_checks: List[Callable[[ScheduledJob], Optional[str]]] = []
+
+        self._browser_slots = threading.BoundedSemaphore(max(1, max_browsers))
+        self._source_running: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        # add_job() đọc job_history để tính lần chạy đầu, bảng phải có trước lần đọc đó
+        job_history.init_job_history()
+
+    def add_job(self, name: str, func: Callable[[], object], interval_seconds: float, source: str = None,
+                uses_browser: bool = False, record_history: bool = True) -> ScheduledJob:
+        """record_history=False cho các job nhỏ chạy dày (vd. ghi metrics) để không làm đầy job_history"""
+        job = ScheduledJob(name, func, interval_seconds, source, uses_browser, record_history)
+        if record_history:
+            # Sau khi restart không chạy lại job vừa chạy xong gần đây
+            last_success = job_history.get_last_success(name)
+            if last_success:
+                elapsed = (datetime.now() - last_success).total_seconds()
+                job.next_run = time.monotonic() + max(0.0, interval_seconds - elapsed)
+        self.jobs.append(job)
+        logger.info(f"Scheduled {name} every {interval_seconds:.0f}s"
+                    f"{' (browser)' if uses_browser else ''}")
+        return job
+
+    def add_skip_check(self, check: Callable[[ScheduledJob], Optional[str]]):
+        """check(job) trả về lý do bỏ qua (vd. circuit breaker đang mở) hoặc None để chạy"""
+        self.skip_checks.append(check)
+
+    def start(self):
+        interrupted = job_history.mark_interrupted_jobs()
+        if interrupted:
+            logger.warning(f"Marked {interrupted} interrupted jobs from the previous run as failed")
+        self._stop_event.clear()
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="scheduler")
+
+    def run_forever(self):
+        self.start()
+        logger.info(f"Scheduler started with {len(self.jobs)} jobs")
+        try:
+            while not self._stop_event.is_set():
+                self.run_pending()
+                self._stop_event.wait(self.tick_seconds)
+        except KeyboardInterrupt:
+            logger.info("Scheduler interrupted, waiting for running jobs...")
+        finally:
+            self.shutdown()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def shutdown(self, wait: bool = True):
+        self._stop_event.set()
+        if self._executor:
+            self._executor.shutdown(wait=wait)
+            self._executor = None
+
+    def run_pending(self):
+        now = time.monotonic()
+        for job in self.jobs:
+            if job.next_run > now:
+                continue
+            # Lịch tính theo thời điểm đến hạn, không dồn các lần bị lỡ
+            job.next_run = now + job.interval_seconds
+            reason = self._skip_reason(job)
+            if reason:
+                job.skips += 1
+                logger.warning(f"Skipping {job.name}: {reason}")
+                metrics.inc('jobs_skipped', source=job.source, stage=job.name)
+                if job.record_history:
+                    job_history.record_job_skipped(job.name, job.source, reason)
+                continue
+            self._executor.submit(self._run_job, job)
+
+    def _skip_reason(self, job: ScheduledJob) -> Optional[str]:
+        with self._lock:
+            if job.running:
+                return "previous run still in progress"
+            if job.source and self._source_running.get(job.source, 0) >= self.per_source_concurrency:
+                return f"{job.source} already has {self.per_source_concurrency} running job(s)"
+            for check in self.skip_checks:
+                reason = check(job)
+                if reason:
+                    return reason
+            job.running = True
+            if job.source:
+                self._source_running[job.source] = self._source_running.get(job.source, 0) + 1
+        return None
+
+    def _run_job(self, job: ScheduledJob):
+        job_id = job_history.record_job_start(job.name, job.source) if job.record_history else None
+        started = time.perf_counter()
+        status, message = job_history.JOB_SUCCESS, None
+        try:
+            if job.uses_browser:
+                with self._browser_slots:
+                    job.func()
+            else:
+                job.func()
+        except Exception as e:
+            status, message = job_history.JOB_FAILED, str(e)[:1000]
+            logger.error(f"Job {job.name} failed: {e}", exc_info=True)
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                job.running = False
+                job.runs += 1
+                if job.source:
+                    self._source_running[job.source] -= 1
+            job_history.record_job_end(job_id, status, elapsed, message)
+            metrics.inc('jobs_run', source=job.source, stage=job.name)
+            metrics.observe(f"job:{job.name}", elapsed, job.source)
+            logger.info(f"Job {job.name} {status} in {elapsed:.1f}s")
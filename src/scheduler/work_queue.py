@@ -0,0 +1,306 @@
+"""
+Hàng đợi task scrape (route x ngày x source) dùng chung giữa nhiều máy qua database.
+
+Task được worker claim theo batch với lease có thời hạn; worker gửi heartbeat để gia hạn, nếu worker chết
+thì lease hết hạn và task được worker khác claim lại. Mỗi lần claim tăng attempts, quá max_attempts thì
+task chuyển sang failed. Backend là bảng scrape_tasks trong MySQL data_warehouse, hoặc một file SQLite
+dùng chung để test local.
+
+Thời gian lưu theo UTC do worker tính, các máy worker cần đồng bộ giờ (NTP).
+"""
+import logging
+import sqlite3
+import threading
+import uuid
+from datetime import date, datetime, timedelta, timezone
+from typing import Callable, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+TASK_PENDING = 'pending'
+TASK_LEASED = 'leased'
+TASK_DONE = 'done'
+TASK_FAILED = 'failed'
+
+DEFAULT_MAX_ATTEMPTS = 3
+DEFAULT_LEASE_SECONDS = 600
+
+MYSQL_SCHEMA = ["""
+    CREATE TABLE IF NOT EXISTS scrape_tasks (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        source VARCHAR(255) NOT NULL,
+        origin VARCHAR(10) NOT NULL,
+        destination VARCHAR(10) NOT NULL,
+        search_date DATE NOT NULL,
+        status VARCHAR(20) NOT NULL DEFAULT 'pending',
+        attempts INT NOT NULL DEFAULT 0,
+        max_attempts INT NOT NULL DEFAULT 3,
+        available_at DATETIME NOT NULL,
+        lease_owner VARCHAR(255),
+        lease_token VARCHAR(64),
+        lease_expires_at DATETIME,
+        heartbeat_at DATETIME,
+        result_rows INT,
+        last_error TEXT,
+        created_at DATETIME NOT NULL,
+        updated_at DATETIME NOT NULL,
+        UNIQUE KEY unique_task (source, origin, destination, search_date),
+        KEY idx_claim (status, available_at),
+        KEY idx_lease_token (lease_token)
+    ) ENGINE=InnoDB;
+"""]
+
+SQLITE_SCHEMA = ["""
+    CREATE TABLE IF NOT EXISTS scrape_tasks (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        source TEXT NOT NULL,
+        origin TEXT NOT NULL,
+        destination TEXT NOT NULL,
+        search_date TEXT NOT NULL,
+        status TEXT NOT NULL DEFAULT 'pending',
+        attempts INTEGER NOT NULL DEFAULT 0,
+        max_attempts INTEGER NOT NULL DEFAULT 3,
+        available_at TEXT NOT NULL,
+        lease_owner TEXT,
+        lease_token TEXT,
+        lease_expires_at TEXT,
+        heartbeat_at TEXT,
+        result_rows INTEGER,
+        last_error TEXT,
+        created_at TEXT NOT NULL,
+        updated_at TEXT NOT NULL
+    );
+""",
+    "CREATE UNIQUE INDEX IF NOT EXISTS unique_task ON scrape_tasks (source, origin, destination, search_date)",
+    "CREATE INDEX IF NOT EXISTS idx_claim ON scrape_tasks (status, available_at)",
+    "CREATE INDEX IF NOT EXISTS idx_lease_token ON scrape_tasks (lease_token)",
+]
+
+# Task claim được: pending đã tới giờ chạy, hoặc leased nhưng lease đã hết hạn (worker chết)
+CLAIMABLE_CONDITION = """
+    ((status = 'pending' AND available_at <= %s) OR (status = 'leased' AND lease_expires_at < %s))
+    AND attempts < max_attempts
+"""
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None, microsecond=0)
+
+
+def _fmt(value: datetime) -> str:
+    return value.strftime('%Y-%m-%d %H:%M:%S')
+
+
+class ScrapeTask:
+    def __init__(self, id, source, origin, destination, search_date, attempts, max_attempts, lease_token, **_):
+        self.id = id
+        self.source = source
+        self.origin = origin
+        self.destination = destination
+        self.search_date = search_date if isinstance(search_date, date) else \
+            datetime.strptime(str(search_date), '%Y-%m-%d').date()
+        self.attempts = attempts
+        self.max_attempts = max_attempts
+        self.lease_token = lease_token
+
+    @property
+    def route(self) -> str:
+        return f"{self.origin}-{self.destination}"
+
+    def __repr__(self):
+        return f"ScrapeTask({self.id}, {self.source!r}, {self.route}, {self.search_date}, attempt {self.attempts})"
+
+
+class TaskQueue:
+    """
+    Các thao tác trên bảng scrape_tasks. Câu lệnh viết theo placeholder %s của PyMySQL và được đổi sang ?
+    cho SQLite; chỉ phần claim theo batch là khác nhau giữa 2 dialect.
+    Một connection dùng chung cho worker và thread heartbeat, bảo vệ bằng lock.
+    """
+
+    def __init__(self, connection_factory: Callable, dialect: str = None):
+        self.connection_factory = connection_factory
+        self._connection = None
+        self._lock = threading.RLock()
+        self.dialect = dialect
+
+    @classmethod
+    def sqlite(cls, db_path: str) -> 'TaskQueue':
+        # timeout lớn để các worker chờ nhau khi cùng ghi vào file SQLite
+        return cls(lambda: sqlite3.connect(db_path, timeout=30, check_same_thread=False), 'sqlite')
+
+    @classmethod
+    def mysql(cls) -> 'TaskQueue':
+        from src.config.db_connector import get_db_connection
+        return cls(get_db_connection, 'mysql')
+
+    # ---- Connection ----
+    def _get_connection(self):
+        if self._connection is None:
+            connection = self.connection_factory()
+            if connection is None:
+                raise ConnectionError("Cannot connect to task queue database")
+            if self.dialect is None:
+                self.dialect = 'sqlite' if isinstance(connection, sqlite3.Connection) else 'mysql'
+            if self.dialect == 'sqlite':
+                connection.row_factory = sqlite3.Row
+            self._connection = connection
+        elif self.dialect == 'mysql':
+            self._connection.ping(reconnect=True)
+        return self._connection
+
+    def _execute(self, query: str, params=(), many: bool = False, fetch: bool = False):
+        with self._lock:
+            connection = self._get_connection()
+            if self.dialect == 'sqlite':
+                query = query.replace('%s', '?')
+            cursor = connection.cursor()
+            try:
+                if many:
+                    cursor.executemany(query, params)
+                else:
+                    cursor.execute(query, params)
+                rows = [dict(row) for row in cursor.fetchall()] if fetch else None
+                connection.commit()
+                return rows if fetch else cursor.rowcount
+            except Exception:
+                connection.rollback()
+                raise
+            finally:
+                cursor.close()
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None:
+                try:
+                    self._connection.close()
+                finally:
+                    self._connection = None
+
+    def init_schema(self):
+        self._get_connection()
+        for statement in (SQLITE_SCHEMA if self.dialect == 'sqlite' else MYSQL_SCHEMA):
+            self._execute(statement)
+
+    # ---- Producer ----
+    def enqueue(self, source: str, routes: Iterable[Dict], search_dates: Iterable[date],
+                max_attempts: int = DEFAULT_MAX_ATTEMPTS) -> int:
+        """Thêm task cho mỗi route x ngày, task đã tồn tại được bỏ qua"""
+        now = _fmt(_now())
+        rows = [(source, r['origin'], r['destination'], d.strftime('%Y-%m-%d'), max_attempts, now, now, now)
+                for d in search_dates for r in routes]
+        if not rows:
+            return 0
+        self._get_connection()
+        insert = "INSERT OR IGNORE" if self.dialect == 'sqlite' else "INSERT IGNORE"
+        return self._execute(f"""
+            {insert} INTO scrape_tasks
+                (source, origin, destination, search_date, max_attempts, available_at, created_at, updated_at)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+        """, rows, many=True)
+
+    # ---- Worker ----
+    def claim(self, worker_id: str, batch_size: int = 1, lease_seconds: int = DEFAULT_LEASE_SECONDS,
+              sources: Optional[Iterable[str]] = None) -> List[ScrapeTask]:
+        """Claim tối đa batch_size task bằng một câu UPDATE (atomic), trả về các task đã claim"""
+        self.reap_exhausted()
+        now = _now()
+        token = uuid.uuid4().hex
+        params = [worker_id, token, _fmt(now + timedelta(seconds=lease_seconds)), _fmt(now), _fmt(now),
+                  _fmt(now), _fmt(now)]
+        source_condition = ""
+        if sources:
+            sources = list(sources)
+            source_condition = f"AND source IN ({', '.join(['%s'] * len(sources))})"
+            params.extend(sources)
+        params.append(batch_size)
+
+        assignments = """
+            status = 'leased', lease_owner = %s, lease_token = %s, lease_expires_at = %s, heartbeat_at = %s,
+            attempts = attempts + 1, updated_at = %s
+        """
+        if self.dialect == 'sqlite':
+            # SQLite không có UPDATE ... LIMIT (mặc định), chọn id bằng subquery trong cùng câu lệnh
+            query = f"""
+                UPDATE scrape_tasks SET {assignments}
+                WHERE id IN (
+                    SELECT id FROM scrape_tasks
+                    WHERE {CLAIMABLE_CONDITION} {source_condition}
+                    ORDER BY search_date, id
+                    LIMIT %s
+                )
+            """
+        else:
+            query = f"""
+                UPDATE scrape_tasks SET {assignments}
+                WHERE {CLAIMABLE_CONDITION} {source_condition}
+                ORDER BY search_date, id
+                LIMIT %s
+            """
+        if not self._execute(query, params):
+            return []
+        rows = self._execute("SELECT * FROM scrape_tasks WHERE lease_token = %s ORDER BY search_date, id",
+                             (token,), fetch=True)
+        return [ScrapeTask(**row) for row in rows]
+
+    def heartbeat(self, tasks: List[ScrapeTask], lease_seconds: int = DEFAULT_LEASE_SECONDS) -> int:
+        """Gia hạn lease cho các task worker đang giữ, trả về số task còn giữ được"""
+        tokens = sorted({t.lease_token for t in tasks})
+        if not tokens:
+            return 0
+        now = _now()
+        return self._execute(f"""
+            UPDATE scrape_tasks SET lease_expires_at = %s, heartbeat_at = %s
+            WHERE status = 'leased' AND lease_token IN ({', '.join(['%s'] * len(tokens))})
+              AND id IN ({', '.join(['%s'] * len(tasks))})
+        """, [_fmt(now + timedelta(seconds=lease_seconds)), _fmt(now)] + tokens + [t.id for t in tasks])
+
+    def complete(self, task: ScrapeTask, result_rows: int) -> bool:
+        """Đánh dấu done; False nếu lease đã mất (task có thể đang được worker khác chạy lại)"""
+        updated = self._execute("""
+            UPDATE scrape_tasks SET status = 'done', result_rows = %s, lease_token = NULL, last_error = NULL,
+                   updated_at = %s
+            WHERE id = %s AND lease_token = %s AND status = 'leased'
+        """, (result_rows, _fmt(_now()), task.id, task.lease_token))
+        if not updated:
+            logger.warning(f"Lost lease on {task}, result may be duplicated")
+        return bool(updated)
+
+    def fail(self, task: ScrapeTask, error: str, retry_delay_seconds: int = 60) -> bool:
+        """Trả task về pending (chờ retry_delay x attempts) hoặc failed nếu đã hết lượt thử"""
+        now = _now()
+        return bool(self._execute("""
+            UPDATE scrape_tasks
+            SET status = CASE WHEN attempts >= max_attempts THEN 'failed' ELSE 'pending' END,
+                available_at = %s, lease_token = NULL, last_error = %s, updated_at = %s
+            WHERE id = %s AND lease_token = %s AND status = 'leased'
+        """, (_fmt(now + timedelta(seconds=retry_delay_seconds * task.attempts)), str(error)[:2000], _fmt(now),
+              task.id, task.lease_token)))
+
+    def release(self, tasks: List[ScrapeTask]) -> int:
+        """Trả lại các task chưa chạy (worker dừng giữa batch), không tính là một lần thử"""
+        released = 0
+        for task in tasks:
+            released += self._execute("""
+                UPDATE scrape_tasks SET status = 'pending', attempts = attempts - 1, lease_token = NULL,
+                       updated_at = %s
+                WHERE id = %s AND lease_token = %s AND status = 'leased'
+            """, (_fmt(_now()), task.id, task.lease_token))
+        return released
+
+    def reap_exhausted(self) -> int:
+        """Task có lease hết hạn và đã dùng hết lượt thử chuyển sang failed"""
+        now = _fmt(_now())
+        return self._execute("""
+            UPDATE scrape_tasks SET status = 'failed', lease_token = NULL, last_error = 'lease expired',
+                   updated_at = %s
+            WHERE status = 'leased' AND lease_expires_at < %s AND attempts >= max_attempts
+        """, (now, now))
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        rows = self._execute("SELECT source, status, count(*) AS total FROM scrape_tasks GROUP BY source, status",
+                             fetch=True)
+        result: Dict[str, Dict[str, int]] = {}
+        for row in rows:
+            result.setdefault(row['source'], {})[row['status']] = row['total']
+        return result
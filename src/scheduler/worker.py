@@ -0,0 +1,273 @@
+"""
+Worker scrape chạy trên nhiều máy, lấy task (source x route x ngày) từ hàng đợi scrape_tasks.
+
+    # Tạo task cho 7 ngày tới (route lấy từ bảng airport)
+    python -m src.scheduler.worker --enqueue --days 7
+    # Chạy worker, mỗi lần claim 5 task
+    python -m src.scheduler.worker --batch-size 5 --sources Booking.com
+    # Test local bằng file SQLite dùng chung và mock server, không cần MySQL
+    python -m src.scheduler.worker --backend sqlite --queue-db data/queue.sqlite \
+        --enqueue --airports SGN HAN DAD --days 2
+    python -m src.scheduler.worker --backend sqlite --queue-db data/queue.sqlite --drain \
+        --base-url Booking.com=http://127.0.0.1:8765/api/flights/
+"""
+import argparse
+import logging
+import os
+import socket
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List
+
+from src.constant.DataSource import DataSource
+from src.model.FlightBatch import FlightBatch
+from src.monitoring.metrics import metrics
+from src.scheduler.work_queue import DEFAULT_LEASE_SECONDS, ScrapeTask, TaskQueue
+from src.scrapers.CircuitBreaker import circuit_breakers
+from src.scrapers.ScraperManager import ScraperManager
+
+logger = logging.getLogger(__name__)
+
+WORKER_BATCH_SIZE = int(os.getenv('WORKER_BATCH_SIZE', 5))
+WORKER_LEASE_SECONDS = int(os.getenv('WORKER_LEASE_SECONDS', DEFAULT_LEASE_SECONDS))
+WORKER_POLL_SECONDS = float(os.getenv('WORKER_POLL_SECONDS', 10))
+WORKER_RETRY_DELAY = int(os.getenv('WORKER_RETRY_DELAY', 60))
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class ScrapeWorker:
+    """
+    Claim task theo batch, scrape từng task và ghi kết quả qua `write_results(batch, task) -> số dòng`.
+    Trong lúc chạy, một thread gửi heartbeat mỗi 1/3 thời gian lease để task không bị worker khác lấy lại.
+    """
+
+    def __init__(self, queue: TaskQueue, configs: Dict[str, Dict], write_results: Callable[[FlightBatch, ScrapeTask], int],
+                 worker_id: str = None, batch_size: int = WORKER_BATCH_SIZE,
+                 lease_seconds: int = WORKER_LEASE_SECONDS, sources: List[str] = None):
+        self.queue = queue
+        self.configs = configs
+        self.write_results = write_results
+        self.worker_id = worker_id or default_worker_id()
+        self.batch_size = batch_size
+        self.lease_seconds = lease_seconds
+        self.sources = sources or list(configs)
+        # Giữ một session (requests.Session/trình duyệt) cho mỗi source suốt vòng đời worker
+        self.scraper_manager = ScraperManager(reuse_sessions=True)
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run_once(self) -> int:
+        """Claim và xử lý một batch, trả về số task đã claim"""
+        # Chỉ claim task của các source có circuit breaker đóng, worker dồn sức cho source còn chạy được
+        sources = circuit_breakers.available_sources(self.sources)
+        if not sources:
+            return 0
+        tasks = self.queue.claim(self.worker_id, self.batch_size, self.lease_seconds, sources)
+        if not tasks:
+            return 0
+        logger.info(f"{self.worker_id} claimed {len(tasks)} tasks")
+        # Các ngày của cùng một route chạy liền nhau trên cùng session
+        remaining = sorted(tasks, key=lambda t: (t.source, t.origin, t.destination, t.search_date))
+        heartbeat_stop = threading.Event()
+        heartbeat = threading.Thread(target=self._heartbeat_loop, args=(remaining, heartbeat_stop),
+                                     name="queue-heartbeat", daemon=True)
+        heartbeat.start()
+        try:
+            while remaining and not self._stop_event.is_set():
+                task = remaining[0]
+                reason = circuit_breakers.skip_reason(task.source)
+                if reason:
+                    # Breaker mở giữa batch: trả lại các task của source đó, không tính là một lần thử
+                    skipped = [t for t in remaining if t.source == task.source]
+                    remaining[:] = [t for t in remaining if t.source != task.source]
+                    self.queue.release(skipped)
+                    logger.warning(f"Released {len(skipped)} tasks: {reason}")
+                    continue
+                self.process(task)
+                remaining.pop(0)
+        finally:
+            heartbeat_stop.set()
+            heartbeat.join()
+            if remaining:
+                # Worker dừng giữa batch: trả lại các task chưa chạy cho worker khác
+                self.queue.release(remaining)
+        return len(tasks)
+
+    def process(self, task: ScrapeTask):
+        config = self.configs.get(task.source)
+        if config is None:
+            self.queue.fail(task, f"No active config for {task.source}", WORKER_RETRY_DELAY)
+            return
+        started = time.perf_counter()
+        try:
+            route = {'origin': task.origin, 'destination': task.destination}
+            search_date = datetime.combine(task.search_date, datetime.min.time())
+            flights = self.scraper_manager.scrape_single_source(config, [route], search_date)
+            if not flights:
+                reason = circuit_breakers.skip_reason(task.source)
+                if reason:
+                    # Breaker mở trong lúc chạy task: trả lại task, không tính là hoàn thành hay một lần thử
+                    self.queue.release([task])
+                    logger.warning(f"Released {task}: {reason}")
+                    return
+                error = self.scraper_manager.last_errors.get(task.source)
+                if error:
+                    # Lỗi đã bị scraper chuyển thành kết quả rỗng: tính là thất bại để được thử lại
+                    raise RuntimeError(error)
+            rows = self.write_results(flights, task)
+        except Exception as e:
+            logger.error(f"Task {task} failed: {e}")
+            self.queue.fail(task, str(e), WORKER_RETRY_DELAY)
+            metrics.inc('tasks_failed', source=task.source, route=task.route, stage='worker')
+            return
+        finally:
+            metrics.observe('worker_task', time.perf_counter() - started, task.source, task.route)
+        self.queue.complete(task, rows)
+        metrics.inc('tasks_done', source=task.source, route=task.route, stage='worker')
+        logger.info(f"Task {task} done: {rows} flights")
+
+    def run_forever(self, drain: bool = False):
+        """drain=True: dừng khi hàng đợi không còn task claim được"""
+        try:
+            while not self._stop_event.is_set():
+                if self.run_once():
+                    continue
+                if drain:
+                    break
+                self._stop_event.wait(WORKER_POLL_SECONDS)
+        except KeyboardInterrupt:
+            logger.info("Worker interrupted.")
+            self.stop()
+        finally:
+            self.scraper_manager.close()
+
+    def _heartbeat_loop(self, tasks: List[ScrapeTask], stop_event: threading.Event):
+        interval = max(1.0, self.lease_seconds / 3)
+        while not stop_event.wait(interval):
+            try:
+                held = self.queue.heartbeat(list(tasks), self.lease_seconds)
+                if held < len(tasks):
+                    logger.warning(f"{self.worker_id} lost {len(tasks) - held} leases")
+            except Exception as e:
+                logger.error(f"Heartbeat failed: {e}")
+
+
+def sqlite_results_writer(flights: FlightBatch, task: ScrapeTask) -> int:
+    from src.main import load_batch_to_sqlite
+    return load_batch_to_sqlite(flights, task.source) if flights else 0
+
+
+def mysql_results_writer(scraper_manager: ScraperManager) -> Callable[[FlightBatch, ScrapeTask], int]:
+    """Ghi thẳng vào bảng flights của warehouse, mỗi worker giữ một connection riêng"""
+    from src.config.db_connector import get_db_connection
+    from src.config.db_manager import insert_flights_data
+    connection = get_db_connection()
+    if not connection:
+        raise ConnectionError("Cannot connect to database")
+
+    def write(flights: FlightBatch, task: ScrapeTask) -> int:
+        cleaned = scraper_manager.clean_flight_data(flights)
+        if cleaned:
+            connection.ping(reconnect=True)
+            insert_flights_data(connection, cleaned)
+        return len(cleaned)
+    return write
+
+
+def parse_base_urls(values) -> Dict[str, Dict]:
+    configs = {}
+    for value in values or []:
+        source_name, _, url = value.partition('=')
+        configs[source_name] = {'source_name': source_name, 'url': url}
+    return configs
+
+
+def load_routes(args) -> List[Dict]:
+    from src.helpper.hepper import buidl_origin_destination
+    if args.airports:
+        return buidl_origin_destination(args.airports)
+    from src.config.db_connector import get_db_connection
+    from src.config.db_manager import get_airport
+    connection = get_db_connection()
+    if not connection:
+        raise ConnectionError("Cannot connect to database")
+    try:
+        return buidl_origin_destination(get_airport(connection))
+    finally:
+        connection.close()
+
+
+def load_configs(args) -> Dict[str, Dict]:
+    if args.base_url or args.backend == 'sqlite':
+        return parse_base_urls(args.base_url)
+    from src.config.db_connector import get_db_connection
+    from src.config.db_manager import get_active_configs
+    connection = get_db_connection()
+    if not connection:
+        raise ConnectionError("Cannot connect to database")
+    try:
+        return {c['source_name']: c for c in get_active_configs(connection, use_cache=False)}
+    finally:
+        connection.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Distributed scrape worker")
+    parser.add_argument('--backend', choices=('mysql', 'sqlite'), default='mysql',
+                        help="mysql: bảng scrape_tasks trong data_warehouse; sqlite: file --queue-db để test local")
+    parser.add_argument('--queue-db', default=os.path.join("data", "queue.sqlite"))
+    parser.add_argument('--sources', nargs='+', choices=[s.value for s in DataSource])
+    parser.add_argument('--enqueue', action='store_true', help="Tạo task cho các route x --days ngày tới rồi thoát")
+    parser.add_argument('--days', type=int, default=1)
+    parser.add_argument('--airports', nargs='+', help="Mã sân bay tạo route (mặc định lấy từ bảng airport)")
+    parser.add_argument('--base-url', action='append', metavar='SOURCE=URL',
+                        help="URL của source thay cho bảng config (vd. mock server)")
+    parser.add_argument('--worker-id', default=None)
+    parser.add_argument('--batch-size', type=int, default=WORKER_BATCH_SIZE)
+    parser.add_argument('--lease-seconds', type=int, default=WORKER_LEASE_SECONDS)
+    parser.add_argument('--drain', action='store_true', help="Dừng khi hết task thay vì chờ task mới")
+    parser.add_argument('--stats', action='store_true', help="In số task theo source/trạng thái rồi thoát")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    queue = TaskQueue.sqlite(args.queue_db) if args.backend == 'sqlite' else TaskQueue.mysql()
+    try:
+        queue.init_schema()
+        if args.stats:
+            for source_name, counts in sorted(queue.stats().items()):
+                logger.info(f"{source_name}: {counts}")
+            return 0
+        if args.enqueue:
+            routes = load_routes(args)
+            first_day = datetime.now() + timedelta(days=1)
+            dates = [(first_day + timedelta(days=i)).date() for i in range(args.days)]
+            for source_name in args.sources or [s.value for s in DataSource]:
+                added = queue.enqueue(source_name, routes, dates)
+                logger.info(f"Enqueued {added} tasks for {source_name} ({len(routes)} routes x {len(dates)} days)")
+            return 0
+
+        configs = load_configs(args)
+        sources = [s for s in (args.sources or list(configs)) if s in configs]
+        if not sources:
+            logger.error("No source config available for the worker.")
+            return 1
+        scraper_manager = ScraperManager()
+        writer = sqlite_results_writer if args.backend == 'sqlite' else mysql_results_writer(scraper_manager)
+        if args.backend == 'sqlite':
+            from src.config.sqlite_connector import init_sqlite_db
+            init_sqlite_db()
+        worker = ScrapeWorker(queue, configs, writer, args.worker_id, args.batch_size, args.lease_seconds, sources)
+        worker.run_forever(drain=args.drain)
+        return 0
+    finally:
+        queue.close()
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
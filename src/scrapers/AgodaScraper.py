@@ -1,6 +1,7 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import os
 import time
 from selenium import webdriver
 from selenium.webdriver.chrome.service import Service
@@ -15,17 +16,74 @@ import re
 import random
 from bs4 import BeautifulSoup
 import traceback
+from ..monitoring.artifacts import artifact_writer
+from ..monitoring.metrics import metrics, page_transfer_bytes
+from ..model.FlightRecord import FlightRecord
+from ..model.FlightBatch import FlightBatch
+from .ApiReplay import ApiReplayClient, replay_or_none
+from .BrowserProfileManager import browser_profiles
+from .CircuitBreaker import record_route_outcome
+from .DriverGovernor import driver_governor, recycle_if_needed
+from .TabMultiplexer import (BROWSER_TABS, MULTI_TAB_CHROME_ARGS, BreakerJobSource, bring_to_front,
+                             next_available_job, run_multi_tab)
+
+# Dấu hiệu trang chặn bot/captcha, gặp thì bỏ qua scroll và parse
+BLOCK_PAGE_MARKERS = ('captcha', 'access denied', 'unusual traffic', 'are you a robot', 'request blocked')
+
 
 class AgodaScraperV2:
-    def __init__(self):
-        self.source_name = "Agoda.com"
-        self.base_url = "https://www.agoda.com/flights"
+    def __init__(self, source_name="Agoda.com", base_url="https://www.agoda.com/flights", keep_driver=False,
+                 tabs=BROWSER_TABS):
+        self.source_name = source_name
+        self.base_url = base_url.rstrip('/')
+        # tabs > 1: scrape_matrix chạy song song nhiều lượt tìm kiếm trên các tab của một trình duyệt
+        self.tabs = max(1, tabs)
+        # Lỗi gần nhất (trang bị chặn, exception), dùng cho circuit breaker khi route không có kết quả
+        self.last_error = None
+        # keep_driver=True: dùng lại một trình duyệt (cookie, cache) cho nhiều route/ngày, đóng bằng close()
+        self.keep_driver = keep_driver
+        self.driver = None
+        self.profile_dir = None
+        # API_REPLAY=1: sau route đầu tiên chạy bằng trình duyệt, các route sau gọi thẳng API tìm kiếm
+        self.replay = ApiReplayClient.for_source(source_name, self.base_url)
+
+    def open_driver(self):
+        """Mở trình duyệt trên profile lâu dài của source (cookie, cache giữ lại giữa các lần chạy)"""
+        driver_governor.wait_for_capacity(self.source_name)
+        self.profile_dir = browser_profiles.acquire(self.source_name)
+        try:
+            self.driver = self.make_driver(headless=False, profile_dir=self.profile_dir)
+        except Exception:
+            self.close()
+            raise
+        return self.driver
+
+    def close(self):
+        if self.driver:
+            try:
+                self.driver.quit()
+            except Exception as e:
+                # Trình duyệt đã crash: vẫn phải nhả profile
+                logging.warning(f"Error closing {self.source_name} driver: {e}")
+            self.driver = None
+        browser_profiles.release(self.profile_dir)
+        self.profile_dir = None
+
+    def detect_block_page(self, driver):
+        """Trả về marker nếu trang hiện tại là trang chặn bot"""
+        text = f"{driver.title} {driver.page_source[:20000]}".lower()
+        return next((marker for marker in BLOCK_PAGE_MARKERS if marker in text), None)
 
-    def make_driver(self, headless=False):
+    def make_driver(self, headless=False, profile_dir=None):
         """Sử dụng webdriver-manager để tự động quản lý driver."""
         options = webdriver.ChromeOptions()
         if headless:
             options.add_argument("--headless=new")
+        if profile_dir:
+            options.add_argument(f"--user-data-dir={os.path.abspath(profile_dir)}")
+        if self.tabs > 1:
+            for argument in MULTI_TAB_CHROME_ARGS:
+                options.add_argument(argument)
         options.add_argument("--no-sandbox")
         options.add_argument("--disable-dev-shm-usage")
         options.add_argument("--disable-gpu")
@@ -53,16 +111,16 @@ class AgodaScraperV2:
     def build_search_url(self, origin, destination, search_date):
         """Xây dựng URL tìm kiếm cho Agoda."""
         dep_dt_str = search_date.strftime("%Y-%m-%d")
-        return (f"https://www.agoda.com/flights/results?departureFrom={origin}&departureFromType=1"
+        return (f"{self.base_url}/results?departureFrom={origin}&departureFromType=1"
                 f"&arrivalTo={destination}&arrivalToType=1&departDate={dep_dt_str}"
                 f"&searchType=1&cabinType=Economy&adults=1&sort=8")
 
-    def wait_and_scroll(self, driver, wait):
+    def wait_and_scroll(self, driver, wait, initial_wait=8):
         """Chờ và scroll với chiến lược tích cực"""
         print("Waiting for page to load and scrolling...")
         
-        # Chờ một chút để trang bắt đầu render
-        time.sleep(8)
+        # Chờ một chút để trang bắt đầu render (tab đã sẵn sàng thì không cần chờ)
+        time.sleep(initial_wait)
         
         # Scroll nhiều lần để load content
         last_height = driver.execute_script("return document.body.scrollHeight")
@@ -251,15 +309,15 @@ class AgodaScraperV2:
             duration_minutes = int((arr_dt - dep_dt).total_seconds() / 60)
             flight_number = f"{airline.split()[0].upper()}-{dep_dt.strftime('%H%M')}"
             
-            return {
-                "flight_code": flight_number,
-                "airline": airline,
-                "departure_time": dep_dt.strftime('%Y-%m-%d %H:%M:%S'),
-                "arrival_time": arr_dt.strftime('%Y-%m-%d %H:%M:%S'),
-                "duration_minutes": duration_minutes,
-                "price": float(price),
-                "stops": 0,
-            }
+            return FlightRecord(
+                flight_code=flight_number,
+                airline=airline,
+                departure_time=dep_dt.strftime('%Y-%m-%d %H:%M:%S'),
+                arrival_time=arr_dt.strftime('%Y-%m-%d %H:%M:%S'),
+                duration_minutes=duration_minutes,
+                price=float(price),
+                source=self.source_name,
+            )
             
         except Exception as e:
             return None
@@ -271,79 +329,152 @@ class AgodaScraperV2:
         
         driver = None
         scraped_flights = []
+        route = f"{origin}-{destination}"
+        self.last_error = None
+
+        replayed = replay_or_none(self.replay, origin, destination, search_date)
+        if replayed is not None:
+            return replayed
 
         try:
-            driver = self.make_driver(headless=False)
+            recycle_if_needed(self)
+            driver = self.driver or self.open_driver()
             url = self.build_search_url(origin, destination, search_date)
             print(f"Opening URL: {url}")
-            driver.get(url)
-
-            wait = WebDriverWait(driver, 60)
-            
-            # Chờ và scroll
-            self.wait_and_scroll(driver, wait)
-            
-            # Debug page structure
-            self.debug_page_structure(driver)
-            
-            # Tìm flight elements động
-            flight_elements = self.find_flight_elements_dynamic(driver)
-            
-            if not flight_elements:
-                print("⚠ No flight elements found with dynamic detection")
-                
-                # Lưu debug files
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                screenshot_path = f"debug_agoda_{origin}_{destination}_{timestamp}.png"
-                driver.save_screenshot(screenshot_path)
-                print(f"Screenshot saved: {screenshot_path}")
-                
-                html_path = f"debug_agoda_{origin}_{destination}_{timestamp}.html"
-                with open(html_path, "w", encoding="utf-8") as f:
-                    f.write(driver.page_source)
-                print(f"HTML saved: {html_path}")
-                
-                return scraped_flights
-            
-            # Parse flights
-            print(f"\nParsing {len(flight_elements)} potential flight containers...")
-            seen_flights = set()
-            
-            for idx, element in enumerate(flight_elements, 1):
-                try:
-                    flight_data = self.parse_flight_from_element(element, search_date)
-                    if flight_data:
-                        # Tránh duplicate
-                        key = f"{flight_data['flight_code']}-{flight_data['price']}"
-                        if key not in seen_flights:
-                            seen_flights.add(key)
-                            
-                            flight_data.update({
-                                "departure_airport": origin,
-                                "arrival_airport": destination,
-                                "currency": "VND",
-                                "source": self.source_name,
-                                "route": f"{origin}-{destination}",
-                            })
-                            scraped_flights.append(flight_data)
-                            print(f"  [{len(scraped_flights)}] ✓ {flight_data['airline']} - {flight_data['departure_time'][11:16]} → {flight_data['arrival_time'][11:16]} - {flight_data['price']:,.0f} VND")
-                except Exception as e:
-                    continue
+            with metrics.timer('navigation', self.source_name, route):
+                driver.get(url)
+            scraped_flights = self.harvest_route(driver, origin, destination, search_date)
+            if self.replay is not None and not self.last_error:
+                self.replay.bootstrap(driver)
 
         except Exception as e:
             print(f"\n❌ Error during scraping: {e}")
             traceback.print_exc()
+            self.last_error = str(e)
+            artifact_writer.capture(driver, self.source_name, route, 'error')
             
         finally:
             if driver:
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                screenshot_path = f"final_agoda_{origin}_{destination}_{timestamp}.png"
-                driver.save_screenshot(screenshot_path)
-                print(f"\nFinal screenshot: {screenshot_path}")
-                driver.quit()
+                # Lỗi giữa chừng thì trình duyệt có thể đã hỏng, route sau mở trình duyệt mới
+                if not self.keep_driver or self.last_error:
+                    self.close()
         
         print(f"\n{'='*60}")
         print(f"✓ Scraping completed: Found {len(scraped_flights)} flights")
         print(f"{'='*60}\n")
         
-        return scraped_flights
\ No newline at end of file
+        return scraped_flights
+
+    def scrape_matrix(self, routes, search_dates, breaker=None, keep_driver=False):
+        """
+        Chế độ nhiều tab: một trình duyệt mở self.tabs lượt tìm kiếm cùng lúc, tab nào có kết quả thì
+        harvest trước. Route bị circuit breaker từ chối thì bỏ qua.
+        """
+        scraped_flights = FlightBatch()
+        jobs = BreakerJobSource(((r, d) for r in routes for d in search_dates), breaker)
+        job = next_available_job(jobs)
+        if job is None:
+            return scraped_flights
+
+        try:
+            results = run_multi_tab(self, job, jobs, self._harvest_job,
+                                    lambda job: self.build_search_url(job[0]['origin'], job[0]['destination'], job[1]))
+            for job, result in results:
+                jobs.complete(job)
+                r, search_date = job
+                route = f"{r['origin']}-{r['destination']}"
+                if isinstance(result, Exception):
+                    print(f"❌ Error scraping {route} on {search_date:%Y-%m-%d}: {result}")
+                    record_route_outcome(breaker, None, str(result).splitlines()[0] if str(result)
+                                         else type(result).__name__)
+                    continue
+                # harvest vừa chạy xong cho đúng job này nên last_error là của job này
+                record_route_outcome(breaker, result, self.last_error)
+                scraped_flights.extend(result)
+        except Exception as e:
+            print(f"\n❌ Error during multi-tab scraping: {e}")
+            traceback.print_exc()
+            self.last_error = str(e)
+            jobs.abandon(e)
+            self.close()
+        finally:
+            if not keep_driver:
+                self.close()
+        if jobs.skipped:
+            print(f"⚠ Skipped {jobs.skipped}/{len(routes) * len(search_dates)} route-dates: circuit {breaker.state}")
+            metrics.inc('routes_skipped', jobs.skipped, source=self.source_name, stage='circuit_breaker')
+        print(f"✓ Multi-tab scraping completed: Found {len(scraped_flights)} flights")
+        return scraped_flights
+
+    def is_results_ready(self, driver):
+        """Tab đã render danh sách chuyến bay (có giờ bay và giá) hoặc đã hiện trang chặn"""
+        return driver.execute_script("""
+            if (document.readyState !== 'complete' || !document.body) return false;
+            const text = document.body.innerText || '';
+            return (/\\d{2}:\\d{2}/.test(text) && /(VND|₫)/.test(text))
+                || /(captcha|access denied|unusual traffic|are you a robot|request blocked)/i.test(text);
+        """)
+
+    def _harvest_job(self, driver, job):
+        r, search_date = job
+        bring_to_front(driver)
+        return self.harvest_route(driver, r['origin'], r['destination'], search_date, initial_wait=0)
+
+    def harvest_route(self, driver, origin, destination, search_date, initial_wait=8):
+        """Kiểm tra trang chặn, scroll và parse trang kết quả đã mở của một route"""
+        scraped_flights = []
+        route = f"{origin}-{destination}"
+        self.last_error = None
+
+        block_marker = self.detect_block_page(driver)
+        if block_marker:
+            self.last_error = f"blocked page ({block_marker})"
+            print(f"⚠ Agoda blocked the request: {block_marker}")
+            metrics.inc('pages_blocked', source=self.source_name, route=route)
+            artifact_writer.capture(driver, self.source_name, route, 'blocked')
+            return scraped_flights
+
+        wait = WebDriverWait(driver, 60)
+        
+        # Chờ và scroll
+        with metrics.timer('scrolling', self.source_name, route):
+            self.wait_and_scroll(driver, wait, initial_wait)
+        metrics.inc('pages_loaded', source=self.source_name, route=route)
+        metrics.inc('bytes_transferred', page_transfer_bytes(driver), source=self.source_name, route=route)
+        
+        # Tìm flight elements động
+        parse_started = time.perf_counter()
+        flight_elements = self.find_flight_elements_dynamic(driver)
+        
+        if not flight_elements:
+            metrics.observe('parsing', time.perf_counter() - parse_started, self.source_name, route)
+            print("⚠ No flight elements found with dynamic detection")
+            # Phân tích cấu trúc trang tốn nhiều lệnh WebDriver, chỉ chạy khi policy có lưu artifact
+            if artifact_writer.capture(driver, self.source_name, route, 'no_flights'):
+                self.debug_page_structure(driver)
+            return scraped_flights
+        
+        # Parse flights
+        print(f"\nParsing {len(flight_elements)} potential flight containers...")
+        metrics.inc('cards_parsed', len(flight_elements), source=self.source_name, route=route)
+        seen_flights = set()
+        
+        for idx, element in enumerate(flight_elements, 1):
+            try:
+                flight_data = self.parse_flight_from_element(element, search_date)
+                if flight_data:
+                    # Tránh duplicate
+                    key = f"{flight_data.flight_code}-{flight_data.price}"
+                    if key not in seen_flights:
+                        seen_flights.add(key)
+                        
+                        flight_data.departure_airport = origin
+                        flight_data.arrival_airport = destination
+                        flight_data.route = route
+                        scraped_flights.append(flight_data)
+                        print(f"  [{len(scraped_flights)}] ✓ {flight_data.airline} - {flight_data.departure_time[11:16]} → {flight_data.arrival_time[11:16]} - {flight_data.price:,.0f} VND")
+            except Exception as e:
+                continue
+        metrics.observe('parsing', time.perf_counter() - parse_started, self.source_name, route)
+        artifact_writer.capture(driver, self.source_name, route, 'sample', failed=False)
+        return scraped_flights
@@ -0,0 +1,230 @@
+import logging
+import os
+import time
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from ..config.config_manager import ConfigManager
+from ..model.FlightBatch import FlightBatch
+from ..model.FlightRecord import FlightRecord
+from ..monitoring.metrics import metrics
+from .FieldParsers import parse_datetime, parse_duration, parse_price
+
+logger = logging.getLogger(__name__)
+
+# Chế độ lai: route đầu tiên chạy bằng trình duyệt để lấy cookie/token, các route sau gọi thẳng API tìm kiếm
+API_REPLAY = os.getenv('API_REPLAY', '0') == '1'
+# Quá thời gian này thì lấy lại cookie bằng trình duyệt dù API chưa báo hết hạn
+REPLAY_TOKEN_TTL = float(os.getenv('REPLAY_TOKEN_TTL', 900))
+REPLAY_POOL_SIZE = int(os.getenv('REPLAY_POOL_SIZE', 10))
+REPLAY_TIMEOUT = float(os.getenv('REPLAY_TIMEOUT', 30))
+# Status trả về khi cookie/token hết hạn hoặc bị chặn
+DEFAULT_EXPIRED_STATUS = (401, 403, 419, 440)
+
+# Hàm được phép dùng trong "extractors" của provider_configs.json
+EXTRACTOR_BUILTINS = {'len': len, 'str': str, 'int': int, 'float': float, 'round': round, 'min': min, 'max': max}
+
+
+class ReplayExpired(Exception):
+    """Cookie/token không còn dùng được, cần chạy lại route bằng trình duyệt"""
+
+
+def resolve_path(raw: Any, path: str) -> Any:
+    """'priceDetail.total' -> raw['priceDetail']['total']; '.length' của list là số phần tử"""
+    value = raw
+    for part in path.split('.'):
+        if isinstance(value, dict):
+            value = value.get(part)
+        elif isinstance(value, list) and part == 'length':
+            value = len(value)
+        elif isinstance(value, list) and part.isdigit() and int(part) < len(value):
+            value = value[int(part)]
+        else:
+            return None
+        if value is None:
+            return None
+    return value
+
+
+class ResponseMapper:
+    """
+    Map một kết quả JSON của API sang FlightRecord theo mapping_config trong provider_configs.json:
+    mỗi field là một path hoặc danh sách path (lấy path đầu tiên có giá trị),
+    "extractors" (lambda dạng chuỗi) được ưu tiên khi trả về giá trị khác rỗng.
+    """
+
+    def __init__(self, mapping_config: Dict[str, Any], extractors: Dict[str, str] = None):
+        self.paths = {field: [paths] if isinstance(paths, str) else list(paths)
+                      for field, paths in mapping_config.items()}
+        self.extractors = {field: eval(expr, {'__builtins__': EXTRACTOR_BUILTINS})
+                           for field, expr in (extractors or {}).items()}
+
+    def map(self, raw: Dict[str, Any]) -> Dict[str, Any]:
+        mapped = {}
+        for field in set(self.paths) | set(self.extractors):
+            value = None
+            if field in self.extractors:
+                try:
+                    value = self.extractors[field](raw)
+                except Exception:
+                    value = None
+            if value is None or value == '':
+                value = next((v for v in (resolve_path(raw, p) for p in self.paths.get(field, ()))
+                              if v is not None and v != ''), None)
+            mapped[field] = value
+        return mapped
+
+    def to_flight(self, raw: Dict[str, Any], source: str, search_date: datetime) -> FlightRecord:
+        mapped = self.map(raw)
+        flight_date = parse_datetime(mapped.get('flight_date'), search_date) or search_date
+        flight_date = flight_date.replace(hour=0, minute=0, second=0, microsecond=0)
+        dep_dt = parse_datetime(mapped.get('departure_time'), flight_date)
+        arr_dt = parse_datetime(mapped.get('arrival_time'), flight_date)
+        duration = parse_duration(mapped.get('duration'))
+        if duration is None and dep_dt and arr_dt:
+            duration = int((arr_dt - dep_dt).total_seconds() / 60)
+        stops = mapped.get('stops')
+        return FlightRecord(
+            flight_code=mapped.get('flight_number'),
+            airline=mapped.get('airline'),
+            departure_airport=mapped.get('departure_airport'),
+            arrival_airport=mapped.get('arrival_airport'),
+            departure_time=dep_dt.strftime('%Y-%m-%d %H:%M:%S') if dep_dt else None,
+            arrival_time=arr_dt.strftime('%Y-%m-%d %H:%M:%S') if arr_dt else None,
+            duration_minutes=duration,
+            price=parse_price(mapped.get('price')),
+            currency=mapped.get('currency') or 'VND',
+            source=source,
+            stops=max(0, int(stops)) if isinstance(stops, (int, float)) else 0,
+            aircraft_type=mapped.get('aircraft_type') or '',
+            baggage_info=mapped.get('baggage_info') or '',
+            meal_info=mapped.get('meal_info') or '',
+            seat_class=mapped.get('seat_class') or '',
+            booking_url=mapped.get('booking_url') or '',
+        )
+
+
+def provider_key(source_name: str) -> str:
+    """'Traveloka.com' -> 'traveloka' (key trong provider_configs.json)"""
+    return source_name.split('.')[0].lower()
+
+
+def _fill(template, values: Dict[str, Any]):
+    """Điền {origin}, {destination}, {date:%d-%m-%Y}, {base_url} vào URL/params/body của request"""
+    if isinstance(template, str):
+        return template.format(**values)
+    if isinstance(template, dict):
+        return {key: _fill(value, values) for key, value in template.items()}
+    if isinstance(template, list):
+        return [_fill(value, values) for value in template]
+    return template
+
+
+class ApiReplayClient:
+    """
+    Gọi thẳng API tìm kiếm (JSON) của provider bằng requests.Session có connection pool,
+    dùng cookie và user agent copy từ trình duyệt sau một lượt tìm kiếm thật (bootstrap).
+    search() raise ReplayExpired khi cookie/token hết hạn, scraper chạy lại route đó bằng trình duyệt.
+    """
+
+    def __init__(self, source_name: str, base_url: str, replay_config: Dict[str, Any], mapper: ResponseMapper,
+                 token_ttl: float = REPLAY_TOKEN_TTL, pool_size: int = REPLAY_POOL_SIZE):
+        self.source_name = source_name
+        self.base_url = base_url
+        self.config = replay_config
+        self.mapper = mapper
+        self.token_ttl = token_ttl
+        self.expired_status = set(replay_config.get('expired_status', DEFAULT_EXPIRED_STATUS))
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers.update(replay_config.get('headers', {}))
+        self.bootstrapped_at = None
+
+    @classmethod
+    def for_source(cls, source_name: str, base_url: str) -> Optional['ApiReplayClient']:
+        """Client của source nếu bật API_REPLAY và provider có mục "replay" + "mapping_config", ngược lại None"""
+        if not API_REPLAY:
+            return None
+        config = ConfigManager().get_config(provider_key(source_name)) or {}
+        if not config.get('replay') or not config.get('mapping_config'):
+            return None
+        mapper = ResponseMapper(config['mapping_config'], config.get('extractors'))
+        return cls(source_name, base_url, config['replay'], mapper)
+
+    @property
+    def ready(self) -> bool:
+        return self.bootstrapped_at is not None and time.monotonic() - self.bootstrapped_at < self.token_ttl
+
+    def bootstrap(self, driver):
+        """Copy cookie và user agent của trình duyệt vừa tải xong trang kết quả"""
+        self.session.cookies.clear()
+        for cookie in driver.get_cookies():
+            self.session.cookies.set(cookie['name'], cookie['value'], domain=cookie.get('domain') or '',
+                                     path=cookie.get('path') or '/')
+        try:
+            self.session.headers['User-Agent'] = driver.execute_script("return navigator.userAgent")
+        except Exception:
+            pass
+        self.bootstrapped_at = time.monotonic()
+        logger.info(f"{self.source_name} API replay bootstrapped with {len(self.session.cookies)} cookies")
+
+    def invalidate(self):
+        self.bootstrapped_at = None
+
+    def search(self, origin: str, destination: str, search_date: datetime) -> FlightBatch:
+        route = f"{origin}-{destination}"
+        values = {'origin': origin, 'destination': destination, 'date': search_date, 'base_url': self.base_url}
+        with metrics.timer('api_replay', self.source_name, route):
+            response = self.session.request(
+                self.config.get('method', 'GET'),
+                _fill(self.config['search_url'], values),
+                params=_fill(self.config.get('params'), values),
+                json=_fill(self.config.get('json'), values),
+                timeout=REPLAY_TIMEOUT,
+            )
+            if response.status_code in self.expired_status:
+                self.invalidate()
+                raise ReplayExpired(f"HTTP {response.status_code}")
+            response.raise_for_status()
+            try:
+                payload = response.json()
+            except ValueError:
+                # Trang HTML (đăng nhập, captcha) thay vì JSON
+                self.invalidate()
+                raise ReplayExpired("non-JSON response")
+            results_path = self.config.get('results_path')
+            results = resolve_path(payload, results_path) if results_path else payload
+        metrics.inc('replay_requests', source=self.source_name, route=route, stage='api_replay')
+        metrics.inc('bytes_transferred', len(response.content), source=self.source_name, route=route)
+
+        flights = FlightBatch()
+        for raw in results or []:
+            flight = self.mapper.to_flight(raw, self.source_name, search_date)
+            flight.departure_airport = flight.departure_airport or origin
+            flight.arrival_airport = flight.arrival_airport or destination
+            flight.route = route
+            flights.append(flight)
+        metrics.inc('cards_parsed', len(flights), source=self.source_name, route=route)
+        return flights
+
+    def close(self):
+        self.session.close()
+
+
+def replay_or_none(client: Optional[ApiReplayClient], origin: str, destination: str,
+                   search_date: datetime) -> Optional[FlightBatch]:
+    """Kết quả qua API nếu client sẵn sàng, None khi cần chạy bằng trình duyệt (chưa bootstrap/hết hạn)"""
+    if client is None or not client.ready:
+        return None
+    try:
+        return client.search(origin, destination, search_date)
+    except (ReplayExpired, requests.RequestException) as e:
+        logger.warning(f"{client.source_name} API replay failed ({e}), falling back to the browser")
+        metrics.inc('replay_fallbacks', source=client.source_name, route=f"{origin}-{destination}",
+                    stage='api_replay')
+        return None
@@ -8,12 +8,21 @@ import logging
 import re
 from datetime import datetime, timedelta
 import json
+from ..monitoring.metrics import metrics
+from ..model.FlightRecord import FlightRecord
 
 class BookingApiScraper:
-    def __init__(self):
-        self.source_name = "Booking.com"
-        self.base_url = "https://flights.booking.com/api/flights/"
+    def __init__(self, source_name="Booking.com", base_url="https://flights.booking.com/api/flights/"):
+        self.source_name = source_name
+        self.base_url = base_url
         self.user_agent = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120 Safari/537.36"
+        # Lỗi gần nhất (HTTP status, exception), dùng cho circuit breaker khi route không có kết quả
+        self.last_error = None
+        # Giữ kết nối keep-alive và cookie giữa các route/ngày của cùng một lần chạy
+        self.session = requests.Session()
+
+    def close(self):
+        self.session.close()
         
     def fetch_json(self, url: str, retries: int = 3, backoff: float = 2.0, timeout: float = 30.0):
         """Fetch JSON data từ API với retry logic"""
@@ -25,13 +34,26 @@ class BookingApiScraper:
         for attempt in range(retries):
             try:
                 logging.info(f"Requesting Booking API (try {attempt+1}): {url}")
-                resp = requests.get(url, headers=headers, timeout=timeout)
+                with metrics.timer('navigation', self.source_name):
+                    resp = self.session.get(url, headers=headers, timeout=timeout)
+                metrics.inc('bytes_transferred', len(resp.content), source=self.source_name)
                 if resp.status_code == 200:
+                    metrics.inc('pages_loaded', source=self.source_name)
                     return resp.json()
+                elif resp.status_code == 429:
+                    # Bị rate limit: chờ theo Retry-After nếu server trả về
+                    retry_after = resp.headers.get("Retry-After", "")
+                    logging.warning(f"HTTP 429 rate limited, Retry-After={retry_after or 'n/a'}")
+                    self.last_error = "HTTP 429"
+                    if retry_after.isdigit():
+                        time.sleep(int(retry_after))
+                        continue
                 else:
                     logging.warning(f"HTTP {resp.status_code}: {resp.text[:200]}")
+                    self.last_error = f"HTTP {resp.status_code}"
             except Exception as e:
                 logging.error(f"Error fetching Booking API: {e}")
+                self.last_error = f"request error: {e}"
             time.sleep(backoff * (2**attempt) + random.random())
         return None
 
@@ -114,26 +136,26 @@ class BookingApiScraper:
                         except:
                             pass
 
+                        # totalTime của Booking tính bằng giây
+                        total_time = leg.get("totalTime")
+                        duration = int(total_time) // 60 if total_time not in (None, "") else None
+
                         # Tạo flight data
-                        flight_data = {
-                            "flight_code": f"{airline_code}{flight_number}",
-                            "airline": airline_name or airline_code,
-                            "departure_airport": dep_airport,
-                            "arrival_airport": arr_airport,
-                            "departure_time": departure_dt.strftime('%Y-%m-%d %H:%M:%S') if departure_dt else "",
-                            "arrival_time": arrival_dt.strftime('%Y-%m-%d %H:%M:%S') if arrival_dt else "",
-                            "duration_minutes": leg.get("totalTime", ""),
-                            "price": price,
-                            "currency": currency,
-                            "source": self.source_name,
-                            "route": f"{dep_airport}-{arr_airport}",
-                            "stops": leg.get("stops", 0),
-                            "aircraft_type": "",
-                            "baggage_info": "",
-                            "meal_info": "",
-                            "seat_class": "ECONOMY",
-                            "booking_url": ""
-                        }
+                        flight_data = FlightRecord(
+                            flight_code=f"{airline_code}{flight_number}",
+                            airline=airline_name or airline_code,
+                            departure_airport=dep_airport,
+                            arrival_airport=arr_airport,
+                            departure_time=departure_dt.strftime('%Y-%m-%d %H:%M:%S') if departure_dt else "",
+                            arrival_time=arrival_dt.strftime('%Y-%m-%d %H:%M:%S') if arrival_dt else "",
+                            duration_minutes=duration,
+                            price=price,
+                            currency=currency,
+                            source=self.source_name,
+                            route=f"{dep_airport}-{arr_airport}",
+                            stops=leg.get("stops", 0),
+                            seat_class="ECONOMY",
+                        )
                         
                         flights.append(flight_data)
                         
@@ -144,7 +166,7 @@ class BookingApiScraper:
         return flights
 
     def scrape_flights(self, origin, destination, search_date):
-
+        self.last_error = None
         try:
             # Try multiple sort modes to increase coverage
             flights = []
@@ -155,20 +177,27 @@ class BookingApiScraper:
                 logging.info(f"Booking API URL: {url}")
                 data = self.fetch_json(url)
                 if not data:
+                    if self.last_error:
+                        # Đã hết lượt retry (bị chặn/lỗi HTTP), các sort mode còn lại cũng sẽ lỗi
+                        break
                     continue
-                flights.extend(self.parse_booking_data(data))
+                with metrics.timer('parsing', self.source_name, f"{origin}-{destination}"):
+                    parsed = self.parse_booking_data(data)
+                metrics.inc('cards_parsed', len(parsed), source=self.source_name, route=f"{origin}-{destination}")
+                flights.extend(parsed)
             # Deduplicate by flight_code + departure_time
             dedup = {}
             for f in flights:
-                key = (f.get("flight_code"), f.get("departure_time"))
+                key = (f.flight_code, f.departure_time)
                 dedup[key] = f
             flights = list(dedup.values())
             
             # Log results
             for flight in flights:
-                print(f"  -> {flight['airline']} | {flight['price']} {flight['currency']} | {flight['departure_time']}")
+                print(f"  -> {flight.airline} | {flight.price} {flight.currency} | {flight.departure_time}")
                 
             return flights
             
         except Exception as e:
+            self.last_error = str(e)
             return []
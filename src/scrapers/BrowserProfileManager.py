@@ -0,0 +1,156 @@
+import logging
+import os
+import shutil
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+from ..monitoring.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+BROWSER_PROFILE_ROOT = os.getenv('BROWSER_PROFILE_ROOT', os.path.join("data", "browser_profiles"))
+# Số profile (slot) cho mỗi source, bằng số trình duyệt của source có thể chạy cùng lúc trên máy
+BROWSER_PROFILE_SLOTS = int(os.getenv('BROWSER_PROFILE_SLOTS', 2))
+BROWSER_PROFILE_MAX_MB = int(os.getenv('BROWSER_PROFILE_MAX_MB', 500))
+BROWSER_PROFILE_MAX_AGE_DAYS = float(os.getenv('BROWSER_PROFILE_MAX_AGE_DAYS', 7))
+
+LOCK_SUFFIX = ".lock"
+CREATED_MARKER = ".created"
+# File khóa của chính Chrome, còn sót lại khi trình duyệt bị kill
+CHROME_SINGLETON_FILES = ('SingletonLock', 'SingletonSocket', 'SingletonCookie')
+
+
+class BrowserProfileManager:
+    """
+    Quản lý thư mục user-data-dir của Chrome theo source và slot (data/browser_profiles/<source>/slot-<n>)
+    để cookie, local storage và HTTP cache được giữ lại giữa các lần chạy.
+    - Mỗi slot chỉ một trình duyệt dùng tại một thời điểm, khóa bằng file <slot>.lock (pid@host).
+    - Profile cũ hơn max_age_days hoặc lớn hơn max_size_mb bị xóa khi lấy ra, trình duyệt bắt đầu lại từ profile trống.
+    """
+
+    def __init__(self, root: str = BROWSER_PROFILE_ROOT, slots: int = BROWSER_PROFILE_SLOTS,
+                 max_size_mb: int = BROWSER_PROFILE_MAX_MB, max_age_days: float = BROWSER_PROFILE_MAX_AGE_DAYS):
+        self.root = root
+        self.slots = max(1, slots)
+        self.max_size_bytes = max_size_mb * 1024 * 1024
+        self.max_age_seconds = max_age_days * 86400
+        self._lock = threading.Lock()
+
+    def acquire(self, source: str) -> Optional[str]:
+        """Khóa một slot trống của source và trả về đường dẫn profile, None nếu mọi slot đang được dùng"""
+        source_dir = os.path.join(self.root, _safe_name(source))
+        os.makedirs(source_dir, exist_ok=True)
+        with self._lock:
+            for slot in range(self.slots):
+                profile_dir = os.path.join(source_dir, f"slot-{slot}")
+                if not self._try_lock(profile_dir):
+                    continue
+                try:
+                    warm = self._prepare(profile_dir)
+                except OSError as e:
+                    logger.error(f"Cannot prepare browser profile {profile_dir}: {e}")
+                    self._unlock(profile_dir)
+                    continue
+                # So sánh navigation/bytes_transferred giữa lần khởi động với profile trống và profile đã có cache
+                metrics.inc('browser_starts', source=source, stage='warm_profile' if warm else 'cold_profile')
+                return profile_dir
+        logger.warning(f"All {self.slots} browser profiles of {source} are in use, using a temporary profile")
+        return None
+
+    def release(self, profile_dir: Optional[str]):
+        if profile_dir:
+            with self._lock:
+                self._unlock(profile_dir)
+
+    @contextmanager
+    def profile(self, source: str):
+        profile_dir = self.acquire(source)
+        try:
+            yield profile_dir
+        finally:
+            self.release(profile_dir)
+
+    def _try_lock(self, profile_dir: str) -> bool:
+        lock_path = profile_dir + LOCK_SUFFIX
+        owner = f"{os.getpid()}@{socket.gethostname()}"
+        for _ in range(2):
+            try:
+                fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                if not _is_stale_lock(lock_path):
+                    return False
+                logger.info(f"Removing stale browser profile lock {lock_path}")
+                _remove(lock_path)
+                continue
+            with os.fdopen(fd, 'w') as f:
+                f.write(owner)
+            return True
+        return False
+
+    def _unlock(self, profile_dir: str):
+        _remove(profile_dir + LOCK_SUFFIX)
+
+    def _prepare(self, profile_dir: str) -> bool:
+        """Xoay vòng profile quá cũ/quá lớn, dọn file khóa Chrome còn sót; True nếu profile đã có dữ liệu"""
+        marker = os.path.join(profile_dir, CREATED_MARKER)
+        if os.path.isdir(profile_dir):
+            created = os.path.getmtime(marker) if os.path.exists(marker) else 0.0
+            age = time.time() - created
+            size = _dir_size(profile_dir)
+            if age > self.max_age_seconds or size > self.max_size_bytes:
+                logger.info(f"Rotating browser profile {profile_dir} "
+                            f"({age / 86400:.1f} days, {size / 1024 / 1024:.0f}MB)")
+                shutil.rmtree(profile_dir, ignore_errors=True)
+        warm = os.path.isdir(profile_dir)
+        if not warm:
+            os.makedirs(profile_dir)
+            open(marker, 'w').close()
+        for name in CHROME_SINGLETON_FILES:
+            _remove(os.path.join(profile_dir, name))
+        return warm
+
+
+def _safe_name(source: str) -> str:
+    return "".join(c if c.isalnum() or c in '.-_' else '_' for c in source)
+
+
+def _dir_size(path: str) -> int:
+    total = 0
+    for folder, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.lstat(os.path.join(folder, name)).st_size
+            except OSError:
+                continue
+    return total
+
+
+def _is_stale_lock(lock_path: str) -> bool:
+    """Lock của process đã chết trên cùng máy là lock cũ; lock của máy khác (thư mục dùng chung) được giữ nguyên"""
+    try:
+        with open(lock_path) as f:
+            pid, _, host = f.read().strip().partition('@')
+    except OSError:
+        return False
+    if host != socket.gethostname() or not pid.isdigit():
+        return False
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return True
+    except PermissionError:
+        return False
+    return False
+
+
+def _remove(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+browser_profiles = BrowserProfileManager()
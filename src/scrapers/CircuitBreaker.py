@@ -0,0 +1,153 @@
+import logging
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from ..monitoring.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+STATE_CLOSED = 'closed'
+STATE_OPEN = 'open'
+STATE_HALF_OPEN = 'half_open'
+
+# Số route thất bại liên tiếp (rỗng, bị chặn, lỗi HTTP) trước khi ngắt source
+BREAKER_FAILURE_THRESHOLD = int(os.getenv('BREAKER_FAILURE_THRESHOLD', 3))
+BREAKER_COOLDOWN_SECONDS = float(os.getenv('BREAKER_COOLDOWN_SECONDS', 1800))
+# Probe thất bại thì cooldown tăng gấp đôi, tối đa giá trị này
+BREAKER_MAX_COOLDOWN_SECONDS = float(os.getenv('BREAKER_MAX_COOLDOWN_SECONDS', 4 * 3600))
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker cho một source:
+    - closed: scrape bình thường, đếm số route thất bại liên tiếp, đủ ngưỡng thì chuyển open.
+    - open: từ chối mọi route cho đến hết cooldown.
+    - half_open: cho đúng một route chạy thử; thành công thì closed, thất bại thì open lại với cooldown gấp đôi.
+    """
+
+    def __init__(self, source: str, failure_threshold: int = BREAKER_FAILURE_THRESHOLD,
+                 cooldown_seconds: float = BREAKER_COOLDOWN_SECONDS,
+                 max_cooldown_seconds: float = BREAKER_MAX_COOLDOWN_SECONDS, clock=time.monotonic):
+        self.source = source
+        self.failure_threshold = max(1, failure_threshold)
+        self.base_cooldown = cooldown_seconds
+        self.max_cooldown = max(cooldown_seconds, max_cooldown_seconds)
+        self.clock = clock
+
+        self.state = STATE_CLOSED
+        self.failures = 0
+        self.cooldown = cooldown_seconds
+        self.opened_at = 0.0
+        self.probe_in_flight = False
+        self.last_reason: Optional[str] = None
+        self.transitions: List[Tuple[float, str, str, str]] = []
+        self._lock = threading.Lock()
+
+    def allow_request(self) -> bool:
+        """Gọi trước mỗi route; ở half_open chỉ route đầu tiên được chạy (probe)"""
+        with self._lock:
+            if self.state == STATE_CLOSED:
+                return True
+            if self.state == STATE_OPEN:
+                if self.clock() - self.opened_at < self.cooldown:
+                    return False
+                self._transition(STATE_HALF_OPEN, "cooldown elapsed, probing one route")
+            if self.probe_in_flight:
+                return False
+            self.probe_in_flight = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.probe_in_flight = False
+            if self.state != STATE_CLOSED:
+                self.cooldown = self.base_cooldown
+                self._transition(STATE_CLOSED, "probe succeeded")
+
+    def record_failure(self, reason: str):
+        with self._lock:
+            self.failures += 1
+            self.last_reason = reason
+            if self.state == STATE_HALF_OPEN:
+                self.probe_in_flight = False
+                self.cooldown = min(self.cooldown * 2, self.max_cooldown)
+                self._open(f"probe failed: {reason}")
+            elif self.state == STATE_CLOSED and self.failures >= self.failure_threshold:
+                self._open(f"{self.failures} consecutive failures, last: {reason}")
+
+    def skip_reason(self) -> Optional[str]:
+        """Lý do bỏ qua source (không chiếm lượt probe), None nếu source có thể chạy"""
+        with self._lock:
+            if self.state == STATE_OPEN and self.clock() - self.opened_at < self.cooldown:
+                remaining = self.cooldown - (self.clock() - self.opened_at)
+                return f"circuit open for {self.source} ({remaining:.0f}s left, {self.last_reason})"
+            if self.state == STATE_HALF_OPEN and self.probe_in_flight:
+                return f"circuit half-open for {self.source}, probe in progress"
+        return None
+
+    def _open(self, reason: str):
+        self.opened_at = self.clock()
+        self._transition(STATE_OPEN, f"{reason}; cooldown {self.cooldown:.0f}s")
+
+    def _transition(self, state: str, reason: str):
+        previous, self.state = self.state, state
+        self.transitions.append((time.time(), previous, state, reason))
+        message = f"Circuit breaker {self.source}: {previous} -> {state} ({reason})"
+        if state == STATE_OPEN:
+            logger.warning(message)
+        else:
+            logger.info(message)
+        metrics.inc('breaker_transitions', source=self.source, stage=f"breaker:{state}")
+        _record_transition(state, message, self.source)
+
+
+def _record_transition(state: str, message: str, source: str):
+    """Ghi chuyển trạng thái vào bảng logs qua log sink (nếu đang chạy), không mở connection mới"""
+    try:
+        from ..config.log_sink import get_log_sink
+        sink = get_log_sink()
+    except Exception:
+        return
+    if sink is not None:
+        sink.submit('WARNING' if state == STATE_OPEN else 'INFO', message, source)
+
+
+def record_route_outcome(breaker: Optional[CircuitBreaker], flights, error: Optional[str] = None):
+    """Route có chuyến bay là thành công; rỗng, bị chặn hay lỗi HTTP đều tính là thất bại"""
+    if breaker is None:
+        return
+    if flights:
+        breaker.record_success()
+    else:
+        breaker.record_failure(error or "empty result")
+
+
+class CircuitBreakerRegistry:
+    """Một breaker cho mỗi source, dùng chung trong process (scheduler, worker, ScraperManager)"""
+
+    def __init__(self):
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+    def get(self, source: str) -> CircuitBreaker:
+        with self._lock:
+            breaker = self._breakers.get(source)
+            if breaker is None:
+                breaker = self._breakers[source] = CircuitBreaker(source)
+            return breaker
+
+    def skip_reason(self, source: Optional[str]) -> Optional[str]:
+        return self.get(source).skip_reason() if source else None
+
+    def available_sources(self, sources) -> List[str]:
+        return [s for s in sources if not self.skip_reason(s)]
+
+    def states(self) -> Dict[str, str]:
+        with self._lock:
+            return {source: breaker.state for source, breaker in self._breakers.items()}
+
+
+circuit_breakers = CircuitBreakerRegistry()
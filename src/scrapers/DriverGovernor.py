@@ -0,0 +1,176 @@
+import logging
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+from ..monitoring.metrics import metrics
+
+try:
+    import psutil
+except ImportError:  # psutil là dependency tùy chọn, thiếu thì governor không giới hạn gì
+    psutil = None
+
+logger = logging.getLogger(__name__)
+
+# Tổng RSS của chromedriver + Chrome (mọi process con) vượt ngưỡng thì mở trình duyệt mới giữa 2 route
+DRIVER_MAX_RSS_MB = int(os.getenv('DRIVER_MAX_RSS_MB', 1500))
+# Dưới mức RAM trống này thì recycle trình duyệt và chờ trước khi mở trình duyệt mới
+HOST_MIN_FREE_MB = int(os.getenv('HOST_MIN_FREE_MB', 1024))
+HOST_MAX_CPU_PERCENT = float(os.getenv('HOST_MAX_CPU_PERCENT', 90))
+# Máy thiếu RAM chỉ recycle trình duyệt chiếm ít nhất tỉ lệ này của RAM đang dùng (đóng trình duyệt nhỏ không giải
+# phóng được gì), và mỗi source tối đa một lần trong HOST_RECYCLE_MIN_INTERVAL giây
+HOST_PRESSURE_MIN_SHARE = float(os.getenv('HOST_PRESSURE_MIN_SHARE', 0.25))
+HOST_RECYCLE_MIN_INTERVAL = float(os.getenv('HOST_RECYCLE_MIN_INTERVAL', 900))
+# RAM ước tính cho một trình duyệt, dùng để tính số trình duyệt chạy song song
+BROWSER_MEMORY_ESTIMATE_MB = int(os.getenv('BROWSER_MEMORY_ESTIMATE_MB', 800))
+THROTTLE_MAX_WAIT_SECONDS = float(os.getenv('THROTTLE_MAX_WAIT_SECONDS', 300))
+THROTTLE_POLL_SECONDS = 5.0
+
+MB = 1024 * 1024
+
+
+def driver_rss_bytes(driver) -> Optional[int]:
+    """RSS của chromedriver và toàn bộ process Chrome con, None nếu không đo được"""
+    if psutil is None:
+        return None
+    try:
+        root = psutil.Process(driver.service.process.pid)
+        processes = [root] + root.children(recursive=True)
+    except (AttributeError, psutil.Error):
+        return None
+    total = 0
+    for process in processes:
+        try:
+            total += process.memory_info().rss
+        except psutil.Error:
+            continue
+    return total
+
+
+def driver_is_alive(driver) -> bool:
+    try:
+        driver.current_window_handle
+        return True
+    except Exception:
+        return False
+
+
+class DriverGovernor:
+    """
+    Theo dõi RAM của từng trình duyệt và RAM/CPU của máy:
+    - should_recycle(): giữa 2 route, trình duyệt quá ngưỡng RSS thì đóng và mở lại; máy sắp hết RAM thì chỉ
+      recycle khi trình duyệt chiếm phần đáng kể RAM đang dùng, có giới hạn tần suất theo source.
+    - wait_for_capacity(): trước khi mở trình duyệt mới, chờ khi máy thiếu RAM hoặc CPU quá tải.
+    - recommended_browsers(): số trình duyệt chạy song song vừa với tài nguyên hiện có.
+    """
+
+    def __init__(self, max_rss_mb: int = DRIVER_MAX_RSS_MB, min_free_mb: int = HOST_MIN_FREE_MB,
+                 max_cpu_percent: float = HOST_MAX_CPU_PERCENT, browser_memory_mb: int = BROWSER_MEMORY_ESTIMATE_MB,
+                 max_wait_seconds: float = THROTTLE_MAX_WAIT_SECONDS, poll_seconds: float = THROTTLE_POLL_SECONDS,
+                 pressure_min_share: float = HOST_PRESSURE_MIN_SHARE,
+                 host_recycle_interval: float = HOST_RECYCLE_MIN_INTERVAL):
+        self.max_rss_bytes = max_rss_mb * MB
+        self.min_free_bytes = min_free_mb * MB
+        self.max_cpu_percent = max_cpu_percent
+        self.browser_memory_bytes = browser_memory_mb * MB
+        self.max_wait_seconds = max_wait_seconds
+        self.poll_seconds = poll_seconds
+        self.pressure_min_share = pressure_min_share
+        self.host_recycle_interval = host_recycle_interval
+        self._host_recycles: Dict[Optional[str], float] = {}
+        self._lock = threading.Lock()
+        if psutil is not None:
+            # Lần gọi đầu của cpu_percent(None) luôn trả về 0, gọi trước để có mốc
+            psutil.cpu_percent(interval=None)
+
+    def available_memory(self) -> Optional[int]:
+        return psutil.virtual_memory().available if psutil is not None else None
+
+    def should_recycle(self, driver, source: str = None) -> Optional[str]:
+        """Lý do cần mở lại trình duyệt, None nếu vẫn dùng tiếp được"""
+        if driver is None or psutil is None:
+            return None
+        rss = driver_rss_bytes(driver)
+        reason = None
+        if rss is not None and rss > self.max_rss_bytes:
+            reason = f"driver RSS {rss / MB:.0f}MB > {self.max_rss_bytes / MB:.0f}MB"
+        else:
+            reason = self._host_pressure_reason(rss, source)
+        if reason:
+            logger.warning(f"Recycling {source or 'browser'} driver: {reason}")
+            metrics.inc('drivers_recycled', source=source, stage='driver_governor')
+        return reason
+
+    def _host_pressure_reason(self, rss: Optional[int], source: str = None) -> Optional[str]:
+        memory = psutil.virtual_memory()
+        if memory.available >= self.min_free_bytes:
+            return None
+        used = memory.total - memory.available
+        if rss is None or rss < used * self.pressure_min_share:
+            # RAM bị process khác chiếm, đóng trình duyệt này không đỡ được: dùng tiếp
+            return None
+        now = time.monotonic()
+        with self._lock:
+            last = self._host_recycles.get(source)
+            if last is not None and now - last < self.host_recycle_interval:
+                return None
+            self._host_recycles[source] = now
+        return (f"host free memory {memory.available / MB:.0f}MB < {self.min_free_bytes / MB:.0f}MB, "
+                f"driver uses {rss / MB:.0f}MB of {used / MB:.0f}MB in use")
+
+    def wait_for_capacity(self, source: str = None) -> float:
+        """Chờ đến khi máy đủ RAM/CPU để mở thêm trình duyệt (tối đa max_wait_seconds), trả về số giây đã chờ"""
+        if psutil is None:
+            return 0.0
+        started = time.monotonic()
+        throttled = False
+        while True:
+            reason = self._overload_reason()
+            waited = time.monotonic() - started
+            if not reason:
+                return waited
+            if waited >= self.max_wait_seconds:
+                logger.warning(f"Starting {source or 'browser'} anyway after waiting {waited:.0f}s: {reason}")
+                return waited
+            if not throttled:
+                throttled = True
+                logger.warning(f"Throttling {source or 'browser'} start: {reason}")
+                metrics.inc('browser_throttled', source=source, stage='driver_governor')
+            time.sleep(self.poll_seconds)
+
+    def _overload_reason(self) -> Optional[str]:
+        available = self.available_memory()
+        if available < self.min_free_bytes + self.browser_memory_bytes:
+            return f"free memory {available / MB:.0f}MB"
+        cpu = psutil.cpu_percent(interval=None)
+        if cpu > self.max_cpu_percent:
+            return f"CPU {cpu:.0f}%"
+        return None
+
+    def recommended_browsers(self, max_browsers: int) -> int:
+        """Số trình duyệt đồng thời theo RAM trống và số CPU, trong khoảng [1, max_browsers]"""
+        if psutil is None:
+            return max(1, max_browsers)
+        by_memory = int((self.available_memory() - self.min_free_bytes) // self.browser_memory_bytes)
+        by_cpu = psutil.cpu_count() or 1
+        browsers = max(1, min(max_browsers, by_memory, by_cpu))
+        if browsers < max_browsers:
+            logger.info(f"Limiting concurrent browsers to {browsers} (requested {max_browsers}): "
+                        f"{self.available_memory() / MB:.0f}MB free, {by_cpu} CPUs")
+        return browsers
+
+
+driver_governor = DriverGovernor()
+
+
+def recycle_if_needed(scraper):
+    """Giữa 2 route: đóng trình duyệt của scraper nếu đã chết hoặc quá ngưỡng, route sau sẽ mở trình duyệt mới"""
+    if scraper.driver is None:
+        return
+    if not driver_is_alive(scraper.driver):
+        logger.warning(f"{scraper.source_name} driver is no longer responding, starting a new one")
+        metrics.inc('drivers_recycled', source=scraper.source_name, stage='driver_crashed')
+        scraper.close()
+    elif driver_governor.should_recycle(scraper.driver, scraper.source_name):
+        scraper.close()
@@ -0,0 +1,53 @@
+import re
+from datetime import datetime
+from typing import Optional
+
+# Giá có phần thập phân bằng dấu chấm ('1234.50', '1,234.5'); dấu chấm theo sau 3 chữ số là phân cách nghìn của VND
+DECIMAL_PRICE = re.compile(r'(?:\d{1,3}(?:,\d{3})+|\d+)\.\d{1,2}')
+
+
+def parse_price(value) -> Optional[float]:
+    """1234.5, '1234.50', 'USD 1,234.50' -> số thực; '2.136.936 VND/khách' -> 2136936.0 (bỏ mọi ký tự không phải số)"""
+    if isinstance(value, (int, float)):
+        return float(value)
+    text = str(value or '')
+    number = re.search(r'\d[\d.,]*', text)
+    if number and DECIMAL_PRICE.fullmatch(number.group().rstrip('.,')):
+        return float(number.group().rstrip('.,').replace(',', ''))
+    digits = re.sub(r'\D', '', text)
+    return float(digits) if digits else None
+
+
+def parse_duration(value) -> Optional[int]:
+    """125, '125', '2h 5m', '2 giờ 5 phút', '55m' -> số phút"""
+    if value is None or value == '':
+        return None
+    if isinstance(value, (int, float)):
+        return int(value)
+    text = str(value)
+    if text.isdigit():
+        return int(text)
+    hours = re.search(r'(\d+)\s*(?:h|giờ)', text)
+    minutes = re.search(r'(\d+)\s*(?:m|phút)', text)
+    if not hours and not minutes:
+        return None
+    return (int(hours.group(1)) * 60 if hours else 0) + (int(minutes.group(1)) if minutes else 0)
+
+
+def parse_clock(value, flight_date: datetime) -> Optional[datetime]:
+    """'HH:MM' (có thể lẫn chữ) -> datetime theo ngày bay"""
+    match = re.search(r'(\d{1,2}):(\d{2})', str(value or ''))
+    if not match:
+        return None
+    return flight_date.replace(hour=int(match.group(1)), minute=int(match.group(2)), second=0, microsecond=0)
+
+
+def parse_datetime(value, flight_date: datetime) -> Optional[datetime]:
+    """ISO datetime, 'YYYY-MM-DD HH:MM' hoặc 'HH:MM' (ghép với ngày bay)"""
+    if not value:
+        return None
+    text = str(value)
+    try:
+        return datetime.fromisoformat(text.replace('Z', '+00:00')).replace(tzinfo=None)
+    except ValueError:
+        return parse_clock(text, flight_date)
@@ -1,36 +1,110 @@
-from typing import List, Dict
+from typing import List, Dict, Optional
 from datetime import datetime
 import logging
 from .BookingScraper import BookingApiScraper
 from .AgodaScraper import AgodaScraperV2
 from .TravelokaScraper import TravelScraperV2
 from ..constant.DataSource import DataSource
+from ..model.FlightBatch import FlightBatch
+from ..model.FlightRecord import FlightRecord
+from ..model.FlightSchema import FLIGHT_VALIDATOR
+from ..monitoring.metrics import metrics
+from .CircuitBreaker import circuit_breakers, record_route_outcome
 
 
 class ScraperManager:
-    def __init__(self):
+    def __init__(self, reuse_sessions=False):
+        """reuse_sessions=True: giữ scraper (requests.Session, trình duyệt) của mỗi source giữa các lần gọi, đóng bằng close()"""
         self.logger = logging.getLogger(__name__)
-
-    def scrape_single_source(self, config, routes, date) -> List[Dict]:
+        self.reuse_sessions = reuse_sessions
+        self._sessions = {}
+        # Lỗi gần nhất của mỗi source trong lần scrape_matrix cuối (None nếu không lỗi), để caller phân biệt
+        # "không có chuyến bay" với "scrape thất bại" khi kết quả rỗng
+        self.last_errors: Dict[str, Optional[str]] = {}
+
+    def close(self):
+        for scraper in self._sessions.values():
+            scraper.close()
+        self._sessions.clear()
+
+    def _get_scraper(self, source_name, base_url):
+        scraper = self._sessions.get((source_name, base_url))
+        if scraper is not None:
+            return scraper
+        match source_name:
+            case DataSource.TRAVELOKA_DATA_SRC.value:
+                scraper = TravelScraperV2(source_name, base_url)
+            case DataSource.BOOKING_DATA_SRC.value:
+                scraper = BookingApiScraper(source_name, base_url)
+            case DataSource.AGODA_DATA_SRC.value:
+                scraper = AgodaScraperV2(source_name, base_url, keep_driver=True)
+            case _:
+                return None
+        if self.reuse_sessions:
+            self._sessions[(source_name, base_url)] = scraper
+        return scraper
+
+    def scrape_single_source(self, config, routes, date) -> FlightBatch:
+        """Scrape một source, base URL lấy từ cột url của bảng config (có thể trỏ sang mock server)"""
+        return self.scrape_matrix(config, routes, [date])
+
+    def scrape_matrix(self, config, routes, search_dates) -> FlightBatch:
+        """
+        Scrape route x ngày của một source bằng một session (trình duyệt/requests.Session):
+        các ngày của cùng một route chạy liền nhau, chỉ đổi ngày trong URL.
+        """
+        source_name = config.get('source_name', '')
+        scraper = None
+        self.last_errors[source_name] = None
         try:
-            source_name = config.get('source_name', '')
-            scraper = None
-
-            match source_name:
-                case DataSource.TRAVELOKA_DATA_SRC.value:
-                    scraper = TravelScraperV2(
-                        source_name,
-                        config.get('url')
-                    )
-
-            flights =  scraper.scrape_flights(routes, date)
+            scraper = self._get_scraper(source_name, config.get('url'))
+            if scraper is None:
+                self.logger.error(f"No scraper for source {source_name}")
+                self.last_errors[source_name] = f"no scraper for {source_name}"
+                return FlightBatch()
+            breaker = circuit_breakers.get(source_name)
+
+            multi_tab = getattr(scraper, 'tabs', 1) > 1 and getattr(scraper, 'replay', None) is None
+            if isinstance(scraper, TravelScraperV2) or multi_tab:
+                # Traveloka (và Agoda ở chế độ nhiều tab) tự duyệt route x ngày trong một trình duyệt,
+                # breaker được kiểm tra bên trong vòng lặp; Agoda có API replay thì chạy từng route
+                flights = scraper.scrape_matrix(routes, search_dates, breaker, keep_driver=self.reuse_sessions)
+                self.last_errors[source_name] = scraper.last_error
+                return flights
+
+            # Booking/Agoda scrape từng route/ngày một, gom vào cùng một batch
+            flights = FlightBatch()
+            skipped = 0
+            for route in routes:
+                for search_date in search_dates:
+                    if not breaker.allow_request():
+                        skipped += 1
+                        continue
+                    try:
+                        route_flights = scraper.scrape_flights(route['origin'], route['destination'], search_date)
+                    except Exception as e:
+                        breaker.record_failure(str(e))
+                        raise
+                    record_route_outcome(breaker, route_flights, scraper.last_error)
+                    if scraper.last_error:
+                        self.last_errors[source_name] = scraper.last_error
+                    flights.extend(route_flights)
+            if skipped:
+                self.logger.warning(f"Skipped {skipped}/{len(routes) * len(search_dates)} route-dates of {source_name}: "
+                                    f"circuit {breaker.state}")
+                metrics.inc('routes_skipped', skipped, source=source_name, stage='circuit_breaker')
             return flights
-        except Exception:
-            return []
+        except Exception as e:
+            self.logger.error(f"Error scraping {source_name}: {e}")
+            self.last_errors[source_name] = str(e) or type(e).__name__
+            return FlightBatch()
+        finally:
+            if scraper is not None and not self.reuse_sessions:
+                scraper.close()
 
 
 
-    def scrape_all_sources(self, configs: List[Dict], routes: List[Dict], search_date: datetime) -> List[Dict]:
+    def scrape_all_sources(self, configs: List[Dict], routes: List[Dict], search_date: datetime) -> List[FlightRecord]:
         """Scrape từ tất cả các nguồn được cấu hình"""
         all_flights = []
 
@@ -70,50 +144,22 @@ class ScraperManager:
     
 
 
-    def clean_flight_data(self, flights: List[Dict]) -> List[Dict]:
-        cleaned_flights = []
-        
-        for flight in flights:
-            if self.validate_flight_data(flight):
-                # Ensure all fields have default values
-                flight.setdefault('currency', 'VND')
-                flight.setdefault('stops', 0)
-                flight.setdefault('aircraft_type', '')
-                flight.setdefault('baggage_info', '')
-                flight.setdefault('meal_info', '')
-                flight.setdefault('seat_class', '')
-                flight.setdefault('booking_url', '')
-                
-                cleaned_flights.append(flight)
-            else:
-                self.logger.warning(f"Skipping invalid flight data: {flight.get('flight_code', 'Unknown')}")
-        
-        return cleaned_flights
-
-    def validate_flight_data(self, flight_data: Dict) -> bool:
-        """Validate flight data trước khi lưu vào database"""
-        required_fields = ['flight_code', 'airline', 'departure_airport', 'arrival_airport', 'departure_time',
-                           'arrival_time', 'price', 'source']
-
-        for field in required_fields:
-            if not flight_data.get(field):
-                self.logger.warning(f"Missing required field: {field}")
-                return False
-
-        # Validate price
-        if not isinstance(flight_data.get('price'), (int, float)) or flight_data.get('price', 0) <= 0:
-            self.logger.warning(f"Invalid price: {flight_data.get('price')}")
-            return False
+    def clean_flight_data(self, flights) -> FlightBatch:
+        """Chuẩn hóa và validate cả batch theo FLIGHT_SCHEMA, chỉ log một dòng tổng hợp số dòng bị loại"""
+        batch = flights if isinstance(flights, FlightBatch) else FlightBatch.from_records(flights)
+        batch.normalize()
+        result = FLIGHT_VALIDATOR.validate(batch)
+        if result.rejected:
+            self.logger.warning(result.summary())
+        return batch.filter(result.valid)
 
-        # Validate datetime format
-        try:
-            datetime.strptime(flight_data.get('departure_time', ''), '%Y-%m-%d %H:%M:%S')
-            datetime.strptime(flight_data.get('arrival_time', ''), '%Y-%m-%d %H:%M:%S')
-        except ValueError:
-            self.logger.warning(f"Invalid datetime format")
-            return False
-
-        return True
+    def validate_flight_data(self, flight_data: FlightRecord) -> bool:
+        """Validate flight data trước khi lưu vào database"""
+        result = FLIGHT_VALIDATOR.validate(FlightBatch.from_records([flight_data]))
+        if result.rejected:
+            self.logger.warning(f"Invalid flight {flight_data.get('flight_code', 'Unknown')}: "
+                                f"{', '.join(result.rejections)}")
+        return bool(result.valid.all())
 
 
     def get_scraper_status(self) -> Dict[str, bool]:
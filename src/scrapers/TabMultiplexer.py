@@ -0,0 +1,220 @@
+import os
+import time
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional, Tuple
+
+from selenium.common.exceptions import TimeoutException
+
+from .CircuitBreaker import STATE_HALF_OPEN, record_route_outcome
+from .DriverGovernor import driver_governor, recycle_if_needed
+
+# Số tab mỗi trình duyệt cho Traveloka/Agoda, 1 = chế độ cũ (một route một lúc)
+BROWSER_TABS = int(os.getenv('BROWSER_TABS', 1))
+TAB_READY_TIMEOUT = float(os.getenv('TAB_READY_TIMEOUT', 90))
+TAB_POLL_INTERVAL = 0.5
+
+# next_job() trả về WAIT khi tạm chưa được mở thêm tab (vd. circuit breaker đang probe)
+WAIT = object()
+
+# Tab nền bị Chrome giảm timer/render, các flag này giữ cho mọi tab tải song song
+MULTI_TAB_CHROME_ARGS = (
+    "--disable-background-timer-throttling",
+    "--disable-backgrounding-occluded-windows",
+    "--disable-renderer-backgrounding",
+)
+
+
+class TabMultiplexer:
+    """
+    Chạy nhiều lượt tìm kiếm trên K tab của cùng một trình duyệt:
+    mở URL ở mọi tab (không chờ tải xong), sau đó lần lượt kiểm tra từng tab, tab nào sẵn sàng thì
+    harvest (scroll + parse) rồi nạp job tiếp theo vào chính tab đó.
+    WebDriver chỉ điều khiển một tab tại một thời điểm nên harvest vẫn tuần tự, phần chờ mạng/render chạy song song.
+    should_recycle() được gọi sau mỗi lần harvest: trả về lý do thì ngừng nạp job mới, chờ các tab đang tải xong
+    rồi kết thúc (recycle_requested = True, job đã lấy mà chưa mở nằm ở unstarted) để caller mở trình duyệt mới.
+    """
+
+    def __init__(self, driver, tabs: int, is_ready: Callable[[Any], bool], harvest: Callable[[Any, Any], Any],
+                 ready_timeout: float = TAB_READY_TIMEOUT, poll_interval: float = TAB_POLL_INTERVAL,
+                 should_recycle: Optional[Callable[[], Any]] = None):
+        self.driver = driver
+        self.tabs = max(1, tabs)
+        self.is_ready = is_ready
+        self.harvest = harvest
+        self.ready_timeout = ready_timeout
+        self.poll_interval = poll_interval
+        self.should_recycle = should_recycle
+        self.recycle_requested = False
+        self.unstarted = None
+
+    def run(self, next_job: Callable[[], Any], job_url: Callable[[Any], str]) -> Iterator[Tuple[Any, Any]]:
+        """
+        next_job() trả về job tiếp theo, None khi hết, hoặc WAIT.
+        Yield (job, kết quả harvest) hoặc (job, exception) khi tab lỗi/quá thời gian chờ.
+        """
+        driver = self.driver
+        first_handle = driver.current_window_handle
+        handles = [first_handle]
+        active: Dict[str, Tuple[Any, float]] = {}
+        queued = None
+        exhausted = False
+        self.recycle_requested = False
+        self.unstarted = None
+
+        def take():
+            """Job kế tiếp (lấy trước để chỉ mở tab mới khi thật sự có job)"""
+            nonlocal queued, exhausted
+            if self.recycle_requested:
+                return None
+            if queued is None and not exhausted:
+                job = next_job()
+                if job is None:
+                    exhausted = True
+                elif job is not WAIT:
+                    queued = job
+            return queued
+
+        def start(handle):
+            nonlocal queued
+            job, queued = queued, None
+            driver.switch_to.window(handle)
+            # Gán location thay cho driver.get() để không bị chặn tới khi trang tải xong
+            driver.execute_script("window.location.href = arguments[0];", job_url(job))
+            active[handle] = (job, time.monotonic())
+
+        try:
+            while True:
+                for handle in handles:
+                    if handle not in active and take() is not None:
+                        start(handle)
+                while len(handles) < self.tabs and take() is not None:
+                    driver.switch_to.new_window('tab')
+                    handles.append(driver.current_window_handle)
+                    start(handles[-1])
+                if not active:
+                    if exhausted or self.recycle_requested:
+                        break
+                    time.sleep(self.poll_interval)
+                    continue
+
+                harvested = False
+                for handle in list(active):
+                    job, started = active[handle]
+                    driver.switch_to.window(handle)
+                    try:
+                        ready = self.is_ready(driver)
+                    except Exception as e:
+                        del active[handle]
+                        yield job, e
+                        continue
+                    if ready:
+                        del active[handle]
+                        try:
+                            result = self.harvest(driver, job)
+                        except Exception as e:
+                            result = e
+                        harvested = True
+                        yield job, result
+                        if self.should_recycle is not None and not self.recycle_requested and self.should_recycle():
+                            self.recycle_requested = True
+                    elif time.monotonic() - started > self.ready_timeout:
+                        del active[handle]
+                        yield job, TimeoutException(f"tab not ready after {self.ready_timeout:.0f}s")
+                if not harvested:
+                    time.sleep(self.poll_interval)
+        finally:
+            self.unstarted = queued
+            for handle in handles[1:]:
+                try:
+                    driver.switch_to.window(handle)
+                    driver.close()
+                except Exception:
+                    continue
+            try:
+                driver.switch_to.window(first_handle)
+            except Exception:
+                pass
+
+
+class BreakerJobSource:
+    """
+    next_job() cho TabMultiplexer: job bị circuit breaker từ chối thì bỏ qua (đếm vào skipped),
+    riêng lúc breaker đang probe thì giữ job lại (WAIT) chờ kết quả probe thay vì bỏ.
+    Job đã giao được giữ trong `issued` đến khi complete(); abandon() báo thất bại cho các job còn lại
+    (vd. trình duyệt chết giữa chừng) để lượt probe của breaker không bị giữ mãi.
+    """
+
+    def __init__(self, jobs: Iterable, breaker=None):
+        self.jobs = iter(jobs)
+        self.breaker = breaker
+        self.held = None
+        self.skipped = 0
+        self.issued = []
+
+    def __call__(self):
+        while True:
+            job, self.held = (self.held, None) if self.held is not None else (next(self.jobs, None), None)
+            if job is None:
+                return None
+            if self.breaker is None or self.breaker.allow_request():
+                self.issued.append(job)
+                return job
+            if self.breaker.state == STATE_HALF_OPEN:
+                self.held = job
+                return WAIT
+            self.skipped += 1
+
+    def complete(self, job):
+        """Job đã có kết quả (caller đã báo cho breaker)"""
+        if job in self.issued:
+            self.issued.remove(job)
+
+    def abandon(self, error: Exception):
+        """Các job đã giao nhưng chưa có kết quả tính là thất bại"""
+        reason = str(error).splitlines()[0] if str(error) else type(error).__name__
+        for _ in self.issued:
+            record_route_outcome(self.breaker, None, reason)
+        self.issued = []
+
+
+def next_available_job(next_job: Callable[[], Any]):
+    """Job kế tiếp, chờ qua các lần WAIT; None khi hết job"""
+    job = next_job()
+    while job is WAIT:
+        time.sleep(TAB_POLL_INTERVAL)
+        job = next_job()
+    return job
+
+
+def run_multi_tab(scraper, first_job, next_job: Callable[[], Any], harvest: Callable[[Any, Any], Any],
+                  job_url: Callable[[Any], str]) -> Iterator[Tuple[Any, Any]]:
+    """
+    TabMultiplexer trên trình duyệt của scraper, có kiểm tra governor giữa các lần harvest: trình duyệt quá ngưỡng
+    RAM thì đóng khi các tab đang tải xong, mở trình duyệt mới và chạy tiếp các job còn lại.
+    Yield như TabMultiplexer.run(); không mở được trình duyệt thì yield (job, exception) cho job đang giữ.
+    """
+    pending = [first_job]
+    while True:
+        recycle_if_needed(scraper)
+        try:
+            driver = scraper.driver or scraper.open_driver()
+        except Exception as e:
+            yield pending.pop(), e
+            return
+        multiplexer = TabMultiplexer(driver, scraper.tabs, scraper.is_results_ready, harvest,
+                                     should_recycle=lambda: driver_governor.should_recycle(driver, scraper.source_name))
+        yield from multiplexer.run(lambda: pending.pop() if pending else next_job(), job_url)
+        if not multiplexer.recycle_requested:
+            return
+        scraper.close()
+        job = multiplexer.unstarted if multiplexer.unstarted is not None else next_available_job(next_job)
+        if job is None:
+            return
+        pending.append(job)
+
+
+def bring_to_front(driver):
+    """Đưa tab hiện tại lên trước để các nội dung lazy-load theo viewport được tải khi scroll"""
+    try:
+        driver.execute_cdp_cmd('Page.bringToFront', {})
+    except Exception:
+        pass
@@ -1,3 +1,4 @@
+import os
 import time
 from selenium import webdriver
 from selenium.webdriver.chrome.service import Service
@@ -7,58 +8,249 @@ from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from datetime import datetime, timedelta
 import logging
-import re
 import random
 from bs4 import BeautifulSoup
 import traceback
+from ..monitoring.artifacts import artifact_writer
+from ..monitoring.metrics import metrics, page_transfer_bytes
+from ..model.FlightBatch import FlightBatch
+from ..model.FlightRecord import FlightRecord
+from .ApiReplay import ApiReplayClient, provider_key, replay_or_none
+from .BrowserProfileManager import browser_profiles
+from .CircuitBreaker import record_route_outcome
+from .DriverGovernor import driver_governor, recycle_if_needed
+from .FieldParsers import parse_clock, parse_duration, parse_price
+from .TabMultiplexer import (BROWSER_TABS, MULTI_TAB_CHROME_ARGS, BreakerJobSource, bring_to_front,
+                             next_available_job, run_multi_tab)
+
+FLIGHT_CARD_SELECTOR = "div[data-testid^='flight-inventory-card-container']"
+
+# incremental: lấy card mới sau mỗi bước scroll (list ảo hóa xóa card đã cuộn qua khỏi DOM)
+# snapshot: scroll đến cuối rồi parse page_source một lần như cũ
+HARVEST_MODE = os.getenv('HARVEST_MODE', 'incremental')
+HARVEST_MAX_STEPS = int(os.getenv('HARVEST_MAX_STEPS', 40))
+# Số bước scroll liên tiếp không có card mới thì dừng
+HARVEST_IDLE_STEPS = int(os.getenv('HARVEST_IDLE_STEPS', 3))
+# Số card tối đa mỗi route, theo source: MAX_CARDS_PER_ROUTE="Traveloka=150" (hoặc "Traveloka.com=150"), 0 = không giới hạn
+DEFAULT_MAX_CARDS = 200
+
+# Trả về [key, outerHTML] của các card chưa có trong arguments[1]; key là text của card,
+# không đổi khi list ảo hóa render lại card ở vị trí khác
+COLLECT_NEW_CARDS_JS = """
+const seen = new Set(arguments[1]);
+const cards = [];
+for (const el of document.querySelectorAll(arguments[0])) {
+    const key = (el.innerText || el.textContent || '').replace(/\\s+/g, ' ').trim();
+    if (key && !seen.has(key)) {
+        seen.add(key);
+        cards.push([key, el.outerHTML]);
+    }
+}
+return cards;
+"""
+
+
+def parse_card_limits(value):
+    """'Traveloka=150,Other.com=80' -> {'traveloka': 150, 'other': 80} (khóa theo provider_key của source)"""
+    limits = {}
+    for item in (value or '').split(','):
+        source_name, _, limit = item.partition('=')
+        if source_name.strip() and limit.strip().isdigit():
+            limits[provider_key(source_name.strip())] = int(limit)
+    return limits
+
+
+MAX_CARDS_PER_ROUTE = parse_card_limits(os.getenv('MAX_CARDS_PER_ROUTE'))
+
 
 class TravelScraperV2:
-    def __init__(self, source_name, base_url ):
+    def __init__(self, source_name, base_url, tabs=BROWSER_TABS):
         self.source_name = source_name
-        self.base_url = base_url
+        self.base_url = (base_url or "https://www.traveloka.com/vi-vn/flight").rstrip('/')
+        # tabs > 1: một trình duyệt chạy song song nhiều lượt tìm kiếm trên các tab
+        self.tabs = max(1, tabs)
+        self.driver = None
+        self.profile_dir = None
+        self.max_cards = MAX_CARDS_PER_ROUTE.get(provider_key(source_name), DEFAULT_MAX_CARDS)
+        # Lỗi của route thất bại gần nhất trong lần scrape_matrix cuối
+        self.last_error = None
+        # API_REPLAY=1: sau route đầu tiên chạy bằng trình duyệt, các route sau gọi thẳng API tìm kiếm
+        self.replay = ApiReplayClient.for_source(source_name, self.base_url)
+
+    def open_driver(self):
+        """Mở trình duyệt trên profile lâu dài của source (cookie, cache giữ lại giữa các lần chạy)"""
+        driver_governor.wait_for_capacity(self.source_name)
+        self.profile_dir = browser_profiles.acquire(self.source_name)
+        try:
+            self.driver = self.make_driver(headless=False, profile_dir=self.profile_dir)
+        except Exception:
+            self.close()
+            raise
+        return self.driver
 
-    def scrape_flights(self, routes, search_date):
-        driver = None
-        scraped_flights = []
+    def close(self):
+        if self.driver:
+            try:
+                self.driver.quit()
+            except Exception as e:
+                # Trình duyệt đã crash: vẫn phải nhả profile
+                logging.warning(f"Error closing {self.source_name} driver: {e}")
+            self.driver = None
+        browser_profiles.release(self.profile_dir)
+        self.profile_dir = None
+
+    def scrape_flights(self, routes, search_date, breaker=None):
+        return self.scrape_matrix(routes, [search_date], breaker)
+
+    def scrape_matrix(self, routes, search_dates, breaker=None, keep_driver=False):
+        """
+        Scrape route x ngày bằng một trình duyệt, các ngày của cùng route chạy liền nhau (chỉ đổi tham số dt=)
+        để tận dụng cookie và cache. Route bị circuit breaker từ chối thì bỏ qua.
+        keep_driver=True: giữ trình duyệt cho lần gọi sau, đóng bằng close().
+        """
+        scraped_flights = FlightBatch()
+        jobs = BreakerJobSource(((r, d) for r in routes for d in search_dates), breaker)
+        self.last_error = None
 
         try:
-            driver = self.make_driver(headless=False)
+            for job, result in self._run_jobs(jobs):
+                jobs.complete(job)
+                r, search_date = job
+                if isinstance(result, Exception):
+                    logging.error(f"Error occurred while scraping route {r} on {search_date:%Y-%m-%d}: {result}",
+                                  exc_info=result)
+                    self.last_error = str(result).splitlines()[0] if str(result) else type(result).__name__
+                    record_route_outcome(breaker, None, self.last_error)
+                    continue
+                record_route_outcome(breaker, result)
+                scraped_flights.extend(result)
+        except Exception as e:
+            # Trình duyệt chết giữa chừng (switch_to, new_window...): báo thất bại cho các job đang chạy,
+            # vẫn trả về các route đã scrape được
+            jobs.abandon(e)
+            self.last_error = str(e).splitlines()[0] if str(e) else type(e).__name__
+            logging.error(f"{self.source_name} browser failed after {len(scraped_flights)} flights: {e}",
+                          exc_info=True)
+        finally:
+            if not keep_driver:
+                self.close()
+        if jobs.skipped:
+            logging.warning(f"Skipped {jobs.skipped}/{len(routes) * len(search_dates)} route-dates of "
+                            f"{self.source_name}: circuit {breaker.state}")
+            metrics.inc('routes_skipped', jobs.skipped, source=self.source_name, stage='circuit_breaker')
+        return scraped_flights
+
+    def _run_jobs(self, jobs):
+        """Yield ((route, ngày), FlightBatch hoặc exception), một tab hoặc nhiều tab tùy self.tabs"""
+        job = next_available_job(jobs)
+        if job is None:
+            return
+
+        if self.tabs == 1 or self.replay is not None:
+            while job is not None:
+                r, search_date = job
+                try:
+                    result = replay_or_none(self.replay, r['origin'], r['destination'], search_date)
+                    if result is None:
+                        # Trình duyệt chạy lâu tăng RAM dần: kiểm tra giữa các route, quá ngưỡng thì mở trình duyệt mới
+                        recycle_if_needed(self)
+                        if self.driver is None:
+                            self.open_driver()
+                        result = self.scrape_route(self.driver, r, search_date)
+                        if self.replay is not None:
+                            self.replay.bootstrap(self.driver)
+                except Exception as e:
+                    result = e
+                    artifact_writer.capture(self.driver, self.source_name, f"{r['origin']}-{r['destination']}", 'error')
+                yield job, result
+                job = next_available_job(jobs)
+            return
+
+        yield from run_multi_tab(self, job, jobs, lambda driver, job: self.harvest_route(driver, *job),
+                                 lambda job: self.build_search_url(job[0]["origin"], job[0]["destination"], job[1]))
+
+    def is_results_ready(self, driver) -> bool:
+        return bool(driver.find_elements(By.CSS_SELECTOR, FLIGHT_CARD_SELECTOR))
 
-            for r in routes:
-                origin = r["origin"]
-                destination = r["destination"]
-                url = self.build_search_url(origin, destination, search_date)
-                logging.info(f"Opening URL: {url}")
-                driver.get(url)
+    def scrape_route(self, driver, r, search_date) -> FlightBatch:
+        route = f"{r['origin']}-{r['destination']}"
+        url = self.build_search_url(r["origin"], r["destination"], search_date)
+        logging.info(f"Opening URL: {url}")
 
-                wait = WebDriverWait(driver, 90)
-                flight_card_selector = "div[data-testid^='flight-inventory-card-container']"
-                wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, flight_card_selector)))
+        with metrics.timer('navigation', self.source_name, route):
+            driver.get(url)
+            wait = WebDriverWait(driver, 90)
+            wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, FLIGHT_CARD_SELECTOR)))
+        return self.harvest_route(driver, r, search_date)
 
+    def harvest_route(self, driver, r, search_date) -> FlightBatch:
+        """Scroll và parse trang kết quả đã tải xong của một route"""
+        route = f"{r['origin']}-{r['destination']}"
+        if self.tabs > 1:
+            bring_to_front(driver)
+        with metrics.timer('scrolling', self.source_name, route):
+            if HARVEST_MODE == 'incremental':
+                card_html = self.harvest_cards(driver, route)
+            else:
                 self.scroll_page(driver)
 
-                page_source = driver.page_source
-                soup = BeautifulSoup(page_source, "html.parser")
+        metrics.inc('pages_loaded', source=self.source_name, route=route)
+        metrics.inc('bytes_transferred', page_transfer_bytes(driver), source=self.source_name, route=route)
 
-                flight_cards = soup.select(flight_card_selector)
-                if not flight_cards:
-                    logging.warning(f"No flights found for route: {r}")
+        route_flights = FlightBatch()
+        with metrics.timer('parsing', self.source_name, route):
+            if HARVEST_MODE == 'incremental':
+                flight_cards = [BeautifulSoup(html, "html.parser") for html in card_html]
+            else:
+                soup = BeautifulSoup(driver.page_source, "html.parser")
+                flight_cards = soup.select(FLIGHT_CARD_SELECTOR)
+            if not flight_cards:
+                logging.warning(f"No flights found for route: {r}")
+                artifact_writer.capture(driver, self.source_name, route, 'no_flights')
 
-                for card in flight_cards:
-                    flight_data = self.parse_flight_card(card, search_date)
-                    scraped_flights.append(flight_data)
+            for card in flight_cards:
+                flight_data = self.parse_flight_card(card, search_date)
+                if flight_data:
+                    route_flights.append(flight_data)
+        metrics.inc('cards_parsed', len(flight_cards), source=self.source_name, route=route)
+        if flight_cards:
+            artifact_writer.capture(driver, self.source_name, route, 'sample', failed=False)
+        return route_flights
 
-        except Exception as e:
-            logging.error(f"Error occurred while scraping flights: {e}", exc_info=True)
-        finally:
-            if driver:
-                driver.quit()
-        return scraped_flights
+    def harvest_cards(self, driver, route, max_steps=HARVEST_MAX_STEPS, idle_steps=HARVEST_IDLE_STEPS):
+        """
+        Scroll từng màn hình và lấy HTML của các card mới xuất hiện sau mỗi bước (bỏ trùng theo text của card),
+        dừng khi idle_steps bước liên tiếp không có card mới hoặc đủ self.max_cards.
+        """
+        seen = set()
+        cards = []
+        idle = 0
+        for step in range(max_steps):
+            found = len(cards)
+            for key, html in driver.execute_script(COLLECT_NEW_CARDS_JS, FLIGHT_CARD_SELECTOR, list(seen)):
+                if key not in seen:
+                    seen.add(key)
+                    cards.append(html)
+            if self.max_cards and len(cards) >= self.max_cards:
+                logging.info(f"{route}: reached {self.max_cards} cards after {step + 1} scroll steps")
+                return cards[:self.max_cards]
+            idle = idle + 1 if len(cards) == found else 0
+            if idle >= idle_steps:
+                break
+            driver.execute_script("window.scrollBy(0, window.innerHeight);")
+            time.sleep(random.uniform(1.0, 1.5))
+        logging.info(f"{route}: harvested {len(cards)} cards in {step + 1} scroll steps")
+        return cards
 
-    def make_driver(self, headless=False):
+    def make_driver(self, headless=False, profile_dir=None):
         options = webdriver.ChromeOptions()
         if headless:
             options.add_argument("--headless=new")
+        if profile_dir:
+            options.add_argument(f"--user-data-dir={os.path.abspath(profile_dir)}")
+        if self.tabs > 1:
+            for argument in MULTI_TAB_CHROME_ARGS:
+                options.add_argument(argument)
         options.add_argument("--no-sandbox")
         options.add_argument("--disable-dev-shm-usage")
         options.add_argument("--disable-gpu")
@@ -75,7 +267,7 @@ class TravelScraperV2:
 
     def build_search_url(self, origin, destination, search_date):
         date_str = search_date.strftime("%d-%m-%Y")
-        return f"https://www.traveloka.com/vi-vn/flight/fullsearch?ap={destination}.{origin}&dt={date_str}.NA&ps=1.0.0&sc=ECONOMY"
+        return f"{self.base_url}/fullsearch?ap={destination}.{origin}&dt={date_str}.NA&ps=1.0.0&sc=ECONOMY"
 
     def scroll_page(self, driver, max_scrolls=8):
         print("Scrolling page to load all flights...")
@@ -108,14 +300,14 @@ class TravelScraperV2:
         dest_block = card_soup.select_one('div.css-1dbjc4n.r-obd0qt.r-eqz5dr.r-9aw3ui.r-knv0ih:not(.r-ggk5by)')
 
         # depart_block
-        dep_children = depart_block.find_all("div", recursive=False)
+        dep_children = depart_block.find_all("div", recursive=False) if depart_block else []
         if len(dep_children) >= 2:
             departure_time = dep_children[0].get_text(strip=True)
             departure_airport = dep_children[1].get_text(strip=True)
 
         # destination block
-        dest_children = dest_block.find_all("div", recursive=False)
-        if len(dest_block) >= 2:
+        dest_children = dest_block.find_all("div", recursive=False) if dest_block else []
+        if len(dest_children) >= 2:
             destination_time = dest_children[0].get_text(strip=True)
             destination_airport = dest_children[1].get_text(strip=True)
 
@@ -127,15 +319,33 @@ class TravelScraperV2:
         duration_tag = card_soup.select_one('div.css-901oao.r-uh8wd5.r-majxgm.r-1p4rafz.r-fdjqy7')
         duration_time = duration_tag.get_text(strip=True) if duration_tag else None
 
+        # Chuẩn hóa giờ (HH:MM -> datetime theo ngày tìm kiếm), giá và thời gian bay
+        dep_dt = self.parse_clock(departure_time, search_date)
+        arr_dt = self.parse_clock(destination_time, search_date)
+        if dep_dt and arr_dt and arr_dt < dep_dt:
+            arr_dt += timedelta(days=1)
+
+        duration_minutes = self.parse_duration(duration_time)
+        if duration_minutes is None and dep_dt and arr_dt:
+            duration_minutes = int((arr_dt - dep_dt).total_seconds() / 60)
+
+        flight_code = None
+        if airline and dep_dt:
+            flight_code = f"{airline.split()[0].upper()}-{dep_dt.strftime('%H%M')}"
 
-        flight =  {
-            "airline": airline,
-            "departure_airport": departure_airport,
-            "departure_time": departure_time,
-            "destination_airport": destination_airport,
-            "destination_time": destination_time,
-            "price": price,
-            "duration_time": duration_time,
-        }
+        return FlightRecord(
+            flight_code=flight_code,
+            airline=airline,
+            departure_airport=departure_airport,
+            arrival_airport=destination_airport,
+            departure_time=dep_dt.strftime('%Y-%m-%d %H:%M:%S') if dep_dt else None,
+            arrival_time=arr_dt.strftime('%Y-%m-%d %H:%M:%S') if arr_dt else None,
+            duration_minutes=duration_minutes,
+            price=self.parse_price(price),
+            source=self.source_name,
+        )
 
-        return flight
+    # Dùng chung parser với ApiReplay, giữ tên method cho code cũ
+    parse_clock = staticmethod(parse_clock)
+    parse_price = staticmethod(parse_price)
+    parse_duration = staticmethod(parse_duration)
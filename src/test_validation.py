@@ -0,0 +1,83 @@
+# test_validation.py
+# Test không cần database/website: chạy từ thư mục gốc bằng `python -m pytest -q src/test_validation.py`
+from src.model.FlightBatch import FlightBatch
+from src.model.FlightRecord import FLIGHT_FIELDS, FlightRecord
+from src.model.FlightSchema import FLIGHT_VALIDATOR
+from src.scrapers.BookingScraper import BookingApiScraper
+from src.scrapers.ScraperManager import ScraperManager
+from src.scrapers.TravelokaScraper import DEFAULT_MAX_CARDS, parse_card_limits, provider_key
+from src.transform.warehouse_transfer import coerce_chunk
+
+
+def booking_offer(total_time=7500, departure="2025-10-20T08:00:00", arrival="2025-10-20T10:05:00"):
+    """Một flightOffer tối giản theo response của Booking API"""
+    return {
+        "priceBreakdown": {"total": {"units": 1500000, "currencyCode": "VND"}},
+        "segments": [{"legs": [{
+            "departureAirport": {"code": "SGN"},
+            "arrivalAirport": {"code": "HAN"},
+            "departureTime": departure,
+            "arrivalTime": arrival,
+            "totalTime": total_time,
+            "flightInfo": {"flightNumber": "213", "carrierInfo": {"marketingCarrier": "VN"}},
+            "carriersData": [{"name": "Vietnam Airlines"}],
+            "stops": 0,
+        }]}],
+    }
+
+
+def flight(departure_time="2025-10-20 08:00:00", arrival_time="2025-10-20 10:05:00", **fields):
+    values = dict(flight_code="VN213", airline="Vietnam Airlines", departure_airport="SGN", arrival_airport="HAN",
+                  departure_time=departure_time, arrival_time=arrival_time, duration_minutes=125, price=1500000,
+                  currency="VND", source="Booking.com")
+    values.update(fields)
+    return FlightRecord(**values)
+
+
+def test_booking_total_time_is_seconds():
+    flights = BookingApiScraper().parse_booking_data({"flightOffers": [booking_offer(total_time=7500)]})
+    assert len(flights) == 1
+    assert flights[0].get('duration_minutes') == 125
+
+
+def test_clean_flight_data_keeps_booking_flights():
+    flights = BookingApiScraper().parse_booking_data({"flightOffers": [booking_offer(), booking_offer(3300)]})
+    cleaned = ScraperManager().clean_flight_data(flights)
+    assert len(cleaned) == 2
+
+
+def test_validator_rejects_arrival_before_departure():
+    batch = FlightBatch.from_records([
+        flight(),
+        flight(flight_code="VN215", arrival_time="2025-10-20 07:00:00"),
+    ]).normalize()
+    result = FLIGHT_VALIDATOR.validate(batch)
+    assert list(result.valid) == [True, False]
+    assert result.rejections == {'order:arrival_time': 1}
+
+
+def test_card_limits_match_source_name():
+    limits = parse_card_limits("Traveloka=150, Agoda.com=80, bad=x")
+    assert limits == {'traveloka': 150, 'agoda': 80}
+    assert limits.get(provider_key('Traveloka.com'), DEFAULT_MAX_CARDS) == 150
+    assert parse_card_limits("Traveloka.com=150") == {'traveloka': 150}
+    assert parse_card_limits(None) == {}
+
+
+def test_coerce_chunk_skips_rows_flights_cannot_store():
+    # Thứ tự cột theo READ_QUERY của warehouse_transfer
+    rows = [
+        (1, 'VN213', 'Vietnam Airlines', 'SGN', 'HAN', '2025-10-20 08:00:00', '2025-10-20 10:05:00', 125, 1500000.0,
+         'VND', None, 'data/scrap_20251020/Traveloka.com.csv'),
+        (2, 'VJ-0800', 'VietJet Air', 'SGN', 'HAN', '08:00', '10:05', None, '2.136.936 VND/khách', 'VND',
+         'Traveloka.com', None),
+        (3, 'X' * 101, 'Vietnam Airlines', 'SGN', 'HAN', '2025-10-20 08:00:00', '2025-10-20 10:05:00', 125,
+         1500000.0, 'VND', 'Booking.com', None),
+    ]
+    tuples, result = coerce_chunk(rows)
+    assert len(tuples) == 1 and result.rejected == 2
+    assert result.rejections['length:flight_code'] == 1
+    record = dict(zip(FLIGHT_FIELDS, tuples[0]))
+    assert record['source'] == 'Traveloka.com'
+    assert record['departure_time'] == '2025-10-20 08:00:00'
+    assert record['duration_minutes'] == 125 and record['price'] == 1500000.0
@@ -0,0 +1,243 @@
+"""
+Transform engine chạy bằng DuckDB trực tiếp trên các file đã scrape (data/scrap_*/*.csv hoặc data/parquet),
+không cần load vào SQLite trước. Kết quả giống đường SQLite (load_csv_to_sqlite -> process_missing_data ->
+process_duplicate_data) trên cùng input và được ghi ra Parquet sẵn sàng cho warehouse.
+
+    python -m src.transform.duckdb_transform                        # CSV -> data/cleaned/flights.parquet
+    python -m src.transform.duckdb_transform --input parquet --threads 4
+    python -m src.transform.duckdb_transform --verify               # so sánh với đường SQLite
+"""
+import argparse
+import csv
+import glob
+import logging
+import os
+import shutil
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+from src.config.csv_reader import resolve_columns, source_from_path
+from src.model.FlightRecord import FLIGHT_FIELDS, SQLITE_COLUMNS
+
+try:
+    import duckdb
+except ImportError:  # duckdb là dependency tùy chọn, chỉ cần khi chọn --engine duckdb
+    duckdb = None
+
+logger = logging.getLogger(__name__)
+
+DUCKDB_THREADS = int(os.getenv('DUCKDB_THREADS', os.cpu_count() or 1))
+CLEANED_OUTPUT = os.getenv('CLEANED_OUTPUT', os.path.join("data", "cleaned", "flights.parquet"))
+INPUT_GLOBS = {
+    'csv': os.path.join("data", "scrap_*", "*.csv"),
+    'parquet': os.path.join("data", "parquet", "scrape_date=*", "source=*", "*.parquet"),
+}
+
+# Các cột process_missing_data kiểm tra NULL
+REQUIRED_COLUMNS = ('airline', 'departure_airport', 'departure_time', 'destination_airport',
+                    'destination_time', 'duration_time', 'price')
+
+# SQLite lưu giá trị theo type affinity của cột: REAL/INTEGER nếu text là số hợp lệ, ngược lại giữ text.
+# Key so sánh mô phỏng lại để dedup giống hệt, cột output thì ép kiểu (text không phải số -> NULL)
+CLEAN_QUERY = f"""
+    WITH complete AS (
+        SELECT *,
+               TRY_CAST(price AS DOUBLE) AS price_value,
+               TRY_CAST(duration_time AS DOUBLE) AS duration_value
+        FROM raw_flights
+        WHERE {' AND '.join(f'{c} IS NOT NULL' for c in REQUIRED_COLUMNS)}
+    ),
+    ranked AS (
+        SELECT *,
+               row_number() OVER (
+                   PARTITION BY airline, departure_airport, departure_time, destination_airport, destination_time,
+                                COALESCE(CAST(duration_value AS VARCHAR), 'text:' || duration_time),
+                                COALESCE(CAST(price_value AS VARCHAR), 'text:' || price)
+                   ORDER BY file_index, row_index
+               ) AS occurrence
+        FROM complete
+    )
+    SELECT airline, departure_airport, departure_time, destination_airport, destination_time,
+           CASE WHEN duration_value = trunc(duration_value) THEN CAST(duration_value AS BIGINT) END AS duration_time,
+           price_value AS price,
+           flight_code, source, currency
+    FROM ranked
+    WHERE occurrence = 1
+    ORDER BY file_index, row_index
+"""
+
+
+def _quote(value: str) -> str:
+    return "'" + value.replace("'", "''") + "'"
+
+
+def _csv_header(path: str) -> List[str]:
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        return next(csv.reader(f), [])
+
+
+def file_select(path: str, file_index: int, file_format: str) -> Optional[str]:
+    """SELECT một file về các cột flights_metadata (VARCHAR, '' = NULL), chấp nhận layout cũ"""
+    if file_format == 'csv':
+        header = _csv_header(path)
+        if not header:
+            return None
+        scan = f"read_csv({_quote(path)}, header=true, all_varchar=true)"
+    else:
+        header = list(FLIGHT_FIELDS)
+        scan = f"read_parquet({_quote(path)})"
+
+    columns = []
+    # Cùng cách map header với csv_reader.iter_csv_chunks (layout cũ dùng destination_*, duration_time)
+    for column, name in resolve_columns(header, SQLITE_COLUMNS).items():
+        value = f"NULLIF(CAST(\"{name}\" AS VARCHAR), '')" if name else "NULL"
+        # FlightRecord mặc định currency = 'VND' khi thiếu, source thiếu thì lấy theo tên file
+        if column == 'currency':
+            value = f"COALESCE({value}, 'VND')"
+        elif column == 'source' and file_format == 'csv':
+            value = f"COALESCE({value}, {_quote(source_from_path(path))})"
+        columns.append(f"{value} AS {column}")
+    if file_format == 'parquet':
+        # Cột source nằm ở tên thư mục partition
+        source_name = os.path.basename(os.path.dirname(path)).split('=', 1)[-1]
+        columns[SQLITE_COLUMNS.index('source')] = f"{_quote(source_name)} AS source"
+    # Streaming window giữ thứ tự dòng trong file, dùng thay cho id tăng dần của SQLite
+    return (f"SELECT {file_index} AS file_index, row_number() OVER () AS row_index, {', '.join(columns)} "
+            f"FROM {scan}")
+
+
+class DuckDBTransform:
+    """Làm sạch, dedup và ghi kết quả bằng một connection DuckDB in-memory"""
+
+    def __init__(self, threads: int = DUCKDB_THREADS):
+        if duckdb is None:
+            raise RuntimeError("duckdb is required for the DuckDB transform engine")
+        self.connection = duckdb.connect()
+        self.connection.execute(f"SET threads = {max(1, int(threads))}")
+
+    def load_files(self, files: List[str], file_format: str) -> int:
+        selects = [s for s in (file_select(path, i, file_format) for i, path in enumerate(files)) if s]
+        if not selects:
+            raise ValueError("No input files to transform")
+        self.connection.execute(f"CREATE OR REPLACE TEMP TABLE raw_flights AS {' UNION ALL '.join(selects)}")
+        return self.connection.execute("SELECT count(*) FROM raw_flights").fetchone()[0]
+
+    def run(self, files: List[str], file_format: str = 'csv', output: str = CLEANED_OUTPUT) -> Dict[str, int]:
+        started = time.perf_counter()
+        input_rows = self.load_files(files, file_format)
+        missing = self.connection.execute(
+            f"SELECT count(*) FROM raw_flights WHERE {' OR '.join(f'{c} IS NULL' for c in REQUIRED_COLUMNS)}"
+        ).fetchone()[0]
+
+        self.connection.execute(f"CREATE OR REPLACE TEMP TABLE cleaned_flights AS {CLEAN_QUERY}")
+        output_rows = self.connection.execute("SELECT count(*) FROM cleaned_flights").fetchone()[0]
+
+        os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+        tmp_path = os.path.join(os.path.dirname(output) or ".", f".{os.path.basename(output)}.tmp")
+        self.connection.execute(f"COPY cleaned_flights TO {_quote(tmp_path)} (FORMAT parquet, COMPRESSION zstd)")
+        os.replace(tmp_path, output)
+
+        stats = {
+            'input_rows': input_rows,
+            'missing_removed': missing,
+            'duplicates_removed': input_rows - missing - output_rows,
+            'output_rows': output_rows,
+        }
+        logger.info(f"DuckDB transform: {len(files)} files, {input_rows} rows -> {output_rows} rows "
+                    f"({missing} missing, {stats['duplicates_removed']} duplicates) "
+                    f"in {time.perf_counter() - started:.2f}s: {output}")
+        return stats
+
+    def cleaned_rows(self) -> List[tuple]:
+        return self.connection.execute("SELECT * FROM cleaned_flights").fetchall()
+
+    def close(self):
+        self.connection.close()
+
+
+def find_input_files(file_format: str = 'csv', pattern: str = None) -> List[str]:
+    return sorted(glob.glob(pattern or INPUT_GLOBS[file_format]))
+
+
+def run_duckdb_transform(file_format: str = 'csv', pattern: str = None, output: str = CLEANED_OUTPUT,
+                         threads: int = DUCKDB_THREADS) -> Optional[Dict[str, int]]:
+    files = find_input_files(file_format, pattern)
+    if not files:
+        logger.warning(f"No {file_format} files found for DuckDB transform.")
+        return None
+    transform = DuckDBTransform(threads)
+    try:
+        return transform.run(files, file_format, output)
+    finally:
+        transform.close()
+
+
+def _sqlite_value(value, column: str):
+    """Giá trị SQLite sau affinity -> giá trị tương ứng ở output DuckDB"""
+    if column == 'price':
+        return float(value) if isinstance(value, (int, float)) else None
+    if column == 'duration_time':
+        return int(value) if isinstance(value, (int, float)) and value == int(value) else None
+    return value
+
+
+def verify_against_sqlite(files: List[str], threads: int = DUCKDB_THREADS) -> bool:
+    """Chạy cả 2 engine trên cùng các file CSV và so sánh từng dòng kết quả theo thứ tự"""
+    from src.config import sqlite_connector
+    from src.main import load_csv_to_sqlite
+
+    tmp_dir = tempfile.mkdtemp(prefix="flight_transform_verify_")
+    original_db_path = sqlite_connector.SQLITE_DB_PATH
+    sqlite_connector.SQLITE_DB_PATH = os.path.join(tmp_dir, "metadata.sqlite")
+    transform = DuckDBTransform(threads)
+    try:
+        sqlite_connector.init_sqlite_db()
+        for path in files:
+            load_csv_to_sqlite(path)
+        sqlite_connector.process_missing_data()
+        sqlite_connector.process_duplicate_data()
+        connection = sqlite_connector.get_sqlite_connection()
+        try:
+            sqlite_rows = [tuple(_sqlite_value(v, c) for v, c in zip(row, SQLITE_COLUMNS)) for row in connection.execute(
+                f"SELECT {', '.join(SQLITE_COLUMNS)} FROM flights_metadata ORDER BY id")]
+        finally:
+            connection.close()
+
+        transform.run(files, 'csv', os.path.join(tmp_dir, "cleaned.parquet"))
+        duckdb_rows = transform.cleaned_rows()
+    finally:
+        transform.close()
+        sqlite_connector.SQLITE_DB_PATH = original_db_path
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    if sqlite_rows == duckdb_rows:
+        logger.info(f"DuckDB and SQLite transforms match ({len(duckdb_rows)} rows).")
+        return True
+    mismatch = next((i for i, (a, b) in enumerate(zip(sqlite_rows, duckdb_rows)) if a != b),
+                    min(len(sqlite_rows), len(duckdb_rows)))
+    logger.error(f"Transforms differ: SQLite {len(sqlite_rows)} rows, DuckDB {len(duckdb_rows)} rows, "
+                 f"first difference at row {mismatch}")
+    return False
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="DuckDB transform over scraped CSV/Parquet files")
+    parser.add_argument('--input', default='csv', choices=sorted(INPUT_GLOBS))
+    parser.add_argument('--glob', help="Pattern file input, mặc định theo --input")
+    parser.add_argument('--output', default=CLEANED_OUTPUT)
+    parser.add_argument('--threads', type=int, default=DUCKDB_THREADS)
+    parser.add_argument('--verify', action='store_true', help="So sánh kết quả với đường SQLite (chỉ với CSV)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    if duckdb is None:
+        logger.error("duckdb is not installed.")
+        return 1
+    if args.verify:
+        return 0 if verify_against_sqlite(find_input_files('csv', args.glob), args.threads) else 1
+    return 0 if run_duckdb_transform(args.input, args.glob, args.output, args.threads) else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,13 +1,41 @@
+import logging
+import os
+
 from src.config.sqlite_connector import process_missing_data, process_duplicate_data
+from src.monitoring.metrics import metrics
+from src.monitoring.profiler import profile_stage
+
+# sqlite: làm sạch bảng flights_metadata; duckdb: chạy SQL thẳng trên các file data/scrap_*
+TRANSFORM_ENGINE = os.getenv('TRANSFORM_ENGINE', 'sqlite')
+TRANSFORM_ENGINES = ('sqlite', 'duckdb')
 
 
-def transform_data():
-    process_missing_and_duplicate_data()
+@profile_stage('transform_data')
+def transform_data(engine=None):
+    engine = engine or TRANSFORM_ENGINE
+    with metrics.timer('transform'):
+        if engine == 'duckdb':
+            process_with_duckdb()
+        else:
+            process_missing_and_duplicate_data()
 
 
 
 def process_missing_and_duplicate_data():
-    process_missing_data()
-    process_duplicate_data()
+    missing = process_missing_data()
+    metrics.inc('rows_missing_removed', missing or 0, stage='transform')
+    duplicates = process_duplicate_data()
+    metrics.inc('rows_deduped', duplicates or 0, stage='transform')
+
 
+def process_with_duckdb():
+    from src.transform.duckdb_transform import run_duckdb_transform
 
+    try:
+        stats = run_duckdb_transform()
+    except Exception as e:
+        logging.error(f"Error running DuckDB transform: {e}")
+        return
+    if stats:
+        metrics.inc('rows_missing_removed', stats['missing_removed'], stage='transform')
+        metrics.inc('rows_deduped', stats['duplicates_removed'], stage='transform')
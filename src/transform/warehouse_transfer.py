@@ -0,0 +1,195 @@
+"""
+Chuyển các dòng đã làm sạch của bảng SQLite flights_metadata sang bảng MySQL flights (warehouse).
+Đọc theo chunk theo id, chuẩn hóa/validate theo FLIGHT_SCHEMA và giới hạn cột của flights (dòng không chuyển
+được sang kiểu của flights thì bỏ qua và đếm), rồi đẩy bằng INSERT ... ON DUPLICATE KEY UPDATE;
+chunk tiếp theo được đọc trong lúc chunk trước đang ghi sang MySQL. Watermark (id cuối đã ghi) nằm trong
+bảng SQLite transfer_watermark nên mỗi lần chạy chỉ chuyển các dòng mới.
+
+    python -m src.transform.warehouse_transfer                      # chuyển các dòng mới
+    python -m src.transform.warehouse_transfer --chunk-size 5000 --full
+"""
+import argparse
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from src.config.csv_reader import source_from_path
+from src.config.db_connector import get_db_connection
+from src.config.db_manager import insert_flight_rows
+from src.config.sqlite_connector import get_sqlite_connection, init_sqlite_db
+from src.model.FlightBatch import FlightBatch
+from src.model.FlightRecord import FlightRecord
+from src.model.FlightSchema import FLIGHT_VALIDATOR, ValidationResult
+from src.monitoring.metrics import metrics
+from src.monitoring.profiler import profile_stage
+
+logger = logging.getLogger(__name__)
+
+# Bật bước transfer sau transform của src.main (hoặc dùng --transfer)
+WAREHOUSE_TRANSFER = os.getenv('WAREHOUSE_TRANSFER', '0') == '1'
+TRANSFER_CHUNK_SIZE = int(os.getenv('TRANSFER_CHUNK_SIZE', 2000))
+TRANSFER_TARGET = 'mysql.flights'
+
+# Độ dài VARCHAR và giá trị lớn nhất của DECIMAL(10, 2) trong bảng flights, vượt quá thì MySQL strict mode từ chối
+VARCHAR_LIMITS = {'flight_code': 100, 'airline': 255, 'departure_airport': 255, 'arrival_airport': 255,
+                  'currency': 10, 'source': 255, 'route': 100, 'aircraft_type': 100, 'seat_class': 50}
+PRICE_MAX = 10 ** 8
+
+READ_QUERY = """
+    SELECT id, flight_code, airline, departure_airport, destination_airport, departure_time, destination_time,
+           duration_time, price, currency, source, source_file
+    FROM flights_metadata
+    WHERE id > ?
+    ORDER BY id
+    LIMIT ?
+"""
+
+
+def to_flight_record(row) -> FlightRecord:
+    """Dòng flights_metadata -> FlightRecord (source thiếu thì lấy theo source_file, route ghép từ sân bay)"""
+    (_, flight_code, airline, departure_airport, arrival_airport, departure_time, arrival_time,
+     duration, price, currency, source, source_file) = row
+    if not source and source_file:
+        source = source_from_path(source_file)
+    return FlightRecord(flight_code=flight_code, airline=airline, departure_airport=departure_airport,
+                        arrival_airport=arrival_airport, departure_time=departure_time, arrival_time=arrival_time,
+                        duration_minutes=duration, price=price, currency=currency or 'VND', source=source)
+
+
+def warehouse_violations(batch: FlightBatch) -> Dict[str, np.ndarray]:
+    """Mask các dòng hợp lệ theo FLIGHT_SCHEMA nhưng không vừa cột của bảng flights"""
+    columns = batch.columns
+    violations = {'range:price': ~batch.null_mask('price') & (columns['price'] >= PRICE_MAX)}
+    for field, limit in VARCHAR_LIMITS.items():
+        # Độ dài theo dictionary (mỗi giá trị một lần), phần tử cuối cho mã -1 (thiếu)
+        lengths = np.array([len(v) for v in batch.dictionaries[field].values] + [0])
+        violations[f"length:{field}"] = lengths[columns[field]] > limit
+    return violations
+
+
+def coerce_chunk(rows) -> Tuple[List[tuple], ValidationResult]:
+    """
+    Chuyển một chunk sang tuple theo FLIGHT_FIELDS với đúng kiểu của flights (datetime 'YYYY-MM-DD HH:MM:SS',
+    số nguyên/thực): cùng đường normalize() + FLIGHT_VALIDATOR của clean_flight_data, cộng giới hạn cột MySQL.
+    Dòng không chuyển được (giờ dạng '23:50', giá '2.136.936 VND/khách', thiếu flight_code...) bị bỏ.
+    """
+    batch = FlightBatch.from_records(to_flight_record(row) for row in rows).normalize()
+    result = FLIGHT_VALIDATOR.validate(batch)
+    for name, mask in warehouse_violations(batch).items():
+        count = int(mask.sum())
+        if count:
+            result.rejections[name] = count
+            result.valid &= ~mask
+    return list(batch.filter(result.valid).iter_db_tuples()), result
+
+
+def get_watermark(connection, target: str = TRANSFER_TARGET) -> int:
+    row = connection.execute("SELECT last_id FROM transfer_watermark WHERE target = ?", (target,)).fetchone()
+    return row[0] if row else 0
+
+
+def set_watermark(connection, last_id: int, rows: int, target: str = TRANSFER_TARGET):
+    with connection:
+        connection.execute("""
+            INSERT INTO transfer_watermark (target, last_id, rows_transferred, updated_at) VALUES (?, ?, ?, ?)
+            ON CONFLICT(target) DO UPDATE SET last_id = excluded.last_id,
+                rows_transferred = transfer_watermark.rows_transferred + excluded.rows_transferred,
+                updated_at = excluded.updated_at
+        """, (target, last_id, rows, datetime.now().isoformat(timespec='seconds')))
+
+
+def read_chunk(connection, after_id: int, chunk_size: int) -> List[tuple]:
+    return connection.execute(READ_QUERY, (after_id, chunk_size)).fetchall()
+
+
+@profile_stage('transfer_to_warehouse')
+def transfer_to_warehouse(warehouse=None, chunk_size: int = TRANSFER_CHUNK_SIZE, target: str = TRANSFER_TARGET,
+                          full: bool = False) -> Optional[Dict]:
+    """
+    Chuyển các dòng có id > watermark sang warehouse, trả về thống kê (rows, skipped, chunks, seconds,
+    rows_per_second). Chunk được ghi trên một thread riêng (một connection MySQL chỉ dùng ở thread đó),
+    thread chính đọc và chuyển kiểu chunk kế tiếp trong lúc chờ. Watermark chỉ tăng sau khi chunk đã commit và
+    vượt qua cả các dòng bị bỏ, nên dòng lỗi không chặn các dòng sau; lỗi ghi MySQL thì raise lại, lần chạy sau gửi
+    lại từ chunk đó (flight_code bắt buộc nên unique_flight bắt được dòng gửi lại). Trả về None nếu không kết nối
+    được database.
+    full=True: gửi lại toàn bộ bảng.
+    """
+    sqlite_connection = get_sqlite_connection()
+    if not sqlite_connection:
+        logger.error("Cannot connect to SQLite database. Program terminated.")
+        return None
+    own_warehouse = warehouse is None
+    if own_warehouse:
+        warehouse = get_db_connection()
+        if not warehouse:
+            logger.error("Cannot connect to database. Program terminated.")
+            sqlite_connection.close()
+            return None
+
+    started = time.perf_counter()
+    rows_transferred = rows_skipped = chunks = committed_id = 0
+    try:
+        last_id = committed_id = 0 if full else get_watermark(sqlite_connection, target)
+        pending = None
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix="warehouse-transfer") as executor:
+            while True:
+                rows = read_chunk(sqlite_connection, last_id, chunk_size)
+                if pending is not None:
+                    future, pending_last_id, pending_count = pending
+                    pending = None
+                    future.result()
+                    set_watermark(sqlite_connection, pending_last_id, pending_count, target)
+                    committed_id = pending_last_id
+                    rows_transferred += pending_count
+                    chunks += 1
+                    metrics.inc('rows_transferred', pending_count, stage='warehouse_transfer')
+                if not rows:
+                    break
+                last_id = rows[-1][0]
+                batch, result = coerce_chunk(rows)
+                if result.rejected:
+                    rows_skipped += result.rejected
+                    logger.warning(f"Warehouse transfer ids {rows[0][0]}..{last_id}: {result.summary()}")
+                    metrics.inc('rows_rejected', result.rejected, stage='warehouse_transfer')
+                pending = (executor.submit(insert_flight_rows, warehouse, batch), last_id, len(batch))
+    except Exception as e:
+        # Watermark chỉ chứa các chunk đã commit nên có thể báo lỗi lên caller (CLI/scheduler) một cách an toàn
+        logger.error(f"Error transferring flights to warehouse after {rows_transferred} rows "
+                     f"(watermark id {committed_id}): {e}")
+        raise
+    finally:
+        seconds = time.perf_counter() - started
+        metrics.observe('warehouse_transfer', seconds)
+        sqlite_connection.close()
+        if own_warehouse:
+            warehouse.close()
+
+    rate = rows_transferred / seconds if seconds > 0 else 0.0
+    logger.info(f"Transferred {rows_transferred} rows in {chunks} chunks to {target} in {seconds:.2f}s "
+                f"({rate:,.0f} rows/s), {rows_skipped} skipped, watermark id {committed_id}")
+    return {'rows': rows_transferred, 'skipped': rows_skipped, 'chunks': chunks, 'seconds': seconds,
+            'rows_per_second': rate}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Transfer cleaned SQLite flights to the MySQL warehouse")
+    parser.add_argument('--chunk-size', type=int, default=TRANSFER_CHUNK_SIZE)
+    parser.add_argument('--full', action='store_true', help="Bỏ qua watermark, gửi lại toàn bộ flights_metadata")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    init_sqlite_db()
+    try:
+        return 0 if transfer_to_warehouse(chunk_size=args.chunk_size, full=args.full) is not None else 1
+    except Exception:
+        # Đã log trong transfer_to_warehouse
+        return 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())